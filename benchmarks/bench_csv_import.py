@@ -0,0 +1,92 @@
+"""
+Benchmark for the CSV import pipeline.
+
+Scales up the files in ``sample_data/`` into a single large LibreLink export and
+reports the throughput of ``process_csv_file`` in rows per second.
+
+Usage:
+    python benchmarks/bench_csv_import.py --repeat 100 --chunk_size 10000
+"""
+import argparse
+import csv
+import os
+import sys
+import tempfile
+import time
+import uuid
+from datetime import datetime, timedelta
+from pathlib import Path
+
+ROOT_DIR = Path(__file__).resolve().parent.parent
+sys.path.insert(0, str(ROOT_DIR / 'src'))
+os.environ.setdefault('DJANGO_SETTINGS_MODULE', 'glucosemonitor.settings')
+
+import django  # noqa: E402
+
+django.setup()
+
+from glucosemonitor.levels.models import Device, IngestMode, LevelRollup  # noqa: E402
+from glucosemonitor.levels.utils.csv_processing import COLUMNS, TIMESTAMP_FORMAT, process_csv_file  # noqa: E402
+
+SAMPLE_DATA_DIR = ROOT_DIR / 'sample_data'
+
+
+def build_scaled_csv(target: Path, repeat: int) -> int:
+    """
+    Writes a LibreLink export made of the sample data rows repeated ``repeat`` times.
+    The readings found in several sample files are written once, and every repetition is shifted
+    past the previous one, so that no row repeats the natural key of another.
+
+    Returns:
+        int: The number of data rows written.
+    """
+    header = None
+    rows = {}
+    for sample_file in sorted(SAMPLE_DATA_DIR.glob('*.csv')):
+        with open(sample_file, 'r', encoding='utf-8', newline='') as file:
+            lines = list(csv.reader(file))
+        for i, line in enumerate(lines):
+            if COLUMNS['DEVICE_NAME'] in line and COLUMNS['DEVICE_SERIAL_NUMBER'] in line:
+                header = line
+                for row in lines[i + 1:]:
+                    if row:
+                        row[2] = datetime.strptime(row[2], TIMESTAMP_FORMAT)
+                        rows.setdefault((row[1], row[2], row[3]), row)
+                break
+
+    timestamps = [row[2] for row in rows.values()]
+    span = max(timestamps) - min(timestamps) + timedelta(minutes=1)
+    with open(target, 'w', encoding='utf-8', newline='') as file:
+        file.write('Glukose-Werte,Erstellt am,25-02-2021 17:28 UTC,Erstellt von,benchmark\n')
+        writer = csv.writer(file, lineterminator='\n')
+        writer.writerow(header)
+        for i in range(repeat):
+            writer.writerows(
+                [*row[:2], (row[2] + i * span).strftime(TIMESTAMP_FORMAT), *row[3:]] for row in rows.values()
+            )
+    return len(rows) * repeat
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--repeat', type=int, default=50, help='How many times the sample rows are repeated')
+    parser.add_argument('--chunk_size', type=int, default=10000, help='Number of rows to process in each chunk')
+    args = parser.parse_args()
+
+    user_id = str(uuid.uuid4())
+    with tempfile.TemporaryDirectory() as tmp_dir:
+        csv_file = Path(tmp_dir) / f'{user_id}.csv'
+        total_rows = build_scaled_csv(csv_file, args.repeat)
+        try:
+            started = time.perf_counter()
+            process_csv_file(csv_file, user_id, chunk_size=args.chunk_size, mode=IngestMode.APPEND)
+            elapsed = time.perf_counter() - started
+        finally:
+            Device.objects.filter(user_id=user_id).delete()
+            LevelRollup.objects.filter(user_id=user_id).delete()
+
+    print(f'{total_rows} rows in {elapsed:.2f}s: {total_rows / elapsed:,.0f} rows/s')
+
+
+if __name__ == '__main__':
+    main()
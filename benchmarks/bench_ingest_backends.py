@@ -0,0 +1,80 @@
+"""
+Benchmark comparing the ingest backends of ``process_csv_file``.
+
+Generates a synthetic LibreLink export with one history reading every 15 minutes
+and imports it once with every backend, reporting rows per second.
+
+Usage:
+    python benchmarks/bench_ingest_backends.py --rows 3000000 --backends copy bulk_create
+"""
+import argparse
+import os
+import sys
+import tempfile
+import time
+import uuid
+from pathlib import Path
+
+import numpy as np
+import pandas as pd
+
+ROOT_DIR = Path(__file__).resolve().parent.parent
+sys.path.insert(0, str(ROOT_DIR / 'src'))
+os.environ.setdefault('DJANGO_SETTINGS_MODULE', 'glucosemonitor.settings')
+
+import django  # noqa: E402
+
+django.setup()
+
+from glucosemonitor.levels.models import Device, IngestMode, LevelRollup  # noqa: E402
+from glucosemonitor.levels.utils.csv_processing import COLUMNS, TIMESTAMP_FORMAT, process_csv_file  # noqa: E402
+from glucosemonitor.levels.utils.ingest_backends import INGEST_BACKENDS  # noqa: E402
+
+
+def build_synthetic_csv(target: Path, rows: int, block_size: int = 500000):
+    """
+    Writes a LibreLink export with ``rows`` history readings taken every 15 minutes.
+    """
+    rng = np.random.default_rng(0)
+    serial_number = str(uuid.uuid4()).upper()
+    with open(target, 'w', encoding='utf-8') as file:
+        file.write('Glukose-Werte,Erstellt am,25-02-2021 17:28 UTC,Erstellt von,benchmark\n')
+        file.write(','.join(COLUMNS.values()) + '\n')
+        for offset in range(0, rows, block_size):
+            size = min(block_size, rows - offset)
+            timestamps = pd.date_range('2000-01-01', periods=size, freq='15min') + pd.Timedelta(minutes=15 * offset)
+            block = pd.DataFrame({column: '' for column in COLUMNS.values()}, index=range(size))
+            block[COLUMNS['DEVICE_NAME']] = 'FreeStyle LibreLink'
+            block[COLUMNS['DEVICE_SERIAL_NUMBER']] = serial_number
+            block[COLUMNS['DEVICE_TIMESTAMP']] = timestamps.strftime(TIMESTAMP_FORMAT)
+            block[COLUMNS['RECORDING_TYPE']] = '0'
+            block[COLUMNS['GLUCOSE_HISTORY_MG_DL']] = rng.integers(40, 400, size)
+            block.to_csv(file, index=False, header=False)
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--rows', type=int, default=3000000, help='Number of rows in the synthetic file')
+    parser.add_argument('--chunk_size', type=int, default=10000, help='Number of rows to process in each chunk')
+    parser.add_argument('--backends', nargs='+', choices=list(INGEST_BACKENDS), default=list(INGEST_BACKENDS))
+    args = parser.parse_args()
+
+    with tempfile.TemporaryDirectory() as tmp_dir:
+        csv_file = Path(tmp_dir) / 'synthetic.csv'
+        build_synthetic_csv(csv_file, args.rows)
+        for backend in args.backends:
+            user_id = str(uuid.uuid4())
+            try:
+                started = time.perf_counter()
+                imported_rows = process_csv_file(
+                    csv_file, user_id, chunk_size=args.chunk_size, backend=backend, mode=IngestMode.APPEND
+                ).inserted
+                elapsed = time.perf_counter() - started
+            finally:
+                Device.objects.filter(user_id=user_id).delete()
+                LevelRollup.objects.filter(user_id=user_id).delete()
+            print(f'{backend:>12}: {imported_rows} rows in {elapsed:.2f}s: {imported_rows / elapsed:,.0f} rows/s')
+
+
+if __name__ == '__main__':
+    main()
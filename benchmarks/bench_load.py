@@ -0,0 +1,204 @@
+"""
+Load test of the level read endpoints under WSGI and ASGI.
+
+Imports history readings taken every 15 minutes for new users, then serves the project with
+gunicorn (WSGI) and uvicorn (ASGI), with the same number of worker processes, and requests the
+endpoints from ``--concurrency`` connections for ``--duration`` seconds, reporting the requests
+per second and the latencies. The response cache is disabled unless ``--cache`` is given, so
+every request reads the database.
+
+gunicorn and uvicorn are not dependencies of the project, they must be installed to run the
+benchmark. ``ALLOWED_HOSTS`` is empty, so the servers accept ``localhost`` with ``DEBUG=True`` only.
+
+Usage:
+    python benchmarks/bench_load.py --endpoints list detail minmax --concurrency 64 --duration 20
+    python benchmarks/bench_load.py --endpoints export --concurrency 8 --duration 20
+"""
+import argparse
+import asyncio
+import os
+import random
+import socket
+import statistics
+import subprocess
+import sys
+import tempfile
+import time
+import uuid
+from pathlib import Path
+
+ROOT_DIR = Path(__file__).resolve().parent.parent
+sys.path.insert(0, str(ROOT_DIR / 'src'))
+os.environ.setdefault('DJANGO_SETTINGS_MODULE', 'glucosemonitor.settings')
+
+import django  # noqa: E402
+
+django.setup()
+
+from django.contrib.auth import get_user_model  # noqa: E402
+from django.test import Client  # noqa: E402
+
+from bench_ingest_backends import build_synthetic_csv  # noqa: E402
+from glucosemonitor.levels.models import Device, IngestMode, Level, LevelRollup  # noqa: E402
+from glucosemonitor.levels.utils.csv_processing import process_csv_file  # noqa: E402
+
+SERVERS = {
+    'wsgi': lambda port, args: [
+        sys.executable, '-m', 'gunicorn', 'glucosemonitor.wsgi:application', '--bind', f'127.0.0.1:{port}',
+        '--workers', str(args.workers), '--threads', str(args.threads), '--log-level', 'warning',
+    ],
+    'asgi': lambda port, args: [
+        sys.executable, '-m', 'uvicorn', 'glucosemonitor.asgi:application', '--port', str(port),
+        '--workers', str(args.workers), '--log-level', 'warning', '--no-access-log',
+    ],
+}
+
+
+def get_paths(endpoint: str, user_ids: list, level_ids: list, readings: int):
+    """
+    Returns a function giving the path of the next request to ``endpoint``, for a random user.
+    """
+    def path() -> str:
+        user_id = random.choice(user_ids)
+        if endpoint == 'list':
+            return f'/api/v1/levels/?user_id={user_id}&limit=100&offset={random.randrange(readings - 100)}'
+        if endpoint == 'detail':
+            return f'/api/v1/levels/{random.choice(level_ids)}/'
+        if endpoint == 'minmax':
+            return f'/api/v1/levels/aggregates/minmax/?user_id={user_id}'
+        return f'/api/v1/levels/?user_id={user_id}&export=ndjson'
+    return path
+
+
+async def read_body(reader: asyncio.StreamReader, headers: dict) -> int:
+    """
+    Reads the body of a response, of a known length or chunked, and returns its size.
+    """
+    if 'content-length' in headers:
+        length = int(headers['content-length'])
+        await reader.readexactly(length)
+        return length
+    if headers.get('transfer-encoding') != 'chunked':
+        return len(await reader.read())
+    size = 0
+    while True:
+        length = int((await reader.readline()).split(b';')[0], 16)
+        await reader.readexactly(length + 2)
+        size += length
+        if length == 0:
+            return size
+
+
+async def connection(port: int, cookie: str, path, deadline: float, latencies: list, errors: list):
+    """
+    Sends requests one after the other on a connection kept alive, until ``deadline``.
+    """
+    reader = writer = None
+    while time.perf_counter() < deadline:
+        if writer is None:
+            reader, writer = await asyncio.open_connection('127.0.0.1', port)
+        started = time.perf_counter()
+        writer.write(f'GET {path()} HTTP/1.1\r\nHost: localhost\r\nCookie: {cookie}\r\n\r\n'.encode())
+        status = int((await reader.readline()).split()[1])
+        headers = {}
+        while (line := await reader.readline()) != b'\r\n':
+            name, _, value = line.decode('latin-1').partition(':')
+            headers[name.strip().lower()] = value.strip()
+        await read_body(reader, headers)
+        latencies.append(time.perf_counter() - started)
+        if status != 200:
+            errors.append(status)
+        if headers.get('connection', '').lower() == 'close':
+            writer.close()
+            reader = writer = None
+    if writer is not None:
+        writer.close()
+
+
+async def load(port: int, cookie: str, path, concurrency: int, duration: float) -> tuple[list, list]:
+    latencies, errors = [], []
+    deadline = time.perf_counter() + duration
+    await asyncio.gather(*(
+        connection(port, cookie, path, deadline, latencies, errors) for _ in range(concurrency)
+    ))
+    return latencies, errors
+
+
+def free_port() -> int:
+    with socket.socket() as sock:
+        sock.bind(('127.0.0.1', 0))
+        return sock.getsockname()[1]
+
+
+def wait_for(port: int, timeout: float = 30):
+    deadline = time.monotonic() + timeout
+    while time.monotonic() < deadline:
+        try:
+            socket.create_connection(('127.0.0.1', port), timeout=1).close()
+            return
+        except OSError:
+            time.sleep(0.1)
+    raise RuntimeError(f'The server did not listen on port {port}')
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--servers', nargs='+', choices=list(SERVERS), default=list(SERVERS))
+    parser.add_argument('--endpoints', nargs='+', choices=['list', 'detail', 'minmax', 'export'],
+                        default=['list', 'detail', 'minmax'])
+    parser.add_argument('--users', type=int, default=20, help='Number of users with readings')
+    parser.add_argument('--readings', type=int, default=2000, help='Number of readings of every user')
+    parser.add_argument('--workers', type=int, default=2, help='Number of worker processes of every server')
+    parser.add_argument('--threads', type=int, default=4, help='Number of threads of every gunicorn worker')
+    parser.add_argument('--concurrency', type=int, default=64, help='Number of concurrent connections')
+    parser.add_argument('--duration', type=float, default=20, help='Duration of every run in seconds')
+    parser.add_argument('--cache', action='store_true', help='Keep the response cache enabled')
+    args = parser.parse_args()
+
+    user_ids = [str(uuid.uuid4()) for _ in range(args.users)]
+    username = f'bench-{uuid.uuid4()}'
+    try:
+        with tempfile.TemporaryDirectory() as tmp_dir:
+            csv_file = Path(tmp_dir) / 'synthetic.csv'
+            build_synthetic_csv(csv_file, args.readings)
+            for user_id in user_ids:
+                process_csv_file(csv_file, user_id, mode=IngestMode.APPEND)
+        level_ids = list(Level.objects.filter(user_id__in=user_ids).values_list('id', flat=True))
+
+        get_user_model().objects.create_user(username=username, password=username)
+        client = Client()
+        client.login(username=username, password=username)
+        cookie = f'sessionid={client.cookies["sessionid"].value}'
+
+        env = dict(os.environ, PYTHONPATH=str(ROOT_DIR / 'src'))
+        if not args.cache:
+            env['CACHE_BACKEND'] = 'django.core.cache.backends.dummy.DummyCache'
+        print(f'{args.users} users with {args.readings} readings, {args.workers} workers, '
+              f'{args.threads} threads per gunicorn worker, {args.concurrency} connections')
+        for server in args.servers:
+            port = free_port()
+            process = subprocess.Popen(SERVERS[server](port, args), cwd=ROOT_DIR / 'src', env=env)
+            try:
+                wait_for(port)
+                for endpoint in args.endpoints:
+                    path = get_paths(endpoint, user_ids, level_ids, args.readings)
+                    # Warm up the connections of the workers
+                    asyncio.run(load(port, cookie, path, args.concurrency, 2))
+                    latencies, errors = asyncio.run(load(port, cookie, path, args.concurrency, args.duration))
+                    if errors:
+                        print(f'{server} {endpoint}: {len(errors)} errors, e.g. status {errors[0]}')
+                    latencies.sort()
+                    print(f'{server:>4} {endpoint:>6}: {len(latencies) / args.duration:8.1f} requests/s, '
+                          f'p50 {statistics.median(latencies) * 1000:7.1f} ms, '
+                          f'p99 {latencies[int(len(latencies) * 0.99)] * 1000:7.1f} ms')
+            finally:
+                process.terminate()
+                process.wait()
+    finally:
+        Device.objects.filter(user_id__in=user_ids).delete()
+        LevelRollup.objects.filter(user_id__in=user_ids).delete()
+        get_user_model().objects.filter(username=username).delete()
+
+
+if __name__ == '__main__':
+    main()
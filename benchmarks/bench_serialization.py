@@ -0,0 +1,86 @@
+"""
+Benchmark of the serialization of the level list and exports.
+
+Imports history readings taken every 15 minutes for a new user, then compares the cost per
+row of reading and serializing them through model instances and ``LevelSerializer``
+against ``values_list`` rows and ``RowEncoder``, and of rendering them with ``JSONRenderer``
+against ``FastJSONRenderer``, which uses orjson when it is installed.
+
+Usage:
+    python benchmarks/bench_serialization.py --rows 100000 --repeat 5
+"""
+import argparse
+import os
+import statistics
+import sys
+import tempfile
+import time
+import uuid
+from pathlib import Path
+
+ROOT_DIR = Path(__file__).resolve().parent.parent
+sys.path.insert(0, str(ROOT_DIR / 'src'))
+os.environ.setdefault('DJANGO_SETTINGS_MODULE', 'glucosemonitor.settings')
+
+import django  # noqa: E402
+
+django.setup()
+
+from rest_framework.renderers import JSONRenderer  # noqa: E402
+
+from bench_ingest_backends import build_synthetic_csv  # noqa: E402
+from glucosemonitor.levels.encoders import RowEncoder  # noqa: E402
+from glucosemonitor.levels.models import Device, IngestMode, Level, LevelRollup  # noqa: E402
+from glucosemonitor.levels.renderers import FastJSONRenderer, orjson  # noqa: E402
+from glucosemonitor.levels.serializers import LevelSerializer  # noqa: E402
+from glucosemonitor.levels.utils.csv_processing import process_csv_file  # noqa: E402
+
+
+def measure(function, repeat: int) -> tuple[float, object]:
+    timings = []
+    for _ in range(repeat):
+        started = time.perf_counter()
+        result = function()
+        timings.append(time.perf_counter() - started)
+    return statistics.median(timings), result
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--rows', type=int, default=100000, help='Number of readings')
+    parser.add_argument('--repeat', type=int, default=5, help='Number of timed runs')
+    args = parser.parse_args()
+
+    user_id = str(uuid.uuid4())
+    try:
+        with tempfile.TemporaryDirectory() as tmp_dir:
+            csv_file = Path(tmp_dir) / 'synthetic.csv'
+            build_synthetic_csv(csv_file, args.rows)
+            process_csv_file(csv_file, user_id, mode=IngestMode.APPEND)
+        queryset = Level.objects.filter(user_id=user_id).order_by('device_timestamp', 'id')
+        encoder = RowEncoder(LevelSerializer())
+
+        fetch_instances, instances = measure(lambda: list(queryset.select_related('device')), args.repeat)
+        serialize, data = measure(lambda: LevelSerializer(instances, many=True).data, args.repeat)
+        fetch_rows, rows = measure(lambda: list(encoder.values_list(queryset)), args.repeat)
+        encode, encoded = measure(lambda: encoder.encode_rows(rows), args.repeat)
+        render, content = measure(lambda: JSONRenderer().render(data), args.repeat)
+        fast_render, fast_content = measure(lambda: FastJSONRenderer().render(encoded), args.repeat)
+        assert encoded == data and fast_content == content
+    finally:
+        Device.objects.filter(user_id=user_id).delete()
+        LevelRollup.objects.filter(user_id=user_id).delete()
+
+    def per_row(seconds: float) -> str:
+        return f'{seconds * 1e6 / args.rows:6.2f} us/row'
+
+    print(f'{args.rows} rows, median of {args.repeat} runs, orjson {"installed" if orjson else "missing"}')
+    print(f'  model instances: fetch {per_row(fetch_instances)}, LevelSerializer {per_row(serialize)}')
+    print(f'  values_list:     fetch {per_row(fetch_rows)}, RowEncoder      {per_row(encode)}')
+    print(f'  JSONRenderer     {per_row(render)}')
+    print(f'  FastJSONRenderer {per_row(fast_render)}')
+    print(f'  total {per_row(fetch_instances + serialize + render)} -> {per_row(fetch_rows + encode + fast_render)}')
+
+
+if __name__ == '__main__':
+    main()
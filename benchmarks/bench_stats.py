@@ -0,0 +1,92 @@
+"""
+Benchmark of the glycemic statistics of the stats endpoint.
+
+Imports a year of history readings taken every 15 minutes for a new user, then computes
+the statistics of the year with ``get_glycemic_stats``, and the way they were computed
+offline before: every reading loaded through the ORM and aggregated with pandas.
+
+Usage:
+    python benchmarks/bench_stats.py --days 365 --repeat 20
+"""
+import argparse
+import os
+import statistics
+import sys
+import tempfile
+import time
+import uuid
+from pathlib import Path
+
+import pandas as pd
+
+ROOT_DIR = Path(__file__).resolve().parent.parent
+sys.path.insert(0, str(ROOT_DIR / 'src'))
+os.environ.setdefault('DJANGO_SETTINGS_MODULE', 'glucosemonitor.settings')
+
+import django  # noqa: E402
+
+django.setup()
+
+from bench_ingest_backends import build_synthetic_csv  # noqa: E402
+from glucosemonitor.levels.models import Device, IngestMode, Level, LevelRollup  # noqa: E402
+from glucosemonitor.levels.stats import AGP_PERCENTILES, AGP_SLOT_MINUTES, get_glycemic_stats  # noqa: E402
+from glucosemonitor.levels.utils.csv_processing import process_csv_file  # noqa: E402
+
+
+def offline_stats(user_id) -> dict:
+    """
+    Computes the statistics from model instances with pandas, like an export analysed offline.
+    """
+    df = pd.DataFrame(
+        {'device_timestamp': level.device_timestamp, 'glucose_mg_dl': level.glucose_mg_dl}
+        for level in Level.objects.filter(user_id=user_id, glucose_mg_dl__isnull=False)
+    )
+    glucose = df['glucose_mg_dl']
+    bins = pd.cut(glucose, [0, 53, 69, 180, 250, float('inf')])
+    timestamps = df['device_timestamp']
+    slots = (timestamps.dt.hour * 60 + timestamps.dt.minute) // AGP_SLOT_MINUTES
+    return {
+        'mean': glucose.mean(),
+        'cv': glucose.std() / glucose.mean() * 100,
+        'time_in_ranges': bins.value_counts(normalize=True, sort=False).to_dict(),
+        'agp': glucose.groupby(slots).quantile([percentile / 100 for percentile in AGP_PERCENTILES]),
+    }
+
+
+def measure(function, repeat: int) -> float:
+    timings = []
+    for _ in range(repeat):
+        started = time.perf_counter()
+        function()
+        timings.append(time.perf_counter() - started)
+    return statistics.median(timings)
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--days', type=int, default=365, help='Number of days of readings')
+    parser.add_argument('--repeat', type=int, default=20, help='Number of timed runs')
+    args = parser.parse_args()
+
+    user_id = str(uuid.uuid4())
+    try:
+        with tempfile.TemporaryDirectory() as tmp_dir:
+            csv_file = Path(tmp_dir) / 'synthetic.csv'
+            build_synthetic_csv(csv_file, args.days * 96)
+            rows = process_csv_file(csv_file, user_id, mode=IngestMode.APPEND).inserted
+
+        stats = get_glycemic_stats(user_id)
+        assert stats['count'] == rows
+        endpoint = measure(lambda: get_glycemic_stats(user_id), args.repeat)
+        offline = measure(lambda: offline_stats(user_id), max(args.repeat // 4, 1))
+    finally:
+        Device.objects.filter(user_id=user_id).delete()
+        LevelRollup.objects.filter(user_id=user_id).delete()
+
+    print(f'{rows} readings, median of {args.repeat} runs')
+    print(f'   get_glycemic_stats: {endpoint * 1000:.1f} ms')
+    print(f'ORM instances+pandas: {offline * 1000:.1f} ms')
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,127 @@
+"""
+Benchmark of the storage of the readings.
+
+Imports history readings taken every 15 minutes for a new user, with an insulin dose every
+``--event_every`` readings, then reports the size of the tables holding the readings, the
+average size of the rows of the user, and the time taken to scan them: the whole Level table
+aggregated with a sequential scan, and the rows of the user read as the exports read them.
+
+The tables are measured as they are, so their sizes include the rows of the other users.
+
+Usage:
+    python benchmarks/bench_storage.py --readings 100000 --event_every 50 --repeat 5
+"""
+import argparse
+import os
+import statistics
+import sys
+import tempfile
+import time
+import uuid
+from pathlib import Path
+
+import pandas as pd
+
+ROOT_DIR = Path(__file__).resolve().parent.parent
+sys.path.insert(0, str(ROOT_DIR / 'src'))
+os.environ.setdefault('DJANGO_SETTINGS_MODULE', 'glucosemonitor.settings')
+
+import django  # noqa: E402
+
+django.setup()
+
+from django.db import connection, transaction  # noqa: E402
+
+from glucosemonitor.levels.encoders import RowEncoder  # noqa: E402
+from glucosemonitor.levels.models import Device, IngestMode, Level, LevelEvent, LevelRollup  # noqa: E402
+from glucosemonitor.levels.serializers import LevelSerializer  # noqa: E402
+from glucosemonitor.levels.utils.csv_processing import COLUMNS, TIMESTAMP_FORMAT, process_csv_file  # noqa: E402
+
+
+def build_csv(target: Path, readings: int, event_every: int):
+    """
+    Writes a LibreLink export with ``readings`` history readings taken every 15 minutes, and
+    a fast acting insulin dose along with every ``event_every`` reading.
+    """
+    timestamps = pd.date_range('2000-01-01', periods=readings, freq='15min').strftime(TIMESTAMP_FORMAT)
+    df = pd.DataFrame({column: '' for column in COLUMNS.values()}, index=range(readings))
+    df[COLUMNS['DEVICE_NAME']] = 'FreeStyle LibreLink'
+    df[COLUMNS['DEVICE_SERIAL_NUMBER']] = str(uuid.uuid4()).upper()
+    df[COLUMNS['DEVICE_TIMESTAMP']] = timestamps
+    df[COLUMNS['RECORDING_TYPE']] = '0'
+    df[COLUMNS['GLUCOSE_HISTORY_MG_DL']] = (100 + 60 * pd.Series(range(readings)).mod(7) / 7).round().astype(int)
+
+    events = df.iloc[::event_every].copy()
+    events[COLUMNS['RECORDING_TYPE']] = '4'
+    events[COLUMNS['GLUCOSE_HISTORY_MG_DL']] = ''
+    events[COLUMNS['FAST_ACTING_INSULIN_UNITS']] = 4
+    with open(target, 'w', encoding='utf-8') as file:
+        file.write('Glukose-Werte,Erstellt am,25-02-2021 17:28 UTC,Erstellt von,benchmark\n')
+        pd.concat([df, events]).to_csv(file, index=False)
+
+
+def measure(function, repeat: int) -> float:
+    timings = []
+    for _ in range(repeat):
+        started = time.perf_counter()
+        function()
+        timings.append(time.perf_counter() - started)
+    return statistics.median(timings)
+
+
+def scan_table():
+    # A sequential scan of the whole table, without parallel workers
+    with transaction.atomic(), connection.cursor() as cursor:
+        for setting in ('max_parallel_workers_per_gather = 0', 'enable_indexscan = off',
+                        'enable_indexonlyscan = off', 'enable_bitmapscan = off'):
+            cursor.execute(f'SET LOCAL {setting}')
+        cursor.execute(f'SELECT COUNT(*), AVG(glucose_mg_dl) FROM {connection.ops.quote_name(Level._meta.db_table)}')
+        return cursor.fetchone()
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--readings', type=int, default=100000, help='Number of history readings of the user')
+    parser.add_argument('--event_every', type=int, default=50, help='Number of readings per insulin dose')
+    parser.add_argument('--repeat', type=int, default=5, help='Number of timed runs')
+    args = parser.parse_args()
+
+    user_id = str(uuid.uuid4())
+    quote = connection.ops.quote_name
+    try:
+        with tempfile.TemporaryDirectory() as tmp_dir:
+            csv_file = Path(tmp_dir) / 'synthetic.csv'
+            build_csv(csv_file, args.readings, args.event_every)
+            process_csv_file(csv_file, user_id, mode=IngestMode.APPEND)
+
+        with connection.cursor() as cursor:
+            cursor.execute(f'VACUUM ANALYZE {quote(Level._meta.db_table)}')
+            print(f'{"table":>18} {"rows":>10} {"heap MB":>9} {"index MB":>9} {"user rows":>10} {"row bytes":>10}')
+            for model in (Level, LevelEvent, Device):
+                table = model._meta.db_table
+                cursor.execute(
+                    f'SELECT (SELECT COUNT(*) FROM {quote(table)}), pg_table_size(%s), pg_indexes_size(%s)',
+                    [table, table],
+                )
+                rows, heap, indexes = cursor.fetchone()
+                cursor.execute(f'SELECT COUNT(*), AVG(pg_column_size(t.*)) FROM {quote(table)} t WHERE user_id = %s',
+                               [user_id])
+                user_rows, row_bytes = cursor.fetchone()
+                print(f'{table:>18} {rows:>10} {heap / 2 ** 20:>9.1f} {indexes / 2 ** 20:>9.1f} '
+                      f'{user_rows:>10} {row_bytes or 0:>10.1f}')
+
+        encoder = RowEncoder(LevelSerializer())
+        export = encoder.values_list(Level.objects.filter(user_id=user_id))
+        scan = measure(scan_table, args.repeat)
+        read = measure(lambda: list(export.iterator(chunk_size=2000)), args.repeat)
+    finally:
+        LevelRollup.objects.filter(user_id=user_id).delete()
+        Device.objects.filter(user_id=user_id).delete()
+
+    print(f'median of {args.repeat} runs')
+    print(f'sequential scan of {Level._meta.db_table}: {scan * 1000:.1f} ms')
+    print(f'  export rows of the user: {read * 1000:.1f} ms')
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,122 @@
+"""
+Benchmark for the CSV upload endpoint.
+
+Builds a LibreLink export of about ``--size_mb`` megabytes, wraps it in a multipart
+body on disk and sends it through the WSGI application in this process, reporting the
+request latency and the growth of the peak RSS. The upload handling alone is measured with
+LEVELS_IMPORT_WORKER=command, the default here, and the import included with =inline. The thread
+worker is refused: it would still be importing the upload while the benchmark cleans up.
+
+Usage:
+    LEVELS_IMPORT_WORKER=command python benchmarks/bench_upload.py --size_mb 100
+"""
+import argparse
+import base64
+import multiprocessing
+import os
+import resource
+import sys
+import tempfile
+import time
+import uuid
+from pathlib import Path
+
+ROOT_DIR = Path(__file__).resolve().parent.parent
+sys.path.insert(0, str(ROOT_DIR / 'src'))
+sys.path.insert(0, str(ROOT_DIR / 'benchmarks'))
+os.environ.setdefault('DJANGO_SETTINGS_MODULE', 'glucosemonitor.settings')
+os.environ.setdefault('LEVELS_IMPORT_WORKER', 'command')
+
+import django  # noqa: E402
+
+django.setup()
+
+from django.conf import settings  # noqa: E402
+from django.contrib.auth import get_user_model  # noqa: E402
+from django.core.files.storage import default_storage  # noqa: E402
+from django.core.wsgi import get_wsgi_application  # noqa: E402
+
+from bench_ingest_backends import build_synthetic_csv  # noqa: E402
+from glucosemonitor.levels.models import Device, ImportJob, LevelRollup  # noqa: E402
+
+BOUNDARY = 'BenchmarkBoundary'
+# Approximate size of a synthetic row in bytes
+ROW_SIZE = 89
+
+
+def build_multipart_body(target: Path, csv_file: Path, file_name: str):
+    """
+    Writes a multipart/form-data body containing ``csv_file`` as the 'file' field.
+    """
+    with open(target, 'wb') as body, open(csv_file, 'rb') as file:
+        body.write(
+            f'--{BOUNDARY}\r\nContent-Disposition: form-data; name="file"; filename="{file_name}"\r\n'
+            f'Content-Type: text/csv\r\n\r\n'.encode()
+        )
+        while chunk := file.read(1024 * 1024):
+            body.write(chunk)
+        body.write(f'\r\n--{BOUNDARY}--\r\n'.encode())
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--size_mb', type=int, default=100, help='Approximate size of the uploaded file')
+    args = parser.parse_args()
+    if settings.LEVELS_IMPORT_WORKER not in ('command', 'inline'):
+        parser.error('LEVELS_IMPORT_WORKER must be command or inline')
+
+    user_id = str(uuid.uuid4())
+    username = f'benchmark-{user_id}'
+    user = get_user_model().objects.create_user(username=username, password='benchmark')
+    application = get_wsgi_application()
+    try:
+        with tempfile.TemporaryDirectory() as tmp_dir:
+            csv_file = Path(tmp_dir) / 'upload.csv'
+            body_file = Path(tmp_dir) / 'body'
+            # Build the file in a child process so that it does not raise the peak RSS of this one
+            builder = multiprocessing.Process(
+                target=build_synthetic_csv, args=(csv_file, args.size_mb * 1024 * 1024 // ROW_SIZE)
+            )
+            builder.start()
+            builder.join()
+            build_multipart_body(body_file, csv_file, f'{user_id}.csv')
+
+            credentials = base64.b64encode(f'{username}:benchmark'.encode()).decode()
+            with open(body_file, 'rb') as body:
+                environ = {
+                    'REQUEST_METHOD': 'POST',
+                    'PATH_INFO': '/api/v1/levels/upload/',
+                    'SERVER_NAME': 'localhost',
+                    'SERVER_PORT': '80',
+                    'wsgi.url_scheme': 'http',
+                    'wsgi.input': body,
+                    'CONTENT_TYPE': f'multipart/form-data; boundary={BOUNDARY}',
+                    'CONTENT_LENGTH': str(body_file.stat().st_size),
+                    'HTTP_AUTHORIZATION': f'Basic {credentials}',
+                    'HTTP_HOST': 'localhost',
+                }
+                responses = []
+                rss_before = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+                started = time.perf_counter()
+                response = application(environ, lambda status, headers: responses.append(status))
+                b''.join(response)
+                # Closes the uploaded file, moved to the storage by the command worker
+                response.close()
+                elapsed = time.perf_counter() - started
+                rss_growth = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss - rss_before
+
+            print(
+                f'{settings.LEVELS_IMPORT_WORKER}: {csv_file.stat().st_size / 2 ** 20:.0f} MB upload, '
+                f'status {responses[0]}, {elapsed:.2f}s, peak RSS growth {rss_growth / 1024:.0f} MB'
+            )
+    finally:
+        for job in ImportJob.objects.filter(user_id=user_id).exclude(file_name=''):
+            default_storage.delete(job.file_name)
+        ImportJob.objects.filter(user_id=user_id).delete()
+        Device.objects.filter(user_id=user_id).delete()
+        LevelRollup.objects.filter(user_id=user_id).delete()
+        user.delete()
+
+
+if __name__ == '__main__':
+    main()
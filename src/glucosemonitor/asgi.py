@@ -14,3 +14,8 @@ from django.core.asgi import get_asgi_application
 os.environ.setdefault('DJANGO_SETTINGS_MODULE', 'glucosemonitor.settings')
 
 application = get_asgi_application()
+
+from glucosemonitor.levels.jobs import start_import_worker  # noqa: E402
+
+# Runs the import jobs left over by the previous process
+start_import_worker()
@@ -4,3 +4,6 @@ from django.apps import AppConfig
 class LevelsConfig(AppConfig):
     default_auto_field = 'django.db.models.BigAutoField'
     name = 'glucosemonitor.levels'
+
+    def ready(self):
+        from glucosemonitor.levels import checks, signals  # noqa: F401
@@ -0,0 +1,163 @@
+import asyncio
+
+from asgiref.sync import sync_to_async
+from django.http import Http404, StreamingHttpResponse
+from rest_framework.response import Response
+
+from glucosemonitor.levels.conditional import aconditional_response
+from glucosemonitor.levels.encoders import RowEncoder
+from glucosemonitor.levels.exports import (
+    EXPORT_CHUNK_SIZE, abatched, ajoin, amap, astream_csv, astream_json, astream_ndjson
+)
+from glucosemonitor.levels.filters import LevelFilter
+from glucosemonitor.levels.models import LevelRollup
+from glucosemonitor.levels.routers import aread_from_replica
+from glucosemonitor.levels.views import LevelDetailView, LevelListView, MinMaxLevelView
+
+
+class AsyncAPIViewMixin:
+    """
+    Makes an ``APIView`` natively asynchronous: its handlers are coroutines, served on the event
+    loop under ASGI rather than in a thread for the whole request.
+
+    The authentication, permission and throttling checks of ``initial()`` may read the session
+    and the user, so they run in a single call to the thread of the request. The rest of the
+    handling is the one of ``APIView.dispatch``, reading from the replica like ``ReplicaReadMixin``.
+    """
+
+    async def dispatch(self, request, *args, **kwargs):
+        self.args = args
+        self.kwargs = kwargs
+        request = self.initialize_request(request, *args, **kwargs)
+        self.request = request
+        self.headers = self.default_response_headers
+
+        try:
+            async with aread_from_replica(self.get_read_user_ids(request)):
+                await sync_to_async(self.initial)(request, *args, **kwargs)
+                if request.method.lower() in self.http_method_names:
+                    handler = getattr(self, request.method.lower(), self.http_method_not_allowed)
+                else:
+                    handler = self.http_method_not_allowed
+                response = handler(request, *args, **kwargs)
+                # OPTIONS is answered by the synchronous handler of APIView
+                if asyncio.iscoroutine(response):
+                    response = await response
+        except Exception as exc:
+            response = self.handle_exception(exc)
+
+        self.response = self.finalize_response(request, response, *args, **kwargs)
+        return self.response
+
+
+class AsyncLevelListView(AsyncAPIViewMixin, LevelListView):
+    """
+    Asynchronous variant of ``LevelListView``. The page and its count are read with the async
+    queryset methods, and exports are streamed from ``QuerySet.aiterator``.
+    """
+
+    async def get(self, request, *args, **kwargs):
+        format_export = request.query_params.get('export')
+        if format_export:
+            async def build():
+                return await self.ahandle_export(request, format_export)
+        else:
+            async def build():
+                return await self.alist(request, *args, **kwargs)
+
+        filterset = LevelFilter(request.query_params, queryset=self.get_queryset())
+        if not filterset.is_valid():
+            return await build()
+        return await aconditional_response('level-list', request, filterset.qs, build, cached=not format_export)
+
+    async def alist(self, request, *args, **kwargs):
+        """
+        Async variant of ``LevelListView.list``.
+        """
+        queryset = self.filter_queryset(self.get_queryset())
+        encoder = self.get_encoder()
+        encode = encoder.encode_columns if self.is_columnar() else encoder.encode_rows
+        rows = encoder.values_list(queryset)
+
+        page = await self.paginator.apaginate_queryset(rows, request, view=self)
+        if page is not None:
+            return self.get_paginated_response(encode(page))
+        return Response(encode([row async for row in rows]))
+
+    async def ahandle_export(self, request, format_):
+        """
+        Async variant of ``LevelListView.handle_export``.
+        """
+        invalid = self.check_export_format(format_)
+        if invalid is not None:
+            return invalid
+
+        queryset = self.filter_queryset(self.get_queryset())
+        encoder = self.get_encoder()
+        rows = encoder.values_list(queryset).aiterator(chunk_size=EXPORT_CHUNK_SIZE)
+        if self.is_columnar():
+            rows = amap(encoder.encode_columns, abatched(rows, EXPORT_CHUNK_SIZE))
+        else:
+            rows = amap(encoder.encode, rows)
+        return self.export(format_, rows, encoder.field_names)
+
+    def export_json(self, rows, compact=False):
+        return self.stream(astream_json(rows, compact=compact), content_type='application/json')
+
+    def export_ndjson(self, rows, compact=False):
+        return self.stream(astream_ndjson(rows, compact=compact), content_type='application/x-ndjson')
+
+    def export_csv(self, rows, fields):
+        response = self.stream(astream_csv(rows, fields), content_type='text/csv')
+        response['Content-Disposition'] = 'attachment; filename="levels.csv"'
+        return response
+
+    def stream(self, fragments, content_type: str) -> StreamingHttpResponse:
+        """
+        Streams the fragments of an export in chunks of ``EXPORT_CHUNK_SIZE`` fragments.
+        """
+        return StreamingHttpResponse(ajoin(fragments, EXPORT_CHUNK_SIZE), content_type=content_type)
+
+
+class AsyncLevelDetailView(AsyncAPIViewMixin, LevelDetailView):
+    """
+    Asynchronous variant of ``LevelDetailView``.
+    """
+
+    async def get(self, request, *args, **kwargs):
+        queryset = self.get_queryset().filter(pk=kwargs['pk'])
+
+        async def build():
+            encoder = RowEncoder(self.get_serializer())
+            row = await encoder.values_list(queryset).afirst()
+            if row is None:
+                raise Http404(f'No {queryset.model._meta.object_name} matches the given query.')
+            return Response(encoder.encode(row))
+
+        return await aconditional_response(f"level-detail:{kwargs['pk']}", request, queryset, build)
+
+
+class AsyncMinMaxLevelView(AsyncAPIViewMixin, MinMaxLevelView):
+    """
+    Asynchronous variant of ``MinMaxLevelView``. The rollups and the edges of the range are
+    aggregated with the async queryset methods.
+    """
+
+    async def get(self, request, *args, **kwargs):
+        filterset = LevelFilter(request.query_params, queryset=self.queryset)
+        if not filterset.is_valid():
+            return await self.aget_min_max()
+        return await aconditional_response('level-minmax', request, filterset.qs, self.aget_min_max, cached=True)
+
+    async def aget_min_max(self):
+        """
+        Async variant of ``MinMaxLevelView.get_min_max``.
+        """
+        filters, invalid = self.clean_min_max_filters()
+        if invalid is not None:
+            return invalid
+
+        aggregation_result = await LevelRollup.objects.aget_min_max(
+            filters['user_id'], start=filters['start'], stop=filters['stop']
+        )
+        return self.min_max_response(aggregation_result)
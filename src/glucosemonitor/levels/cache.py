@@ -0,0 +1,204 @@
+import hashlib
+import threading
+import time
+import uuid
+from logging import Logger, getLogger
+from typing import Any, Awaitable, Callable, Optional
+from urllib.parse import urlencode
+
+from django.core.cache import cache
+from django.db import transaction
+from rest_framework.response import Response
+
+logger: Logger = getLogger(__name__)
+
+KEY_PREFIX: str = 'levels'
+
+# Hit and miss counters of this process
+_stats_lock = threading.Lock()
+_stats: dict[str, int] = {'hits': 0, 'misses': 0}
+
+
+def _version_key(user_id) -> str:
+    return f'{KEY_PREFIX}:version:{uuid.UUID(str(user_id))}'
+
+
+def get_data_version(user_id) -> int:
+    """
+    Returns the data version of a user.
+
+    A version evicted from the cache starts again from the current time in nanoseconds,
+    so it never matches the version of an entry cached before the eviction.
+    """
+    key = _version_key(user_id)
+    version = cache.get(key)
+    if version is None:
+        cache.add(key, time.time_ns(), timeout=None)
+        version = cache.get(key)
+    return version
+
+
+async def aget_data_version(user_id) -> int:
+    """
+    Async variant of ``get_data_version``.
+    """
+    key = _version_key(user_id)
+    version = await cache.aget(key)
+    if version is None:
+        await cache.aadd(key, time.time_ns(), timeout=None)
+        version = await cache.aget(key)
+    return version
+
+
+def bump_data_version(user_id):
+    """
+    Moves the data version of a user forward, making every cached response of the user unreachable.
+
+    The version is bumped right away and once more when the current transaction commits:
+    a response computed in between from the data before the commit is cached under the
+    intermediate version, which is no longer used once the transaction is committed.
+    """
+    def bump():
+        try:
+            cache.incr(_version_key(user_id))
+        except ValueError:
+            cache.set(_version_key(user_id), time.time_ns(), timeout=None)
+
+    bump()
+    transaction.on_commit(bump)
+
+
+def get_request_digest(request) -> str:
+    """
+    Returns a digest of the host and the query parameters of a request, whose order does not matter.
+    The host is part of it since paginated responses link to absolute URLs.
+    """
+    params = request.query_params
+    query = urlencode(sorted((key, value) for key in params for value in params.getlist(key)))
+    return hashlib.sha256(f'{request.get_host()}?{query}'.encode()).hexdigest()
+
+
+def get_cache_key(name: str, request, user_id: uuid.UUID, version: int = None, state: Optional[str] = None) -> str:
+    """
+    Builds the key of a cached response from the view name, the user, its data version,
+    the query parameters and the state of the readings the response is built from.
+    """
+    if version is None:
+        version = get_data_version(user_id)
+    digest = get_request_digest(request)
+    if state is not None:
+        digest = hashlib.sha256(f'{digest}:{state}'.encode()).hexdigest()
+    return f'{KEY_PREFIX}:response:{name}:{user_id}:{version}:{digest}'
+
+
+def cached_response(name: str, request, build: Callable[[], Response], state: Optional[str] = None) -> Response:
+    """
+    Returns the cached response for the given view and request, building and caching it on a miss.
+    Only successful responses are cached, and only for requests with a valid ``user_id``.
+
+    The data version of a process-local cache only moves with the writes of its own process.
+    The ``state`` of the readings, read from the database, makes the responses follow the readings
+    imported by other processes as well, see ``conditional.get_state``.
+
+    Args:
+        name (str): The name of the view.
+        request (Request): The request object.
+        build (Callable[[], Response]): Builds the response on a miss.
+        state (str, optional): The state of the readings the response is built from.
+
+    Returns:
+        Response: The cached or built response.
+    """
+    try:
+        user_id = uuid.UUID(request.query_params.get('user_id', ''))
+    except ValueError:
+        return build()
+
+    key = get_cache_key(name, request, user_id, state=state)
+    cached = cache.get(key)
+    if cached is not None:
+        _count('hits')
+        data, status = cached
+        return Response(data, status=status)
+
+    _count('misses')
+    response = build()
+    if response.status_code == 200:
+        cache.set(key, (response.data, response.status_code))
+    return response
+
+
+async def acached_response(
+        name: str, request, build: Callable[[], Awaitable[Response]], state: Optional[str] = None
+) -> Response:
+    """
+    Async variant of ``cached_response``, of which ``build`` is a coroutine function.
+    """
+    try:
+        user_id = uuid.UUID(request.query_params.get('user_id', ''))
+    except ValueError:
+        return await build()
+
+    key = get_cache_key(name, request, user_id, version=await aget_data_version(user_id), state=state)
+    cached = await cache.aget(key)
+    if cached is not None:
+        _count('hits')
+        data, status = cached
+        return Response(data, status=status)
+
+    _count('misses')
+    response = await build()
+    if response.status_code == 200:
+        await cache.aset(key, (response.data, response.status_code))
+    return response
+
+
+def cached_value(name: str, user_id: uuid.UUID, key: str, build: Callable[[], Any]) -> Any:
+    """
+    Returns the value cached for the given user under its data version, building and caching it on a miss.
+
+    Args:
+        name (str): The name of the value.
+        user_id (UUID): The ID of the user the value is computed from.
+        key (str): What the value depends on besides the data of the user.
+        build (Callable[[], Any]): Builds the value on a miss, it must not be None.
+
+    Returns:
+        Any: The cached or built value.
+    """
+    key = f'{KEY_PREFIX}:value:{name}:{user_id}:{get_data_version(user_id)}:{key}'
+    value = cache.get(key)
+    if value is None:
+        value = build()
+        cache.set(key, value)
+    return value
+
+
+async def acached_value(name: str, user_id: uuid.UUID, key: str, build: Callable[[], Awaitable[Any]]) -> Any:
+    """
+    Async variant of ``cached_value``, of which ``build`` is a coroutine function.
+    """
+    key = f'{KEY_PREFIX}:value:{name}:{user_id}:{await aget_data_version(user_id)}:{key}'
+    value = await cache.aget(key)
+    if value is None:
+        value = await build()
+        await cache.aset(key, value)
+    return value
+
+
+def _count(name: str):
+    with _stats_lock:
+        _stats[name] += 1
+
+
+def get_cache_stats() -> dict:
+    """
+    Returns the hit and miss counters of this process.
+    """
+    with _stats_lock:
+        hits, misses = _stats['hits'], _stats['misses']
+    return {
+        'hits': hits,
+        'misses': misses,
+        'hit_ratio': hits / (hits + misses) if hits + misses else None,
+    }
@@ -0,0 +1,24 @@
+from django.conf import settings
+from django.core.checks import Warning, register
+
+# Cache backends that keep the entries in the memory of every process
+PROCESS_LOCAL_CACHES: tuple = ('django.core.cache.backends.locmem.LocMemCache',)
+
+
+@register()
+def check_shared_cache(app_configs, **kwargs) -> list:
+    """
+    Warns when the default cache is not shared between processes. The data versions and the
+    replica pins are then only seen by the process that wrote the readings.
+    """
+    if settings.CACHES['default']['BACKEND'] not in PROCESS_LOCAL_CACHES:
+        return []
+    return [Warning(
+        "The default cache is local to every process.",
+        hint=(
+            "Readings updated or deleted by another process, such as an import worker, a command or another "
+            "server worker, are only seen by the cached responses once they expire after LEVELS_CACHE_TIMEOUT "
+            "seconds. Set CACHE_BACKEND to a shared cache such as Redis when serving with several processes."
+        ),
+        id='levels.W001',
+    )]
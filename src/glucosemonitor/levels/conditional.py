@@ -0,0 +1,133 @@
+import hashlib
+from typing import Awaitable, Callable, Optional
+
+from django.db.models import QuerySet
+from django.http import HttpResponse
+from django.utils.cache import get_conditional_response
+from django.utils.http import quote_etag
+
+from glucosemonitor.levels.cache import (
+    acached_response, aget_data_version, cached_response, get_data_version, get_request_digest
+)
+
+
+def get_latest_reading(queryset: QuerySet) -> QuerySet:
+    """
+    Returns the queryset of the id, timestamp and user of the latest reading of ``queryset``,
+    read backwards from the (user_id, device_timestamp, id) index.
+    """
+    return queryset.order_by('-device_timestamp', '-id').values_list('id', 'device_timestamp', 'user_id')
+
+
+def build_state(latest: Optional[tuple], version: Optional[int]) -> str:
+    """
+    Returns the state of the readings a response is built from: the id and timestamp of their
+    latest reading, and the data version of its user.
+    """
+    if latest is None:
+        return 'empty'
+    id_, timestamp, _ = latest
+    return f'{id_}:{timestamp.isoformat()}:{version}'
+
+
+def get_state(queryset: QuerySet) -> str:
+    """
+    Returns the state of the given readings, see ``build_state``.
+
+    The latest reading is found with a single row read backwards from the (user_id, device_timestamp, id)
+    index. It is read from the database, so it follows the readings imported by every process, while
+    the data version follows the writes seen by the cache, see ``bump_data_version``.
+    """
+    latest = get_latest_reading(queryset).first()
+    return build_state(latest, None if latest is None else get_data_version(latest[2]))
+
+
+async def aget_state(queryset: QuerySet) -> str:
+    """
+    Async variant of ``get_state``.
+    """
+    latest = await get_latest_reading(queryset).afirst()
+    return build_state(latest, None if latest is None else await aget_data_version(latest[2]))
+
+
+def build_etag(name: str, request, state: str) -> str:
+    """
+    Returns the quoted ETag of a response, see ``get_validators``.
+    """
+    digest = hashlib.sha256(f'{name}:{get_request_digest(request)}:{state}'.encode()).hexdigest()
+    return quote_etag(digest[:32])
+
+
+def get_validators(name: str, request, queryset: QuerySet) -> tuple[str, str]:
+    """
+    Returns the ETag of a response about the given readings and the state it is derived from.
+
+    Readings updated in place or imported with older timestamps do not change the latest reading,
+    so the data version of the user is part of the state as well, see ``get_state``. No
+    Last-Modified is given: the timestamps of the readings are not the times they were written.
+
+    Args:
+        name (str): The name of the view.
+        request (Request): The request object.
+        queryset (QuerySet): The readings the response is built from, filtered by user.
+
+    Returns:
+        tuple[str, str]: The quoted ETag and the state of the readings.
+    """
+    state = get_state(queryset)
+    return build_etag(name, request, state), state
+
+
+async def aget_validators(name: str, request, queryset: QuerySet) -> tuple[str, str]:
+    """
+    Async variant of ``get_validators``.
+    """
+    state = await aget_state(queryset)
+    return build_etag(name, request, state), state
+
+
+def conditional_response(
+        name: str, request, queryset: QuerySet, build: Callable[[], HttpResponse], cached: bool = False
+) -> HttpResponse:
+    """
+    Answers a conditional GET with ``304 Not Modified`` when the ETag of the request matches
+    the current one, without building the response. Otherwise the response is built and
+    carries the ETag header.
+
+    A cached response is keyed by the state the ETag is derived from, so that its body is
+    never sent under the ETag of other data.
+
+    Args:
+        name (str): The name of the view.
+        request (Request): The request object.
+        queryset (QuerySet): The readings the response is built from, filtered by user.
+        build (Callable[[], HttpResponse]): Builds the response.
+        cached (bool): Whether the response is cached, see ``cached_response``.
+
+    Returns:
+        HttpResponse: The response object.
+    """
+    etag, state = get_validators(name, request, queryset)
+    response = get_conditional_response(request, etag=etag)
+    if response is None:
+        response = cached_response(name, request, build, state=state) if cached else build()
+    return set_etag(response, etag)
+
+
+async def aconditional_response(
+        name: str, request, queryset: QuerySet, build: Callable[[], Awaitable[HttpResponse]], cached: bool = False
+) -> HttpResponse:
+    """
+    Async variant of ``conditional_response``, of which ``build`` is a coroutine function.
+    """
+    etag, state = await aget_validators(name, request, queryset)
+    response = get_conditional_response(request, etag=etag)
+    if response is None:
+        response = await (acached_response(name, request, build, state=state) if cached else build())
+    return set_etag(response, etag)
+
+
+def set_etag(response: HttpResponse, etag: str) -> HttpResponse:
+    if response.status_code in (200, 304):
+        response.headers['ETag'] = etag
+    return response
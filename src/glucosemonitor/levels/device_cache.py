@@ -0,0 +1,63 @@
+import threading
+from collections import OrderedDict
+from typing import Hashable, Iterable, Optional
+
+from django.conf import settings
+
+
+class DeviceCache:
+    """
+    In-process least recently used cache of the stored devices, keyed by database alias, user and
+    serial number, holding the ID and the name of each device. An import usually reads one or two
+    sensors, so the imports of a process rarely query the Device table once warm.
+
+    The cache is shared by the threads of the process. It is filled only once the transaction
+    creating or reading the devices is committed, and devices deleted through the ORM are evicted,
+    see ``signals.evict_device``. Devices deleted by another process are not, so the cached IDs
+    are checked to still exist before they are used, see ``DeviceManager.resolve``.
+    """
+
+    def __init__(self, max_size: Optional[int] = None):
+        self._max_size = max_size
+        self._entries: OrderedDict = OrderedDict()
+        self._lock = threading.Lock()
+
+    @property
+    def max_size(self) -> int:
+        return settings.LEVELS_DEVICE_CACHE_SIZE if self._max_size is None else self._max_size
+
+    def get(self, key: Hashable) -> Optional[tuple[int, str]]:
+        """
+        Returns the ID and the name of a device, None if it is not cached.
+        """
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is not None:
+                self._entries.move_to_end(key)
+            return entry
+
+    def update(self, entries: dict):
+        """
+        Caches the IDs and names of devices, evicting the least recently used ones past ``max_size``.
+        """
+        with self._lock:
+            for key, entry in entries.items():
+                self._entries[key] = entry
+                self._entries.move_to_end(key)
+            while len(self._entries) > self.max_size:
+                self._entries.popitem(last=False)
+
+    def evict(self, keys: Iterable[Hashable]):
+        with self._lock:
+            for key in keys:
+                self._entries.pop(key, None)
+
+    def clear(self):
+        with self._lock:
+            self._entries.clear()
+
+    def __len__(self) -> int:
+        return len(self._entries)
+
+
+device_cache: DeviceCache = DeviceCache()
@@ -0,0 +1,184 @@
+from datetime import timedelta
+from typing import Callable, Iterable, Optional
+
+from django.db import connections
+from django.db.models import CharField, F, QuerySet
+from django.db.models.functions import Cast
+from rest_framework import serializers
+from rest_framework.settings import ISO_8601, api_settings
+
+
+def _datetime_converter(field: serializers.DateTimeField) -> Optional[Callable]:
+    """
+    Returns a function formatting aware datetimes like ``DateTimeField.to_representation``,
+    without looking up the settings and the time zone for every value.
+    """
+    if getattr(field, 'format', api_settings.DATETIME_FORMAT) != ISO_8601:
+        return None
+    field_timezone = field.timezone if hasattr(field, 'timezone') else field.default_timezone()
+    if field_timezone is None:
+        return None
+
+    def convert(value) -> str:
+        value = value.astimezone(field_timezone).isoformat()
+        return value[:-6] + 'Z' if value.endswith('+00:00') else value
+
+    return convert
+
+
+def get_converter(field: serializers.Field) -> Optional[Callable]:
+    """
+    Returns the function turning a value read from the database into the representation of
+    ``field``, None if the value is its own representation.
+    """
+    if isinstance(field, serializers.ChoiceField):
+        # String choices are represented by themselves
+        if all(isinstance(key, str) for key in field.choice_strings_to_values.values()):
+            return None
+    elif isinstance(field, (serializers.IntegerField, serializers.CharField, serializers.BooleanField)):
+        return None
+    elif isinstance(field, serializers.UUIDField) and field.uuid_format == 'hex_verbose':
+        return str
+    elif isinstance(field, serializers.DateTimeField) and not isinstance(field, serializers.DateField):
+        converter = _datetime_converter(field)
+        if converter is not None:
+            return converter
+    return field.to_representation
+
+
+class RowEncoder:
+    """
+    Builds the representation of a model serializer from ``values_list`` rows, without model
+    instances and without going through the serializer for every row.
+
+    The representation is the one of ``serializer.to_representation``: the fields are read
+    from the database under their source, and converted by a function compiled once for the
+    serializer. Values of which the representation is the value itself, such as integers and
+    strings, are copied as they are.
+    """
+
+    def __init__(self, serializer: serializers.Serializer):
+        fields = list(serializer.fields.values())
+        for field in fields:
+            if field.write_only:
+                continue
+            if field.source == '*' or not field.source_attrs or isinstance(field, serializers.SerializerMethodField):
+                raise ValueError(f"The field {field.field_name} is not read from a model field")
+        self.fields = fields = [field for field in fields if not field.write_only]
+
+        self.field_names = [field.field_name for field in fields]
+        # Related fields are read through lookups, 'device.name' as 'device__name'
+        self.lookups = ['__'.join(field.source_attrs) for field in fields]
+        # UUIDs represented as strings can be read as strings, see values_list()
+        self.text_lookups = {
+            lookup for lookup, field in zip(self.lookups, fields)
+            if isinstance(field, serializers.UUIDField) and field.uuid_format == 'hex_verbose'
+        }
+        self.converters = [get_converter(field) for field in fields]
+        self.encode = self._compile(self.converters)
+
+    def _compile(self, converters: list) -> Callable[[tuple], dict]:
+        """
+        Generates the function building the representation of a row, the value of every field
+        converted inline unless it is None.
+        """
+        names = [f'value_{i}' for i in range(len(converters))]
+        items = []
+        for i, (field_name, converter) in enumerate(zip(self.field_names, converters)):
+            if converter is None:
+                items.append(f'{field_name!r}: value_{i}')
+            else:
+                items.append(f'{field_name!r}: None if value_{i} is None else convert_{i}(value_{i})')
+        source = (
+            f"def encode(row):\n"
+            f"    {', '.join(names)}, = row\n"
+            f"    return {{{', '.join(items)}}}\n"
+        )
+        namespace = {f'convert_{i}': converter for i, converter in enumerate(converters) if converter is not None}
+        exec(source, namespace)
+        return namespace['encode']
+
+    def values_list(self, queryset: QuerySet) -> QuerySet:
+        """
+        Returns the queryset of the rows to encode. The rows are named tuples, so the value of
+        a field can be read as an attribute, like on a model instance.
+
+        PostgreSQL casts UUIDs to the text of ``str(uuid)``, so they are read as text there:
+        building the UUID objects would cost more than the rest of the row.
+        """
+        if connections[queryset.db].vendor != 'postgresql' or not self.text_lookups:
+            return queryset.values_list(*self.lookups, named=True)
+        aliases = {lookup: f'{lookup}_text' for lookup in self.text_lookups}
+        queryset = queryset.annotate(**{alias: Cast(F(lookup), CharField()) for lookup, alias in aliases.items()})
+        return queryset.values_list(*(aliases.get(lookup, lookup) for lookup in self.lookups), named=True)
+
+    def encode_rows(self, rows: Iterable[tuple]) -> list[dict]:
+        return [self.encode(row) for row in rows]
+
+
+class ColumnarEncoder(RowEncoder):
+    """
+    Builds a columnar representation of ``values_list`` rows: one list of values per field
+    instead of one object per row, so the field names are written once.
+
+    A field is represented by its value in ``constants`` when it has the same value on every
+    row, by a list of ``length`` values in ``columns`` otherwise. The values of the
+    ``dictionary_fields`` are then indexes in the list of their distinct values in
+    ``dictionaries``, and datetimes are integer offsets from the ``origin`` given in
+    ``timestamps``, counted in seconds or microseconds as given by its ``unit``. None stays None.
+    ``fields`` holds the names of the fields in the order of the serializer.
+    """
+
+    def __init__(self, serializer: serializers.Serializer, dictionary_fields: Iterable[str] = ()):
+        super().__init__(serializer)
+        self.dictionary_fields = set(dictionary_fields)
+        self.datetime_fields = {
+            field.field_name for field in self.fields
+            if isinstance(field, serializers.DateTimeField) and not isinstance(field, serializers.DateField)
+        }
+
+    def encode_columns(self, rows: Iterable[tuple]) -> dict:
+        rows = list(rows)
+        constants, dictionaries, timestamps, columns = {}, {}, {}, {}
+        values_by_field = zip(*rows) if rows else ([] for _ in self.field_names)
+        for field_name, converter, values in zip(self.field_names, self.converters, values_by_field):
+            if values and values.count(values[0]) == len(values):
+                constants[field_name] = self._convert(converter, values[0])
+            elif field_name in self.dictionary_fields:
+                index = {}
+                columns[field_name] = [None if value is None else index.setdefault(value, len(index))
+                                       for value in values]
+                dictionaries[field_name] = [self._convert(converter, value) for value in index]
+            elif field_name in self.datetime_fields:
+                timestamps[field_name], columns[field_name] = self._encode_offsets(converter, values)
+            else:
+                columns[field_name] = [self._convert(converter, value) for value in values]
+        return {
+            'length': len(rows),
+            'fields': self.field_names,
+            'constants': constants,
+            'dictionaries': dictionaries,
+            'timestamps': timestamps,
+            'columns': columns,
+        }
+
+    @staticmethod
+    def _convert(converter: Optional[Callable], value):
+        return value if converter is None or value is None else converter(value)
+
+    def _encode_offsets(self, converter: Optional[Callable], values: Iterable) -> tuple[dict, list]:
+        """
+        Returns the origin and the unit of the offsets of the given datetimes, and the offsets.
+        The offsets are counted in seconds, or in microseconds when some of the values are not
+        whole seconds, from the first value. The origin is None when there is no value, on an empty page.
+        """
+        present = [value for value in values if value is not None]
+        if not present:
+            return {'origin': None, 'unit': 's'}, [None for _ in values]
+        origin = present[0]
+        if all(value.microsecond == 0 for value in present):
+            unit, step = 's', timedelta(seconds=1)
+        else:
+            unit, step = 'us', timedelta(microseconds=1)
+        offsets = [None if value is None else (value - origin) // step for value in values]
+        return {'origin': self._convert(converter, origin), 'unit': unit}, offsets
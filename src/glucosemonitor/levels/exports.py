@@ -0,0 +1,155 @@
+import csv
+import json
+from itertools import islice
+from typing import AsyncIterable, AsyncIterator, Callable, Iterable, Iterator
+
+from django.core.serializers.json import DjangoJSONEncoder
+
+# Number of rows fetched from the database cursor at a time while exporting
+EXPORT_CHUNK_SIZE: int = 2000
+
+
+class Echo:
+    """
+    File-like object returning what is written to it, so that ``csv.writer`` can build single lines.
+    """
+
+    def write(self, value: str) -> str:
+        return value
+
+
+def stream_csv(rows: Iterable[dict], fields: list[str]) -> Iterator[str]:
+    """
+    Yields the rows as CSV lines, starting with the header line.
+
+    Args:
+        rows (Iterable[dict]): The serialized rows.
+        fields (list[str]): The columns to write, in order.
+
+    Yields:
+        str: One CSV line at a time.
+    """
+    writer = csv.writer(Echo())
+    yield writer.writerow(fields)
+    for row in rows:
+        yield writer.writerow([row[field] for field in fields])
+
+
+async def astream_csv(rows: AsyncIterable[dict], fields: list[str]) -> AsyncIterator[str]:
+    """
+    Async variant of ``stream_csv``.
+    """
+    writer = csv.writer(Echo())
+    yield writer.writerow(fields)
+    async for row in rows:
+        yield writer.writerow([row[field] for field in fields])
+
+
+def batched(rows: Iterable, size: int) -> Iterator[list]:
+    """
+    Yields the rows in lists of ``size`` rows, the last one possibly shorter.
+    """
+    iterator = iter(rows)
+    while batch := list(islice(iterator, size)):
+        yield batch
+
+
+async def abatched(rows: AsyncIterable, size: int) -> AsyncIterator[list]:
+    """
+    Async variant of ``batched``.
+    """
+    batch = []
+    async for row in rows:
+        batch.append(row)
+        if len(batch) == size:
+            yield batch
+            batch = []
+    if batch:
+        yield batch
+
+
+async def amap(function: Callable, rows: AsyncIterable) -> AsyncIterator:
+    """
+    Async variant of ``map`` over a single iterable.
+    """
+    async for row in rows:
+        yield function(row)
+
+
+async def ajoin(fragments: AsyncIterable[str], size: int) -> AsyncIterator[str]:
+    """
+    Yields the fragments of an asynchronous stream joined by ``size``, so that the server sends
+    them in chunks rather than one message per row.
+
+    Args:
+        fragments (AsyncIterable[str]): The asynchronous stream, such as the one of ``astream_json``.
+        size (int): The number of fragments joined into a chunk.
+
+    Yields:
+        str: The joined fragments.
+    """
+    async for batch in abatched(fragments, size):
+        yield ''.join(batch)
+
+
+def stream_json(rows: Iterable[dict], compact: bool = False) -> Iterator[str]:
+    """
+    Yields the rows as an indented JSON array, one element at a time.
+    The output is identical to ``json.dumps(list(rows), indent=2)``.
+
+    Args:
+        rows (Iterable[dict]): The serialized rows.
+        compact (bool): Whether to write every element on a single line, without whitespace.
+
+    Yields:
+        str: Fragments of the JSON array.
+    """
+    separator = '[\n'
+    for row in rows:
+        yield separator + _json_element(row, compact)
+        separator = ',\n'
+    yield '[]' if separator == '[\n' else '\n]'
+
+
+async def astream_json(rows: AsyncIterable[dict], compact: bool = False) -> AsyncIterator[str]:
+    """
+    Async variant of ``stream_json``.
+    """
+    separator = '[\n'
+    async for row in rows:
+        yield separator + _json_element(row, compact)
+        separator = ',\n'
+    yield '[]' if separator == '[\n' else '\n]'
+
+
+def _json_element(row: dict, compact: bool) -> str:
+    if compact:
+        element = json.dumps(row, cls=DjangoJSONEncoder, separators=(',', ':'))
+    else:
+        element = json.dumps(row, cls=DjangoJSONEncoder, indent=2)
+    return '  ' + element.replace('\n', '\n  ')
+
+
+def stream_ndjson(rows: Iterable[dict], compact: bool = False) -> Iterator[str]:
+    """
+    Yields the rows as newline-delimited JSON, one object per line.
+
+    Args:
+        rows (Iterable[dict]): The serialized rows.
+        compact (bool): Whether to leave out the whitespace after the separators.
+
+    Yields:
+        str: One JSON line at a time.
+    """
+    separators = (',', ':') if compact else None
+    for row in rows:
+        yield json.dumps(row, cls=DjangoJSONEncoder, separators=separators) + '\n'
+
+
+async def astream_ndjson(rows: AsyncIterable[dict], compact: bool = False) -> AsyncIterator[str]:
+    """
+    Async variant of ``stream_ndjson``.
+    """
+    separators = (',', ':') if compact else None
+    async for row in rows:
+        yield json.dumps(row, cls=DjangoJSONEncoder, separators=separators) + '\n'
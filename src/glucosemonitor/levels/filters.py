@@ -1,6 +1,6 @@
 from django_filters import rest_framework as filters
 
-from glucosemonitor.levels.models import Level
+from glucosemonitor.levels.models import Device, Level
 
 
 class LevelFilter(filters.FilterSet):
@@ -11,3 +11,11 @@ class LevelFilter(filters.FilterSet):
     class Meta:
         model = Level
         fields = ['user_id', 'start', 'stop']
+
+
+class DeviceFilter(filters.FilterSet):
+    user_id = filters.UUIDFilter(field_name='user_id', required=True)
+
+    class Meta:
+        model = Device
+        fields = ['user_id']
@@ -0,0 +1,205 @@
+import threading
+import uuid
+from datetime import timedelta
+from logging import Logger, getLogger
+from pathlib import Path
+from typing import BinaryIO, Optional, Union
+
+from django.conf import settings
+from django.core.files.storage import default_storage
+from django.core.files.uploadedfile import UploadedFile
+from django.db import connection, transaction
+from django.db.models import Q
+from django.utils import timezone
+
+from glucosemonitor.levels.models import ImportJob
+from glucosemonitor.levels.utils.csv_processing import process_csv_file
+from glucosemonitor.levels.utils.ingest_backends import IngestResult
+
+logger: Logger = getLogger(__name__)
+
+# Guards the in-process worker thread
+_worker_lock = threading.Lock()
+_worker_wakeup = threading.Event()
+_worker_thread: Optional[threading.Thread] = None
+
+
+def create_import_job(user_id: uuid.UUID, file: UploadedFile, mode: str) -> ImportJob:
+    """
+    Creates an import job for an uploaded file and schedules it according to the
+    LEVELS_IMPORT_WORKER setting:
+
+    - 'thread': a background thread of this process runs it once the transaction commits;
+    - 'inline': it runs right away, in the calling thread;
+    - 'command': it is left for the ``process_import_jobs`` management command.
+
+    Inline jobs parse the upload in place. Other jobs keep it in the default storage, which
+    moves uploads spooled to disk and streams in-memory ones, so the file is never copied in memory.
+    """
+    worker = settings.LEVELS_IMPORT_WORKER
+    if worker not in ('thread', 'inline', 'command'):
+        raise ValueError(f"Unknown import worker '{worker}'")
+
+    if worker == 'inline':
+        job = ImportJob.objects.create(user_id=user_id, file_name='', mode=mode)
+        run_import_job(claim_next_job(job_id=job.pk), csv_file=file)
+        return job
+
+    file_name = default_storage.save(f'tmp/{file.name}', file)
+    job = ImportJob.objects.create(user_id=user_id, file_name=file_name, mode=mode)
+    if worker == 'thread':
+        transaction.on_commit(start_worker_thread)
+    return job
+
+
+def claim_next_job(job_id=None) -> Optional[ImportJob]:
+    """
+    Marks the oldest pending job as running and returns it.
+    Jobs locked by another worker are skipped, so several workers can run side by side.
+
+    Args:
+        job_id (UUID, optional): Claim this job only.
+
+    Returns:
+        Optional[ImportJob]: The claimed job, or None if there is no pending job.
+    """
+    with transaction.atomic():
+        queryset = ImportJob.objects.select_for_update(skip_locked=True).filter(state=ImportJob.State.PENDING)
+        if job_id is not None:
+            queryset = queryset.filter(pk=job_id)
+        job = queryset.order_by('created_at').first()
+        if job is None:
+            return None
+        job.state = ImportJob.State.RUNNING
+        job.started_at = job.heartbeat_at = timezone.now()
+        job.save(update_fields=['state', 'started_at', 'heartbeat_at'])
+    return job
+
+
+def run_import_job(job: ImportJob, csv_file: Union[Path, BinaryIO] = None):
+    """
+    Imports the file of a claimed job, recording the progress and the outcome on the job.
+    The stored file is deleted afterwards.
+
+    Args:
+        job (ImportJob): The claimed job.
+        csv_file (Union[Path, BinaryIO], optional): The file to import instead of the stored one.
+    """
+
+    def report_progress(result: IngestResult):
+        ImportJob.objects.filter(pk=job.pk).update(
+            rows_processed=result.rows,
+            rows_inserted=result.inserted,
+            rows_updated=result.updated,
+            rows_skipped=result.skipped,
+            heartbeat_at=timezone.now(),
+        )
+
+    try:
+        result = process_csv_file(
+            csv_file if csv_file is not None else Path(default_storage.path(job.file_name)),
+            str(job.user_id),
+            mode=job.mode,
+            progress_callback=report_progress,
+        )
+        job.state = ImportJob.State.SUCCEEDED
+        job.rows_processed = result.rows
+        job.rows_inserted = result.inserted
+        job.rows_updated = result.updated
+        job.rows_skipped = result.skipped
+    except Exception as e:
+        logger.error(f"Import job {job.pk} failed: {e}")
+        job.refresh_from_db(fields=['rows_processed', 'rows_inserted', 'rows_updated', 'rows_skipped'])
+        job.state = ImportJob.State.FAILED
+        job.error = str(e) or e.__class__.__name__
+    finally:
+        if job.file_name:
+            default_storage.delete(job.file_name)
+    job.finished_at = timezone.now()
+    job.save()
+
+
+def reclaim_stale_jobs() -> int:
+    """
+    Fails the running jobs that reported no progress for ``LEVELS_IMPORT_JOB_TIMEOUT`` seconds,
+    left behind by a worker that crashed or was stopped, and deletes their stored files.
+    The readings imported before the worker stopped are kept.
+
+    Returns:
+        int: The number of jobs that were failed.
+    """
+    cutoff = timezone.now() - timedelta(seconds=settings.LEVELS_IMPORT_JOB_TIMEOUT)
+    with transaction.atomic():
+        jobs = list(ImportJob.objects.select_for_update(skip_locked=True).filter(
+            Q(heartbeat_at__lt=cutoff) | Q(heartbeat_at__isnull=True, started_at__lt=cutoff),
+            state=ImportJob.State.RUNNING,
+        ))
+        for job in jobs:
+            logger.warning(f"Import job {job.pk} was abandoned by its worker")
+            job.state = ImportJob.State.FAILED
+            job.error = "The worker running the job stopped before it finished"
+            job.finished_at = timezone.now()
+            job.save(update_fields=['state', 'error', 'finished_at'])
+
+    for job in jobs:
+        if job.file_name:
+            default_storage.delete(job.file_name)
+    return len(jobs)
+
+
+def run_pending_jobs() -> int:
+    """
+    Fails the stale jobs, then runs pending jobs until none is left.
+
+    Returns:
+        int: The number of jobs that were run.
+    """
+    reclaim_stale_jobs()
+    count = 0
+    while (job := claim_next_job()) is not None:
+        run_import_job(job)
+        count += 1
+    return count
+
+
+def start_import_worker():
+    """
+    Starts the worker thread when the imports are run by a thread of the web process, so that
+    the jobs left pending or abandoned by a previous process are run without waiting for the
+    next upload. Called by the WSGI and ASGI entry points as the process starts.
+    """
+    if settings.LEVELS_IMPORT_WORKER == 'thread':
+        start_worker_thread()
+
+
+def start_worker_thread():
+    """
+    Wakes up the in-process worker thread, starting it if it is not running.
+    """
+    global _worker_thread
+    with _worker_lock:
+        _worker_wakeup.set()
+        if _worker_thread is None:
+            _worker_thread = threading.Thread(target=_worker_loop, name='levels-import-worker', daemon=True)
+            _worker_thread.start()
+
+
+def _worker_loop():
+    """
+    Body of the in-process worker thread. It exits once no job is left and no wakeup is pending.
+    """
+    global _worker_thread
+    try:
+        while True:
+            _worker_wakeup.clear()
+            run_pending_jobs()
+            with _worker_lock:
+                if not _worker_wakeup.is_set():
+                    _worker_thread = None
+                    return
+    except Exception:
+        logger.exception("Import worker thread crashed")
+        with _worker_lock:
+            _worker_thread = None
+    finally:
+        connection.close()
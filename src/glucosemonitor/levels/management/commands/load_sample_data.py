@@ -1,21 +1,102 @@
+import glob
+import time
+from concurrent.futures import ProcessPoolExecutor, as_completed
+from dataclasses import dataclass, field
 from logging import Logger, getLogger
 from pathlib import Path
+from typing import Iterable, Optional
 
+import django
 from django.core.management.base import BaseCommand, CommandParser, CommandError
+from django.db import connections
 
+from glucosemonitor.levels.models import IngestMode
 from glucosemonitor.levels.utils.csv_processing import process_csv_file
+from glucosemonitor.levels.utils.ingest_backends import INGEST_BACKENDS, IngestResult
 
 logger: Logger = getLogger(__name__)
 
 
+@dataclass
+class FileImportResult:
+    """
+    Outcome of importing a single CSV file.
+    """
+    csv_file_path: Path
+    ingest_result: IngestResult = field(default_factory=IngestResult)
+    elapsed: float = 0.0
+    error: Optional[str] = None
+
+
+def collect_csv_files(paths: Iterable[str]) -> list[Path]:
+    """
+    Expands files, directories and glob patterns into a sorted list of unique CSV files.
+
+    Args:
+        paths (Iterable[str]): File paths, directories (their ``*.csv`` files are used) or glob patterns.
+
+    Returns:
+        list[Path]: The CSV files to import.
+
+    Raises:
+        CommandError: If a path does not exist or a pattern matches nothing.
+    """
+    csv_files: set[Path] = set()
+    for raw_path in paths:
+        path = Path(raw_path)
+        if path.is_dir():
+            csv_files.update(path.glob('*.csv'))
+        elif path.is_file():
+            csv_files.add(path)
+        elif glob.has_magic(raw_path):
+            matches = [Path(match) for match in glob.glob(raw_path, recursive=True)]
+            if not matches:
+                raise CommandError(f"No files match {raw_path}")
+            csv_files.update(match for match in matches if match.is_file())
+        else:
+            raise CommandError(f"{raw_path} does not exist")
+    return sorted(csv_files)
+
+
+def init_worker():
+    """
+    Initializes a worker process. Django is set up again for spawned workers,
+    and each worker opens its own database connection on first use.
+    """
+    django.setup()
+
+
+def import_csv_file(csv_file_path: Path, chunk_size: int, backend: str, mode: str) -> FileImportResult:
+    """
+    Imports a single CSV file, deriving the user_id from the file name.
+    Errors are returned instead of raised, so one failing file does not abort the others.
+    """
+    result = FileImportResult(csv_file_path=csv_file_path)
+    started = time.perf_counter()
+    try:
+        result.ingest_result = process_csv_file(
+            csv_file_path=csv_file_path, user_id=csv_file_path.stem, chunk_size=chunk_size, backend=backend, mode=mode
+        )
+    except Exception as e:
+        logger.error(f"Failed to import data from {csv_file_path}: {e}")
+        result.error = str(e) or e.__class__.__name__
+    result.elapsed = time.perf_counter() - started
+    return result
+
+
 class Command(BaseCommand):
-    help: str = "Load sample data from CSV file intro the Level model"
+    help: str = "Load sample data from CSV files intro the Level model"
 
     def add_arguments(self, parser: CommandParser):
         parser.add_argument(
-            "csv_file_path",
+            "csv_file_paths",
+            nargs="*",
+            help="CSV files, directories containing CSV files or glob patterns to be loaded",
+        )
+        parser.add_argument(
+            "--from_file",
             type=Path,
-            help="The path to the CSV file to be loaded",
+            help="A text file listing the CSV files, directories or glob patterns to be loaded, one per line",
         )
         parser.add_argument(
             "--chunk_size",
@@ -23,15 +104,86 @@ class Command(BaseCommand):
             default=10000,
             help="Number of rows to process in each chunk",
         )
+        parser.add_argument(
+            "--backend",
+            choices=['auto', *INGEST_BACKENDS],
+            default='auto',
+            help="Ingest backend writing the rows: COPY on PostgreSQL and bulk_create elsewhere by default",
+        )
+        parser.add_argument(
+            "--mode",
+            choices=IngestMode.values,
+            default=IngestMode.IGNORE,
+            help="How rows that are already stored are handled: skipped (ignore), overwritten (update) "
+                 "or inserted again, failing on duplicates (append)",
+        )
+        parser.add_argument(
+            "--workers",
+            type=int,
+            default=1,
+            help="Number of worker processes importing files in parallel",
+        )
 
     def handle(self, *args, **options):
-        csv_file_path: Path = options['csv_file_path']
-        chunk_size: int = options['chunk_size']
-        user_id: str = csv_file_path.stem
-        try:
-            process_csv_file(csv_file_path=csv_file_path, user_id=user_id, chunk_size=chunk_size)
-        except Exception as e:
-            logger.error(f"Failed to import data from {csv_file_path}: {e}")
-            raise CommandError(f"Failed to import data from {csv_file_path}: {e}")
-
-        print(f"Successfully imported data from {csv_file_path}")
+        paths: list[str] = list(options['csv_file_paths'])
+        if options['from_file']:
+            paths.extend(line.strip() for line in options['from_file'].read_text().splitlines() if line.strip())
+        if not paths:
+            raise CommandError("No CSV files given")
+        if options['workers'] < 1:
+            raise CommandError("--workers must be at least 1")
+
+        csv_file_paths = collect_csv_files(paths)
+        started = time.perf_counter()
+        results = self.import_files(
+            csv_file_paths, options['chunk_size'], options['backend'], options['mode'], options['workers']
+        )
+        elapsed = time.perf_counter() - started
+
+        failed = [result for result in results if result.error]
+        for result in results:
+            if result.error:
+                self.stdout.write(self.style.ERROR(f"FAILED {result.csv_file_path}: {result.error}"))
+            else:
+                self.stdout.write(
+                    f"OK {result.csv_file_path}: {self.format_counts(result.ingest_result)} in {result.elapsed:.2f}s"
+                )
+
+        total = sum((result.ingest_result for result in results), IngestResult())
+        self.stdout.write(
+            f"Imported {total.rows} rows from {len(results) - len(failed)}/{len(results)} files "
+            f"in {elapsed:.2f}s ({total.rows / elapsed if elapsed else 0:,.0f} rows/s): {self.format_counts(total)}"
+        )
+        if failed:
+            raise CommandError(f"Failed to import {len(failed)} of {len(results)} files")
+
+    @staticmethod
+    def format_counts(ingest_result: IngestResult) -> str:
+        return (
+            f"{ingest_result.inserted} inserted, {ingest_result.updated} updated, "
+            f"{ingest_result.skipped} skipped"
+        )
+
+    def import_files(self, csv_file_paths: list[Path], chunk_size: int, backend: str, mode: str, workers: int) \
+            -> list[FileImportResult]:
+        """
+        Imports the files, in a pool of worker processes if more than one worker is requested.
+        """
+        if workers == 1 or len(csv_file_paths) == 1:
+            return [import_csv_file(path, chunk_size, backend, mode) for path in csv_file_paths]
+
+        # Forked workers must not share the connection of this process
+        connections.close_all()
+        results: list[FileImportResult] = []
+        with ProcessPoolExecutor(max_workers=workers, initializer=init_worker) as executor:
+            futures = {
+                executor.submit(import_csv_file, path, chunk_size, backend, mode): path
+                for path in csv_file_paths
+            }
+            for future in as_completed(futures):
+                try:
+                    results.append(future.result())
+                except Exception as e:
+                    # The worker process itself died
+                    results.append(FileImportResult(csv_file_path=futures[future], error=str(e)))
+        return sorted(results, key=lambda result: result.csv_file_path)
@@ -0,0 +1,30 @@
+from django.core.management.base import BaseCommand, CommandParser
+from django.utils import timezone
+
+from glucosemonitor.levels.utils.partitioning import (
+    add_months, create_partitions, is_partitioned, partition_level_table
+)
+
+
+class Command(BaseCommand):
+    help: str = (
+        "Partition the glucose levels table by month of the device timestamp, moving the existing rows, "
+        "or create the upcoming monthly partitions of an already partitioned table"
+    )
+
+    def add_arguments(self, parser: CommandParser):
+        parser.add_argument(
+            "--months_ahead",
+            type=int,
+            default=3,
+            help="Number of months after the current one to create partitions for",
+        )
+
+    def handle(self, *args, **options):
+        until = add_months(timezone.now().date().replace(day=1), options['months_ahead'])
+        if is_partitioned():
+            created = create_partitions(until)
+        else:
+            self.stdout.write("Partitioning the levels table")
+            created = partition_level_table(until)
+        self.stdout.write(f"Created {len(created)} partitions")
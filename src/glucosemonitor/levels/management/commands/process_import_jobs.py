@@ -0,0 +1,31 @@
+import time
+
+from django.core.management.base import BaseCommand, CommandParser
+
+from glucosemonitor.levels.jobs import run_pending_jobs
+
+
+class Command(BaseCommand):
+    help: str = "Run the pending CSV import jobs queued by the upload endpoint"
+
+    def add_arguments(self, parser: CommandParser):
+        parser.add_argument(
+            "--once",
+            action="store_true",
+            help="Exit once no pending job is left instead of polling for new ones",
+        )
+        parser.add_argument(
+            "--poll_interval",
+            type=float,
+            default=2.0,
+            help="Seconds to wait between polls for new jobs",
+        )
+
+    def handle(self, *args, **options):
+        while True:
+            count = run_pending_jobs()
+            if count:
+                self.stdout.write(f"Processed {count} import jobs")
+            if options['once']:
+                return
+            time.sleep(options['poll_interval'])
@@ -0,0 +1,20 @@
+from django.core.management.base import BaseCommand, CommandParser
+
+from glucosemonitor.levels.models import Device, LevelRollup
+
+
+class Command(BaseCommand):
+    help: str = ("Recompute the hourly and daily glucose level rollups and the first and last reading "
+                 "timestamps of the devices from the stored readings")
+
+    def add_arguments(self, parser: CommandParser):
+        parser.add_argument(
+            "--user_id",
+            type=str,
+            help="Rebuild the rollups of this user only",
+        )
+
+    def handle(self, *args, **options):
+        count = LevelRollup.objects.rebuild(user_id=options['user_id'])
+        devices = Device.objects.rebuild_bounds(user_id=options['user_id'])
+        self.stdout.write(f"Rebuilt the rollups of {count} users and the bounds of {devices} devices")
@@ -0,0 +1,96 @@
+import re
+
+from django.conf import settings
+from django.middleware.gzip import GZipMiddleware
+from django.utils.cache import patch_vary_headers
+
+try:
+    import brotli
+except ImportError:  # pragma: no cover
+    brotli = None
+
+re_accept_encoding = re.compile(r'\s*([\w*-]+)\s*(?:;\s*q\s*=\s*([\d.]+))?\s*')
+
+
+def get_accepted_encodings(header: str) -> dict[str, float]:
+    """
+    Returns the quality values of the content codings listed in an Accept-Encoding header.
+    """
+    encodings = {}
+    for item in header.split(','):
+        match = re_accept_encoding.fullmatch(item)
+        if match is None:
+            continue
+        try:
+            encodings[match[1].lower()] = 1.0 if match[2] is None else float(match[2])
+        except ValueError:
+            continue
+    return encodings
+
+
+class CompressionMiddleware(GZipMiddleware):
+    """
+    Compresses the responses of at least ``RESPONSE_COMPRESSION_MIN_SIZE`` bytes, and the streamed
+    ones, with brotli or gzip as negotiated with the Accept-Encoding header.
+
+    Brotli is used when the ``brotli`` package is installed and the client prefers it or accepts
+    both, gzip otherwise. HTML pages, such as the browsable API ones holding a CSRF token, are
+    always compressed with gzip: ``GZipMiddleware`` pads its output with random bytes against
+    the BREACH attack, brotli has no such padding.
+    """
+    brotli_quality: int = 4
+
+    def process_response(self, request, response):
+        if not response.streaming and len(response.content) < settings.RESPONSE_COMPRESSION_MIN_SIZE:
+            return response
+        if response.has_header('Content-Encoding'):
+            return response
+        if self.get_encoding(request, response) != 'br':
+            return super().process_response(request, response)
+
+        patch_vary_headers(response, ('Accept-Encoding',))
+        if response.streaming:
+            if response.is_async:
+                original_iterator = response.streaming_content
+
+                async def brotli_wrapper():
+                    compressor = brotli.Compressor(quality=self.brotli_quality)
+                    async for chunk in original_iterator:
+                        yield compressor.process(chunk)
+                    yield compressor.finish()
+
+                response.streaming_content = brotli_wrapper()
+            else:
+                response.streaming_content = self.compress_sequence(response.streaming_content)
+            del response.headers['Content-Length']
+        else:
+            compressed_content = brotli.compress(response.content, quality=self.brotli_quality)
+            if len(compressed_content) >= len(response.content):
+                return response
+            response.content = compressed_content
+            response.headers['Content-Length'] = str(len(response.content))
+
+        # The compressed representation is not byte-identical, see GZipMiddleware
+        etag = response.get('ETag')
+        if etag and etag.startswith('"'):
+            response.headers['ETag'] = 'W/' + etag
+        response.headers['Content-Encoding'] = 'br'
+        return response
+
+    def get_encoding(self, request, response) -> str:
+        """
+        Returns 'br' when the response is to be compressed with brotli, 'gzip' otherwise.
+        """
+        if brotli is None or response.get('Content-Type', '').startswith('text/html'):
+            return 'gzip'
+        encodings = get_accepted_encodings(request.META.get('HTTP_ACCEPT_ENCODING', ''))
+        br = encodings.get('br', 0)
+        return 'br' if br > 0 and br >= encodings.get('gzip', 0) else 'gzip'
+
+    def compress_sequence(self, sequence):
+        compressor = brotli.Compressor(quality=self.brotli_quality)
+        for chunk in sequence:
+            data = compressor.process(chunk)
+            if data:
+                yield data
+        yield compressor.finish()
@@ -0,0 +1,34 @@
+# Generated by Django 4.2.13 on 2026-10-18 07:21
+
+from django.db import migrations, models
+
+# Keep the oldest copy of every reading that was uploaded more than once
+DELETE_DUPLICATES_SQL = """
+DELETE FROM levels_level AS duplicate
+USING levels_level AS original
+WHERE duplicate.id > original.id
+  AND duplicate.user_id = original.user_id
+  AND duplicate.device_serial_number = original.device_serial_number
+  AND duplicate.device_timestamp = original.device_timestamp
+  AND duplicate.recording_type = original.recording_type
+"""
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('levels', '0001_initial'),
+    ]
+
+    operations = [
+        migrations.AlterField(
+            model_name='level',
+            name='recording_type',
+            field=models.CharField(choices=[('0', 'History'), ('1', 'Scan')], db_index=True, max_length=15),
+        ),
+        migrations.RunSQL(DELETE_DUPLICATES_SQL, reverse_sql=migrations.RunSQL.noop),
+        migrations.AddConstraint(
+            model_name='level',
+            constraint=models.UniqueConstraint(fields=('user_id', 'device_serial_number', 'device_timestamp', 'recording_type'), name='level_natural_key_unique'),
+        ),
+    ]
@@ -0,0 +1,32 @@
+# Generated by Django 4.2.13 on 2026-10-18 07:23
+
+from django.db import migrations, models
+import uuid
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('levels', '0002_level_natural_key_unique'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='ImportJob',
+            fields=[
+                ('id', models.UUIDField(default=uuid.uuid4, editable=False, primary_key=True, serialize=False)),
+                ('user_id', models.UUIDField()),
+                ('file_name', models.CharField(max_length=255)),
+                ('mode', models.CharField(choices=[('append', 'Append'), ('ignore', 'Ignore'), ('update', 'Update')], default='ignore', max_length=15)),
+                ('state', models.CharField(choices=[('pending', 'Pending'), ('running', 'Running'), ('succeeded', 'Succeeded'), ('failed', 'Failed')], db_index=True, default='pending', max_length=15)),
+                ('rows_processed', models.PositiveBigIntegerField(default=0)),
+                ('rows_inserted', models.PositiveBigIntegerField(default=0)),
+                ('rows_updated', models.PositiveBigIntegerField(default=0)),
+                ('rows_skipped', models.PositiveBigIntegerField(default=0)),
+                ('error', models.TextField(blank=True, null=True)),
+                ('created_at', models.DateTimeField(auto_now_add=True)),
+                ('started_at', models.DateTimeField(blank=True, null=True)),
+                ('finished_at', models.DateTimeField(blank=True, null=True)),
+            ],
+        ),
+    ]
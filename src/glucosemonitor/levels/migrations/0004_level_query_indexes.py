@@ -0,0 +1,42 @@
+# Generated by Django 4.2.13 on 2026-10-18 07:40
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('levels', '0003_importjob'),
+    ]
+
+    # The new indexes are built before the ones they replace are dropped
+    operations = [
+        migrations.AddIndex(
+            model_name='level',
+            index=models.Index(fields=['user_id', 'device_timestamp', 'id'], name='level_user_timestamp_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='level',
+            index=models.Index(condition=models.Q(('recording_type__in', ['0', '1'])), fields=['user_id', 'device_timestamp'], include=('recording_type', 'glucose_history_mg_dl', 'glucose_scan_mg_dl'), name='level_user_glucose_idx'),
+        ),
+        migrations.AlterField(
+            model_name='level',
+            name='device_serial_number',
+            field=models.UUIDField(),
+        ),
+        migrations.AlterField(
+            model_name='level',
+            name='device_timestamp',
+            field=models.DateTimeField(),
+        ),
+        migrations.AlterField(
+            model_name='level',
+            name='recording_type',
+            field=models.CharField(choices=[('0', 'History'), ('1', 'Scan')], max_length=15),
+        ),
+        migrations.AlterField(
+            model_name='level',
+            name='user_id',
+            field=models.UUIDField(),
+        ),
+    ]
@@ -0,0 +1,55 @@
+# Generated by Django 4.2.13 on 2026-10-18 07:51
+
+from django.db import migrations, models
+
+POPULATE_ROLLUPS_SQL = """
+INSERT INTO levels_levelrollup
+    (user_id, period, bucket_start, recording_type, glucose_min, glucose_max, glucose_sum, glucose_count)
+SELECT user_id, 'hour', date_trunc('hour', device_timestamp AT TIME ZONE 'UTC') AT TIME ZONE 'UTC', recording_type,
+       MIN(glucose_value), MAX(glucose_value), SUM(glucose_value), COUNT(glucose_value)
+FROM (
+    SELECT user_id, device_timestamp, recording_type,
+           CASE recording_type WHEN '0' THEN glucose_history_mg_dl ELSE glucose_scan_mg_dl END AS glucose_value
+    FROM levels_level
+    WHERE recording_type IN ('0', '1')
+) AS reading
+GROUP BY 1, 3, 4
+HAVING COUNT(glucose_value) > 0;
+
+INSERT INTO levels_levelrollup
+    (user_id, period, bucket_start, recording_type, glucose_min, glucose_max, glucose_sum, glucose_count)
+SELECT user_id, 'day', date_trunc('day', bucket_start AT TIME ZONE 'UTC') AT TIME ZONE 'UTC', recording_type,
+       MIN(glucose_min), MAX(glucose_max), SUM(glucose_sum), SUM(glucose_count)
+FROM levels_levelrollup
+WHERE period = 'hour'
+GROUP BY 1, 3, 4;
+"""
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('levels', '0004_level_query_indexes'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='LevelRollup',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('user_id', models.UUIDField()),
+                ('period', models.CharField(choices=[('hour', 'Hour'), ('day', 'Day')], max_length=15)),
+                ('bucket_start', models.DateTimeField()),
+                ('recording_type', models.CharField(choices=[('0', 'History'), ('1', 'Scan')], max_length=15)),
+                ('glucose_min', models.IntegerField()),
+                ('glucose_max', models.IntegerField()),
+                ('glucose_sum', models.BigIntegerField()),
+                ('glucose_count', models.PositiveIntegerField()),
+            ],
+        ),
+        migrations.AddConstraint(
+            model_name='levelrollup',
+            constraint=models.UniqueConstraint(fields=('user_id', 'period', 'bucket_start', 'recording_type'), name='level_rollup_bucket_unique'),
+        ),
+        migrations.RunSQL(POPULATE_ROLLUPS_SQL, reverse_sql=migrations.RunSQL.noop),
+    ]
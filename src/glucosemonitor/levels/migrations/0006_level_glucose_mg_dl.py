@@ -0,0 +1,22 @@
+# Generated by Django 4.2.13 on 2026-10-18 07:59
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('levels', '0005_levelrollup'),
+    ]
+
+    operations = [
+        migrations.RemoveIndex(
+            model_name='level',
+            name='level_user_glucose_idx',
+        ),
+        migrations.AddField(
+            model_name='level',
+            name='glucose_mg_dl',
+            field=models.IntegerField(blank=True, editable=False, null=True),
+        ),
+    ]
@@ -0,0 +1,40 @@
+# Generated by Django 4.2.13 on 2026-10-18 07:59
+
+from django.db import migrations, transaction
+from django.db.models import Case, F, Max, Min, When
+
+# Number of ids updated in each transaction of the backfill
+BACKFILL_BATCH_SIZE = 10000
+
+
+def backfill_glucose_mg_dl(apps, schema_editor):
+    """
+    Fills glucose_mg_dl for the existing readings, committing every batch of ids,
+    so the table is never locked for the whole backfill.
+    """
+    Level = apps.get_model('levels', 'Level')
+    db = schema_editor.connection.alias
+    bounds = Level.objects.using(db).aggregate(first=Min('id'), last=Max('id'))
+    if bounds['first'] is None:
+        return
+    for start in range(bounds['first'], bounds['last'] + 1, BACKFILL_BATCH_SIZE):
+        with transaction.atomic(using=db):
+            Level.objects.using(db).filter(
+                id__gte=start, id__lt=start + BACKFILL_BATCH_SIZE, recording_type__in=['0', '1']
+            ).update(glucose_mg_dl=Case(
+                When(recording_type='0', then=F('glucose_history_mg_dl')),
+                default=F('glucose_scan_mg_dl'),
+            ))
+
+
+class Migration(migrations.Migration):
+    # The backfill commits batch by batch
+    atomic = False
+
+    dependencies = [
+        ('levels', '0006_level_glucose_mg_dl'),
+    ]
+
+    operations = [
+        migrations.RunPython(backfill_glucose_mg_dl, reverse_code=migrations.RunPython.noop),
+    ]
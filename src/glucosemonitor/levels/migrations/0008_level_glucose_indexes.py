@@ -0,0 +1,21 @@
+# Generated by Django 4.2.13 on 2026-10-18 07:59
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('levels', '0007_backfill_glucose_mg_dl'),
+    ]
+
+    operations = [
+        migrations.AddIndex(
+            model_name='level',
+            index=models.Index(condition=models.Q(('glucose_mg_dl__isnull', False)), fields=['user_id', 'device_timestamp'], include=('recording_type', 'glucose_mg_dl'), name='level_user_glucose_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='level',
+            index=models.Index(fields=['user_id', 'glucose_mg_dl', 'id'], name='level_user_glucose_value_idx'),
+        ),
+    ]
@@ -0,0 +1,69 @@
+# Generated by Django 4.2.13 on 2026-10-18 14:02
+
+import django.db.models.deletion
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('levels', '0008_level_glucose_indexes'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='Device',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('user_id', models.UUIDField()),
+                ('serial_number', models.UUIDField()),
+                ('name', models.CharField(max_length=100)),
+            ],
+            options={
+                'constraints': [models.UniqueConstraint(fields=('user_id', 'serial_number'), name='device_user_serial_number_unique')],
+            },
+        ),
+        migrations.CreateModel(
+            name='LevelEvent',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('user_id', models.UUIDField()),
+                ('device_timestamp', models.DateTimeField()),
+                ('recording_type', models.CharField(choices=[('0', 'History'), ('1', 'Scan')], max_length=15)),
+                ('fast_acting_insulin', models.CharField(blank=True, max_length=100, null=True)),
+                ('fast_acting_insulin_units', models.FloatField(blank=True, null=True)),
+                ('food_data', models.CharField(blank=True, max_length=100, null=True)),
+                ('carbohydrates_grams', models.FloatField(blank=True, null=True)),
+                ('carbohydrates_servings', models.FloatField(blank=True, null=True)),
+                ('long_acting_insulin', models.CharField(blank=True, max_length=100, null=True)),
+                ('long_acting_insulin_units', models.FloatField(blank=True, null=True)),
+                ('notes', models.TextField(blank=True, null=True)),
+                ('glucose_test_strip_mg_dl', models.IntegerField(blank=True, null=True)),
+                ('ketone_mmol_l', models.FloatField(blank=True, null=True)),
+                ('meal_insulin_units', models.FloatField(blank=True, null=True)),
+                ('correction_insulin_units', models.FloatField(blank=True, null=True)),
+                ('user_adjusted_insulin_units', models.FloatField(blank=True, null=True)),
+                ('device', models.ForeignKey(db_index=False, on_delete=django.db.models.deletion.CASCADE, related_name='events', to='levels.device')),
+            ],
+            options={
+                'constraints': [models.UniqueConstraint(fields=('device_id', 'device_timestamp', 'recording_type'), name='level_event_natural_key_unique')],
+            },
+        ),
+        # The columns moved away are nullable until they are dropped, so that they can be filled
+        # again when the migration is reverted
+        migrations.AlterField(
+            model_name='level',
+            name='device_name',
+            field=models.CharField(max_length=100, null=True),
+        ),
+        migrations.AlterField(
+            model_name='level',
+            name='device_serial_number',
+            field=models.UUIDField(null=True),
+        ),
+        migrations.AddField(
+            model_name='level',
+            name='device',
+            field=models.ForeignKey(db_index=False, null=True, on_delete=django.db.models.deletion.CASCADE, related_name='levels', to='levels.device'),
+        ),
+    ]
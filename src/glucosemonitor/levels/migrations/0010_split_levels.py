@@ -0,0 +1,102 @@
+# Generated by Django 4.2.13 on 2026-10-18 14:02
+
+from django.db import migrations, transaction
+from django.db.models import Max, Min, OuterRef, Q, Subquery
+
+# Number of ids moved in each transaction of the backfill
+BACKFILL_BATCH_SIZE = 10000
+
+EVENT_FIELDS = (
+    'fast_acting_insulin',
+    'fast_acting_insulin_units',
+    'food_data',
+    'carbohydrates_grams',
+    'carbohydrates_servings',
+    'long_acting_insulin',
+    'long_acting_insulin_units',
+    'notes',
+    'glucose_test_strip_mg_dl',
+    'ketone_mmol_l',
+    'meal_insulin_units',
+    'correction_insulin_units',
+    'user_adjusted_insulin_units',
+)
+
+
+def get_batches(Level, db: str) -> list:
+    """
+    Returns the querysets of the readings of every batch of ids.
+    """
+    bounds = Level.objects.using(db).aggregate(first=Min('id'), last=Max('id'))
+    if bounds['first'] is None:
+        return []
+    return [
+        Level.objects.using(db).filter(id__gte=start, id__lt=start + BACKFILL_BATCH_SIZE)
+        for start in range(bounds['first'], bounds['last'] + 1, BACKFILL_BATCH_SIZE)
+    ]
+
+
+def split_levels(apps, schema_editor):
+    """
+    Moves the devices of the readings to the Device table and their events to the LevelEvent
+    table, committing every batch of ids, so the table is never locked for the whole backfill.
+    """
+    Level = apps.get_model('levels', 'Level')
+    Device = apps.get_model('levels', 'Device')
+    LevelEvent = apps.get_model('levels', 'LevelEvent')
+    db = schema_editor.connection.alias
+
+    devices = Level.objects.using(db).values('user_id', 'device_serial_number').annotate(
+        name=Max('device_name')
+    ).order_by()
+    Device.objects.using(db).bulk_create(
+        Device(user_id=device['user_id'], serial_number=device['device_serial_number'], name=device['name'])
+        for device in devices
+    )
+    device_id = Subquery(Device.objects.using(db).filter(
+        user_id=OuterRef('user_id'), serial_number=OuterRef('device_serial_number')
+    ).values('id')[:1])
+    has_event = Q(*(Q(**{f'{name}__isnull': False}) for name in EVENT_FIELDS), _connector=Q.OR)
+    for batch in get_batches(Level, db):
+        with transaction.atomic(using=db):
+            batch.update(device_id=device_id)
+            LevelEvent.objects.using(db).bulk_create(
+                LevelEvent(**event) for event in batch.filter(has_event).values(
+                    'user_id', 'device_id', 'device_timestamp', 'recording_type', *EVENT_FIELDS
+                )
+            )
+
+
+def merge_levels(apps, schema_editor):
+    """
+    Copies the devices and the events back to the readings.
+    """
+    Level = apps.get_model('levels', 'Level')
+    Device = apps.get_model('levels', 'Device')
+    LevelEvent = apps.get_model('levels', 'LevelEvent')
+    db = schema_editor.connection.alias
+
+    devices = Device.objects.using(db).filter(pk=OuterRef('device_id'))
+    for batch in get_batches(Level, db):
+        with transaction.atomic(using=db):
+            batch.update(
+                device_name=Subquery(devices.values('name')[:1]),
+                device_serial_number=Subquery(devices.values('serial_number')[:1]),
+            )
+    for event in LevelEvent.objects.using(db).iterator():
+        Level.objects.using(db).filter(
+            device_id=event.device_id, device_timestamp=event.device_timestamp, recording_type=event.recording_type
+        ).update(**{name: getattr(event, name) for name in EVENT_FIELDS})
+
+
+class Migration(migrations.Migration):
+    # The backfill commits batch by batch
+    atomic = False
+
+    dependencies = [
+        ('levels', '0009_device_levelevent'),
+    ]
+
+    operations = [
+        migrations.RunPython(split_levels, reverse_code=merge_levels),
+    ]
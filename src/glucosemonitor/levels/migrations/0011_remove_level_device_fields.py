@@ -0,0 +1,68 @@
+# Generated by Django 4.2.13 on 2026-10-18 14:02
+
+import django.db.models.deletion
+from django.db import migrations, models
+
+# Fields moved to the LevelEvent table
+EVENT_FIELDS = (
+    'fast_acting_insulin',
+    'fast_acting_insulin_units',
+    'food_data',
+    'carbohydrates_grams',
+    'carbohydrates_servings',
+    'long_acting_insulin',
+    'long_acting_insulin_units',
+    'notes',
+    'glucose_test_strip_mg_dl',
+    'ketone_mmol_l',
+    'meal_insulin_units',
+    'correction_insulin_units',
+    'user_adjusted_insulin_units',
+)
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('levels', '0010_split_levels'),
+    ]
+
+    operations = [
+        migrations.AlterField(
+            model_name='level',
+            name='device',
+            field=models.ForeignKey(db_index=False, on_delete=django.db.models.deletion.CASCADE, related_name='levels', to='levels.device'),
+        ),
+        migrations.RemoveConstraint(
+            model_name='level',
+            name='level_natural_key_unique',
+        ),
+        migrations.AddConstraint(
+            model_name='level',
+            constraint=models.UniqueConstraint(fields=('device_id', 'device_timestamp', 'recording_type'), name='level_natural_key_unique'),
+        ),
+        migrations.RemoveField(
+            model_name='level',
+            name='device_name',
+        ),
+        migrations.RemoveField(
+            model_name='level',
+            name='device_serial_number',
+        ),
+        *(migrations.RemoveField(model_name='level', name=name) for name in EVENT_FIELDS),
+        migrations.AlterField(
+            model_name='level',
+            name='glucose_history_mg_dl',
+            field=models.SmallIntegerField(blank=True, null=True),
+        ),
+        migrations.AlterField(
+            model_name='level',
+            name='glucose_scan_mg_dl',
+            field=models.SmallIntegerField(blank=True, null=True),
+        ),
+        migrations.AlterField(
+            model_name='level',
+            name='glucose_mg_dl',
+            field=models.SmallIntegerField(blank=True, editable=False, null=True),
+        ),
+    ]
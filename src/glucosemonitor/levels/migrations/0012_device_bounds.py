@@ -0,0 +1,40 @@
+# Generated by Django 4.2.13 on 2026-10-18 09:12
+
+from django.db import migrations, models
+from django.db.models import OuterRef, Subquery
+
+
+def fill_bounds(apps, schema_editor):
+    """
+    Sets the first and last reading timestamps of every device, read from the natural key index.
+    """
+    Level = apps.get_model('levels', 'Level')
+    Device = apps.get_model('levels', 'Device')
+    db = schema_editor.connection.alias
+
+    readings = Level.objects.using(db).filter(device_id=OuterRef('pk')).values('device_timestamp')
+    Device.objects.using(db).update(
+        first_device_timestamp=Subquery(readings.order_by('device_timestamp')[:1]),
+        last_device_timestamp=Subquery(readings.order_by('-device_timestamp')[:1]),
+    )
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('levels', '0011_remove_level_device_fields'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='device',
+            name='first_device_timestamp',
+            field=models.DateTimeField(blank=True, null=True),
+        ),
+        migrations.AddField(
+            model_name='device',
+            name='last_device_timestamp',
+            field=models.DateTimeField(blank=True, null=True),
+        ),
+        migrations.RunPython(fill_bounds, reverse_code=migrations.RunPython.noop),
+    ]
@@ -1,7 +1,264 @@
+import uuid
+from datetime import datetime, timedelta, timezone
 from typing import Optional
 
-from django.db import models
-from django.db.models import Manager, Case, When, Value, Min, Max
+from django.db import connections, models, router, transaction
+from django.db.models import (
+    F, FloatField, IntegerField, Manager, Min, Max, Sum, Count, OuterRef, Q, Subquery, Value
+)
+from django.db.models.functions import Cast, Coalesce, Extract, Floor, Greatest, Least, Trunc
+from django.utils.timezone import is_naive, make_aware
+
+from glucosemonitor.levels.cache import bump_data_version
+from glucosemonitor.levels.device_cache import device_cache
+from glucosemonitor.levels.routers import pin_to_primary
+
+# Fields identifying a single reading of a device, regardless of how often it is uploaded.
+# The device belongs to a single user, see Device.
+NATURAL_KEY_FIELDS: tuple = ('device_id', 'device_timestamp', 'recording_type')
+
+# Fields of the insulin doses, food, notes and test strip measurements recorded along with a
+# reading, stored in the LevelEvent table
+EVENT_FIELDS: tuple = (
+    'fast_acting_insulin',
+    'fast_acting_insulin_units',
+    'food_data',
+    'carbohydrates_grams',
+    'carbohydrates_servings',
+    'long_acting_insulin',
+    'long_acting_insulin_units',
+    'notes',
+    'glucose_test_strip_mg_dl',
+    'ketone_mmol_l',
+    'meal_insulin_units',
+    'correction_insulin_units',
+    'user_adjusted_insulin_units',
+)
+
+
+def lock_user(user_id, using: str):
+    """
+    Takes the PostgreSQL advisory lock of a user until the end of the current transaction, keyed
+    by the first 64 bits of the user ID. Other databases are left unlocked.
+
+    Args:
+        user_id (UUID): The ID of the user.
+        using (str): The alias of the database.
+    """
+    connection = connections[using]
+    if connection.vendor != 'postgresql':
+        return
+    key = int.from_bytes(uuid.UUID(str(user_id)).bytes[:8], 'big', signed=True)
+    with connection.cursor() as cursor:
+        cursor.execute("SELECT pg_advisory_xact_lock(%s)", [key])
+
+
+class IngestMode(models.TextChoices):
+    """
+    Choices for how imported rows that already exist in the database are handled.
+    """
+    APPEND: str = "append"
+    IGNORE: str = "ignore"
+    UPDATE: str = "update"
+
+
+class SeriesMode(models.TextChoices):
+    """
+    Choices for how a series of glucose levels is downsampled.
+    """
+    AGGREGATE: str = "aggregate"
+    LTTB: str = "lttb"
+
+
+class CountMode(models.TextChoices):
+    """
+    Choices for how the pages of the level list count the matching readings.
+    """
+    EXACT: str = "exact"
+    ESTIMATE: str = "estimate"
+    NONE: str = "none"
+
+
+class DeviceManager(Manager):
+    """
+    Custom manager for the Device model
+    """
+
+    def resolve(self, user_id, names: dict[str, str], update: bool = False) -> dict[str, int]:
+        """
+        Returns the IDs of devices of a user, creating the devices that are not stored yet in a
+        single query. Devices found in the in-process ``device_cache`` are only checked to still
+        exist, all at once by primary key: another process may have deleted them, and their readings
+        would then fail on the foreign key. Those are evicted and looked up again.
+
+        Args:
+            user_id (UUID): The ID of the user.
+            names (dict[str, str]): The names of the devices by serial number.
+            update (bool, optional): Whether the names of the stored devices are overwritten. Defaults to False.
+
+        Returns:
+            dict[str, int]: The IDs of the devices by serial number, as given in ``names``.
+        """
+        user_id = uuid.UUID(str(user_id))
+        ids, missing = {}, {}
+        for serial_number, name in names.items():
+            cached = device_cache.get((self.db, user_id, uuid.UUID(str(serial_number))))
+            if cached is not None and (not update or cached[1] == name):
+                ids[serial_number] = cached[0]
+            else:
+                missing[serial_number] = name
+        if ids:
+            stored_ids = set(self.filter(id__in=list(ids.values())).values_list('id', flat=True))
+            deleted = [serial_number for serial_number, pk in ids.items() if pk not in stored_ids]
+            device_cache.evict((self.db, user_id, uuid.UUID(str(serial_number))) for serial_number in deleted)
+            for serial_number in deleted:
+                del ids[serial_number]
+                missing[serial_number] = names[serial_number]
+        if not missing:
+            return ids
+
+        devices = [
+            self.model(user_id=user_id, serial_number=serial_number, name=name)
+            for serial_number, name in missing.items()
+        ]
+        if update:
+            self.bulk_create(
+                devices, update_conflicts=True, unique_fields=['user_id', 'serial_number'], update_fields=['name']
+            )
+        else:
+            self.bulk_create(devices, ignore_conflicts=True)
+        stored = {
+            serial_number: (pk, name) for serial_number, pk, name in self.filter(
+                user_id=user_id, serial_number__in=list(missing)
+            ).values_list('serial_number', 'id', 'name')
+        }
+        ids.update({
+            serial_number: stored[uuid.UUID(str(serial_number))][0] for serial_number in missing
+        })
+        # Devices created in a transaction that is rolled back must not be cached
+        entries = {(self.db, user_id, serial_number): entry for serial_number, entry in stored.items()}
+        transaction.on_commit(lambda: device_cache.update(entries), using=self.db)
+        return ids
+
+    def extend_bounds(self, bounds: dict[int, tuple[datetime, datetime]]):
+        """
+        Extends the first and last reading timestamps of devices to cover newly written readings.
+
+        Args:
+            bounds (dict[int, tuple[datetime, datetime]]): The first and last timestamps of the
+                written readings by device ID.
+        """
+        for device_id, (first, last) in bounds.items():
+            self.filter(pk=device_id).update(
+                first_device_timestamp=Least(Coalesce('first_device_timestamp', Value(first)), Value(first)),
+                last_device_timestamp=Greatest(Coalesce('last_device_timestamp', Value(last)), Value(last)),
+            )
+
+    def rebuild_bounds(self, user_id=None, device_ids: Optional[list[int]] = None) -> int:
+        """
+        Recomputes the first and last reading timestamps of the devices of a user, or of every
+        user, from the stored readings.
+
+        Args:
+            user_id (UUID, optional): The ID of the user. Defaults to every user.
+            device_ids (list[int], optional): The IDs of the devices. Defaults to every device.
+
+        Returns:
+            int: The number of updated devices.
+        """
+        readings = Level.objects.using(self.db).filter(device_id=OuterRef('pk')).order_by()
+        devices = self.all() if user_id is None else self.filter(user_id=user_id)
+        if device_ids is not None:
+            devices = devices.filter(pk__in=device_ids)
+        return devices.update(
+            first_device_timestamp=Subquery(readings.values('device_timestamp').order_by('device_timestamp')[:1]),
+            last_device_timestamp=Subquery(readings.values('device_timestamp').order_by('-device_timestamp')[:1]),
+        )
+
+
+class Device(models.Model):
+    """
+    Model to store the devices the readings of a user are recorded with.
+    """
+    user_id = models.UUIDField()
+    serial_number = models.UUIDField()
+    name = models.CharField(max_length=100)
+    # Timestamps of the first and last readings of the device, kept up to date as readings are
+    # written, see DeviceManager.extend_bounds
+    first_device_timestamp = models.DateTimeField(null=True, blank=True)
+    last_device_timestamp = models.DateTimeField(null=True, blank=True)
+
+    objects = DeviceManager()
+
+    class Meta:
+        constraints = [
+            models.UniqueConstraint(fields=['user_id', 'serial_number'], name='device_user_serial_number_unique'),
+        ]
+
+    def __str__(self):
+        return f"{self.user_id}::{self.serial_number}"
+
+
+def device_property(name: str) -> property:
+    """
+    Returns a property giving the ``name`` field of the device of a reading. When it is set, also
+    as a keyword argument of the model, the device is looked up or created as the reading is saved.
+    """
+    def get(self):
+        pending = self.__dict__.get('_pending_device')
+        if pending and name in pending:
+            return pending[name]
+        return None if self.device_id is None else getattr(self.device, name)
+
+    def set(self, value):
+        self.__dict__.setdefault('_pending_device', {})[name] = value
+
+    return property(get, set)
+
+
+def event_property(name: str) -> property:
+    """
+    Returns a property giving the ``name`` field of the event of a reading, None when the reading
+    has no event. When it is set, also as a keyword argument of the model, the event is saved
+    along with the reading.
+    """
+    def get(self):
+        event = self.event
+        return None if event is None else getattr(event, name)
+
+    def set(self, value):
+        if self.event is None:
+            if value is None:
+                return
+            self._event = LevelEvent()
+        setattr(self._event, name, value)
+
+    return property(get, set)
+
+
+class LevelQuerySet(models.QuerySet):
+    """
+    Custom queryset for the Level model
+    """
+
+    def delete(self):
+        """
+        Deletes the readings like ``QuerySet.delete``, then refreshes what is derived from them,
+        see ``LevelManager.refresh_derived``.
+        """
+        ranges = list(self.values('user_id', 'device_id').annotate(
+            start=Min('device_timestamp'), stop=Max('device_timestamp')
+        ).order_by())
+        deleted = super().delete()
+        bounds: dict[uuid.UUID, dict[int, tuple[datetime, datetime]]] = {}
+        for device_range in ranges:
+            bounds.setdefault(device_range['user_id'], {})[device_range['device_id']] = (
+                device_range['start'], device_range['stop']
+            )
+        manager = Level.objects.db_manager(self.db)
+        for user_id, user_bounds in bounds.items():
+            manager.refresh_derived(user_id, user_bounds, deleted=True)
+        return deleted
 
 
 class LevelManager(Manager):
@@ -9,26 +266,146 @@ class LevelManager(Manager):
     Custom manager for the Level model
     """
 
+    def get_queryset(self) -> LevelQuerySet:
+        return LevelQuerySet(self.model, using=self._db)
+
+    def refresh_derived(self, user_id, bounds: dict[int, tuple[datetime, datetime]], deleted: bool = False):
+        """
+        Brings what is derived from the readings of a user up to date once readings were written
+        or deleted: the rollup buckets and the device bounds covering them are refreshed, the data
+        version of the user is moved forward, see ``bump_data_version``, again once the transaction
+        is committed, and the reads of the user are pinned to the primary database, see ``pin_to_primary``.
+
+        The refreshes of a user are serialized by a transaction-level advisory lock on PostgreSQL, held
+        until the transaction writing the readings is committed: the buckets are deleted and inserted
+        again, so concurrent imports of overlapping buckets would otherwise conflict on the unique
+        constraint or write aggregates missing the readings of each other.
+
+        Args:
+            user_id (UUID): The ID of the user.
+            bounds (dict[int, tuple[datetime, datetime]]): The first and last timestamps of the
+                written or deleted readings by device ID.
+            deleted (bool, optional): Whether the readings were deleted, so that the device bounds
+                are recomputed rather than extended. Defaults to False.
+        """
+        bounds = {
+            device_id: tuple(make_aware(timestamp) if is_naive(timestamp) else timestamp for timestamp in pair)
+            for device_id, pair in bounds.items()
+        }
+        with transaction.atomic(using=self.db):
+            lock_user(user_id, self.db)
+            LevelRollup.objects.db_manager(self.db).refresh(
+                user_id, min(first for first, _ in bounds.values()), max(last for _, last in bounds.values())
+            )
+            if deleted:
+                Device.objects.db_manager(self.db).rebuild_bounds(device_ids=list(bounds))
+            else:
+                Device.objects.db_manager(self.db).extend_bounds(bounds)
+        bump_data_version(user_id)
+        if transaction.get_connection(self.db).in_atomic_block:
+            # Responses built from the readings before the commit meanwhile are left behind as well
+            transaction.on_commit(lambda: bump_data_version(user_id), using=self.db)
+        pin_to_primary(user_id)
+
     def get_min_max_aggregation(self, qs):
         """
         Aggregate minimum and maximum glucose levels for the given queryset.
         """
-        glucose_value_q = Case(
-            When(recording_type=Level.RecordingType.HISTORY, then='glucose_history_mg_dl'),
-            When(recording_type=Level.RecordingType.SCAN, then='glucose_scan_mg_dl'),
-            default=Value(0),
-        )
-        return qs.filter(
-            recording_type__in=[Level.RecordingType.HISTORY, Level.RecordingType.SCAN]
-        ).values('user_id').annotate(
-            glucose_level_min=Min(glucose_value_q),
-            glucose_level_max=Max(glucose_value_q),
+        return qs.filter(glucose_mg_dl__isnull=False).values('user_id').annotate(
+            glucose_level_min=Min('glucose_mg_dl'),
+            glucose_level_max=Max('glucose_mg_dl'),
         )
 
+    def get_device_watermarks(self, user_id: str) -> dict[int, datetime]:
+        """
+        Return the latest device timestamp stored for every device of the given user, by device ID.
+        It is read from the Device table, without scanning the readings.
+        """
+        return dict(Device.objects.using(self.db).filter(
+            user_id=user_id, last_device_timestamp__isnull=False
+        ).values_list('id', 'last_device_timestamp'))
+
+    def resolve_devices(self, levels: list):
+        """
+        Sets the device of the readings given a device serial number and name, looking up or creating it.
+        """
+        pending = [level for level in levels if level.__dict__.get('_pending_device')]
+        names: dict[uuid.UUID, dict[str, str]] = {}
+        for level in pending:
+            user_names = names.setdefault(uuid.UUID(str(level.user_id)), {})
+            user_names[str(level.device_serial_number)] = level.device_name or ''
+        ids = {
+            user_id: Device.objects.db_manager(self.db).resolve(user_id, user_names, update=True)
+            for user_id, user_names in names.items()
+        }
+        for level in pending:
+            serial_number = str(level.device_serial_number)
+            del level._pending_device
+            level.device_id = ids[uuid.UUID(str(level.user_id))][serial_number]
+
+    def bulk_create(self, objs, batch_size: Optional[int] = None, ignore_conflicts: bool = False,
+                    update_conflicts: bool = False, **kwargs):
+        """
+        Creates readings like ``QuerySet.bulk_create``, setting their device first when it is given by
+        its serial number and name, see ``resolve_devices``, computing their ``glucose_mg_dl`` like
+        ``save()`` does, and refreshing what is derived from them, see ``refresh_derived``. Their events
+        are created in the same transaction under their natural key, skipped or overwritten like the
+        readings on conflicts.
+        """
+        objs = list(objs)
+        with transaction.atomic(using=self.db):
+            self.resolve_devices(objs)
+            for level in objs:
+                level.glucose_mg_dl = level.get_glucose_mg_dl()
+            created = super().bulk_create(
+                objs, batch_size=batch_size, ignore_conflicts=ignore_conflicts, update_conflicts=update_conflicts,
+                **kwargs
+            )
+            events = []
+            for level in objs:
+                event = level.__dict__.get('_event')
+                if event is None or all(getattr(event, name) is None for name in EVENT_FIELDS):
+                    continue
+                event.user_id, event.device_id = level.user_id, level.device_id
+                event.device_timestamp, event.recording_type = level.device_timestamp, level.recording_type
+                events.append(event)
+            if update_conflicts:
+                LevelEvent.objects.using(self.db).bulk_create(
+                    events, batch_size=batch_size, update_conflicts=True,
+                    unique_fields=NATURAL_KEY_FIELDS, update_fields=EVENT_FIELDS,
+                )
+            else:
+                LevelEvent.objects.using(self.db).bulk_create(
+                    events, batch_size=batch_size, ignore_conflicts=ignore_conflicts
+                )
+        bounds: dict[uuid.UUID, dict[int, tuple[datetime, datetime]]] = {}
+        for level in objs:
+            user_bounds = bounds.setdefault(uuid.UUID(str(level.user_id)), {})
+            first, last = user_bounds.get(level.device_id, (level.device_timestamp, level.device_timestamp))
+            user_bounds[level.device_id] = min(first, level.device_timestamp), max(last, level.device_timestamp)
+        for user_id, user_bounds in bounds.items():
+            self.refresh_derived(user_id, user_bounds)
+        return created
+
+    def bulk_update(self, objs, fields, *args, **kwargs):
+        """
+        Updates readings like ``QuerySet.bulk_update``, along with their ``glucose_mg_dl`` when one
+        of the fields it is computed from is updated.
+        """
+        objs = list(objs)
+        if {'recording_type', 'glucose_history_mg_dl', 'glucose_scan_mg_dl'} & set(fields):
+            for level in objs:
+                level.glucose_mg_dl = level.get_glucose_mg_dl()
+            fields = [*fields, 'glucose_mg_dl']
+        return super().bulk_update(objs, fields, *args, **kwargs)
+
 
 class Level(models.Model):
     """
-    Model to store glucose levels and related data for users.
+    Model to store glucose levels of users, one row per reading. The device of a reading is
+    stored in the Device table and the few insulin doses, food, notes and test strip
+    measurements in the LevelEvent table, so the rows stay narrow. Both are still read and
+    written through the fields of the former single table, such as ``device_name`` and ``notes``.
     """
 
     class RecordingType(models.TextChoices):
@@ -45,14 +422,129 @@ class Level(models.Model):
                 1: cls.SCAN,
             }.get(value)
 
-    user_id = models.UUIDField(db_index=True)
-    device_name = models.CharField(max_length=100)
-    device_serial_number = models.UUIDField(db_index=True)
-    device_timestamp = models.DateTimeField(db_index=True)
+    user_id = models.UUIDField()
+    # The natural key constraint serves the lookups by device
+    device = models.ForeignKey(Device, on_delete=models.CASCADE, related_name='levels', db_index=False)
+    device_timestamp = models.DateTimeField()
+
+    recording_type = models.CharField(choices=RecordingType.choices, max_length=15)
+    glucose_history_mg_dl = models.SmallIntegerField(null=True, blank=True)
+    glucose_scan_mg_dl = models.SmallIntegerField(null=True, blank=True)
+    # Glucose value of the reading: the history value of history readings, the scan value of scans
+    glucose_mg_dl = models.SmallIntegerField(null=True, blank=True, editable=False)
+
+    device_name = device_property('name')
+    device_serial_number = device_property('serial_number')
+
+    fast_acting_insulin = event_property('fast_acting_insulin')
+    fast_acting_insulin_units = event_property('fast_acting_insulin_units')
+    food_data = event_property('food_data')
+    carbohydrates_grams = event_property('carbohydrates_grams')
+    carbohydrates_servings = event_property('carbohydrates_servings')
+    long_acting_insulin = event_property('long_acting_insulin')
+    long_acting_insulin_units = event_property('long_acting_insulin_units')
+    notes = event_property('notes')
+    glucose_test_strip_mg_dl = event_property('glucose_test_strip_mg_dl')
+    ketone_mmol_l = event_property('ketone_mmol_l')
+    meal_insulin_units = event_property('meal_insulin_units')
+    correction_insulin_units = event_property('correction_insulin_units')
+    user_adjusted_insulin_units = event_property('user_adjusted_insulin_units')
+
+    objects = LevelManager()
+
+    class Meta:
+        constraints = [
+            models.UniqueConstraint(fields=NATURAL_KEY_FIELDS, name='level_natural_key_unique'),
+        ]
+        # Every query filters on a user and a time range. The natural key constraint serves
+        # the per-device lookups, so the single-column indexes are not needed.
+        indexes = [
+            # Listing and exporting, ordered on the time and the id as the keyset pagination does
+            models.Index(fields=['user_id', 'device_timestamp', 'id'], name='level_user_timestamp_idx'),
+            # Aggregations of the glucose values over a time range, answered from the index alone
+            models.Index(
+                fields=['user_id', 'device_timestamp'],
+                include=['recording_type', 'glucose_mg_dl'],
+                condition=models.Q(glucose_mg_dl__isnull=False),
+                name='level_user_glucose_idx',
+            ),
+            # Listing ordered on the glucose value
+            models.Index(fields=['user_id', 'glucose_mg_dl', 'id'], name='level_user_glucose_value_idx'),
+        ]
 
-    recording_type = models.CharField(choices=RecordingType.choices, db_index=True, max_length=15)
-    glucose_history_mg_dl = models.IntegerField(null=True, blank=True)
-    glucose_scan_mg_dl = models.IntegerField(null=True, blank=True)
+    def __str__(self):
+        return f"{self.user_id}::{self.device_timestamp}::{self.recording_type}"
+
+    @property
+    def event(self) -> Optional['LevelEvent']:
+        """
+        The event recorded along with the reading, None if there is none. It is read once, by the
+        natural key of the reading.
+        """
+        if '_event' not in self.__dict__:
+            self._event = None if self._state.adding else LevelEvent.objects.using(self._state.db).filter(
+                device_id=self.device_id, device_timestamp=self.device_timestamp, recording_type=self.recording_type
+            ).first()
+        return self._event
+
+    def get_glucose_mg_dl(self) -> Optional[int]:
+        """
+        Returns the glucose value of the reading, depending on its recording type.
+        """
+        return {
+            self.RecordingType.HISTORY: self.glucose_history_mg_dl,
+            self.RecordingType.SCAN: self.glucose_scan_mg_dl,
+        }.get(self.recording_type)
+
+    def save(self, *args, **kwargs):
+        using = kwargs.get('using') or router.db_for_write(Level, instance=self)
+        update_fields = kwargs.get('update_fields')
+        if update_fields is not None and self.__dict__.get('_pending_device'):
+            update_fields = kwargs['update_fields'] = {*update_fields, 'device'}
+        Level.objects.db_manager(using).resolve_devices([self])
+
+        self.glucose_mg_dl = self.get_glucose_mg_dl()
+        if update_fields is not None and {'recording_type', 'glucose_history_mg_dl', 'glucose_scan_mg_dl'} & set(
+                update_fields):
+            kwargs['update_fields'] = {*update_fields, 'glucose_mg_dl'}
+        super().save(*args, **kwargs)
+        self.save_event(using)
+
+    def delete(self, *args, **kwargs):
+        deleted = super().delete(*args, **kwargs)
+        Level.objects.db_manager(kwargs.get('using') or self._state.db).refresh_derived(
+            self.user_id, {self.device_id: (self.device_timestamp, self.device_timestamp)}, deleted=True
+        )
+        return deleted
+
+    def save_event(self, using: str):
+        """
+        Saves the event of the reading with the natural key of the reading, or deletes it when all
+        its fields were set to None.
+        """
+        event = self.__dict__.get('_event')
+        if event is None:
+            return
+        if all(getattr(event, name) is None for name in EVENT_FIELDS):
+            if event.pk is not None:
+                event.delete(using=using)
+            self._event = None
+            return
+        event.user_id, event.device_id = self.user_id, self.device_id
+        event.device_timestamp, event.recording_type = self.device_timestamp, self.recording_type
+        event.save(using=using)
+
+
+class LevelEvent(models.Model):
+    """
+    Model to store the insulin doses, food, notes and test strip measurements recorded along
+    with a reading. Few readings have any, so they are kept out of the Level table. An event
+    has the natural key of its reading, see ``Level.event``.
+    """
+    user_id = models.UUIDField()
+    device = models.ForeignKey(Device, on_delete=models.CASCADE, related_name='events', db_index=False)
+    device_timestamp = models.DateTimeField()
+    recording_type = models.CharField(choices=Level.RecordingType.choices, max_length=15)
 
     fast_acting_insulin = models.CharField(max_length=100, null=True, blank=True)
     fast_acting_insulin_units = models.FloatField(null=True, blank=True)
@@ -74,7 +566,502 @@ class Level(models.Model):
     correction_insulin_units = models.FloatField(null=True, blank=True)
     user_adjusted_insulin_units = models.FloatField(null=True, blank=True)
 
-    objects = LevelManager()
+    class Meta:
+        constraints = [
+            models.UniqueConstraint(fields=NATURAL_KEY_FIELDS, name='level_event_natural_key_unique'),
+        ]
 
     def __str__(self):
         return f"{self.user_id}::{self.device_timestamp}::{self.recording_type}"
+
+
+class ImportJob(models.Model):
+    """
+    Model to track the asynchronous import of an uploaded CSV file.
+    """
+
+    class State(models.TextChoices):
+        """
+        Choices for the state of an import job.
+        """
+        PENDING: str = "pending"
+        RUNNING: str = "running"
+        SUCCEEDED: str = "succeeded"
+        FAILED: str = "failed"
+
+    id = models.UUIDField(primary_key=True, default=uuid.uuid4, editable=False)
+    user_id = models.UUIDField()
+    file_name = models.CharField(max_length=255)
+    mode = models.CharField(choices=IngestMode.choices, default=IngestMode.IGNORE, max_length=15)
+
+    state = models.CharField(choices=State.choices, default=State.PENDING, db_index=True, max_length=15)
+    rows_processed = models.PositiveBigIntegerField(default=0)
+    rows_inserted = models.PositiveBigIntegerField(default=0)
+    rows_updated = models.PositiveBigIntegerField(default=0)
+    rows_skipped = models.PositiveBigIntegerField(default=0)
+    error = models.TextField(null=True, blank=True)
+
+    created_at = models.DateTimeField(auto_now_add=True)
+    started_at = models.DateTimeField(null=True, blank=True)
+    # Last time the worker running the job reported progress, see reclaim_stale_jobs
+    heartbeat_at = models.DateTimeField(null=True, blank=True)
+    finished_at = models.DateTimeField(null=True, blank=True)
+
+    def __str__(self):
+        return f"{self.id}::{self.user_id}::{self.state}"
+
+
+def floor_bucket(moment: datetime, period: str) -> datetime:
+    """
+    Returns the start of the UTC hour or day containing ``moment``.
+    """
+    moment = moment.astimezone(timezone.utc).replace(minute=0, second=0, microsecond=0)
+    return moment.replace(hour=0) if period == LevelRollup.Period.DAY else moment
+
+
+def ceil_bucket(moment: datetime, period: str) -> datetime:
+    """
+    Returns the start of the first UTC hour or day starting at or after ``moment``.
+    """
+    floor = floor_bucket(moment, period)
+    if floor == moment:
+        return floor
+    return floor + (timedelta(days=1) if period == LevelRollup.Period.DAY else timedelta(hours=1))
+
+
+def split_range(start: Optional[datetime], stop: Optional[datetime], days: bool = True) -> tuple[list, list, list]:
+    """
+    Splits the range from ``start`` to ``stop``, both included, into the whole days and hours
+    that can be read from the rollups and the partial hours at its edges.
+
+    Args:
+        start (datetime, optional): The first timestamp of the range, unbounded if None.
+        stop (datetime, optional): The last timestamp of the range, unbounded if None.
+        days (bool): Whether whole days are read from the daily buckets rather than the hourly ones.
+
+    Returns:
+        tuple[list, list, list]: The conditions on the ``device_timestamp`` of the readings, and
+        on the ``bucket_start`` of the hourly and daily buckets, each to be combined with OR.
+    """
+    Period = LevelRollup.Period
+    # Hours fully within the range: [first_hour, last_hour)
+    first_hour = ceil_bucket(start, Period.HOUR) if start else None
+    last_hour = floor_bucket(stop, Period.HOUR) if stop else None
+    raw_ranges, hour_ranges, day_ranges = [], [], []
+    if first_hour and last_hour and first_hour >= last_hour:
+        raw_ranges.append(Q(device_timestamp__gte=start, device_timestamp__lte=stop))
+        return raw_ranges, hour_ranges, day_ranges
+
+    if start and start < first_hour:
+        raw_ranges.append(Q(device_timestamp__gte=start, device_timestamp__lt=first_hour))
+    if stop:
+        raw_ranges.append(Q(device_timestamp__gte=last_hour, device_timestamp__lte=stop))
+    if not days:
+        hour_range = Q()
+        if first_hour:
+            hour_range &= Q(bucket_start__gte=first_hour)
+        if last_hour:
+            hour_range &= Q(bucket_start__lt=last_hour)
+        hour_ranges.append(hour_range)
+        return raw_ranges, hour_ranges, day_ranges
+
+    first_day = ceil_bucket(first_hour, Period.DAY) if first_hour else None
+    last_day = floor_bucket(last_hour, Period.DAY) if last_hour else None
+    if first_day and last_day and first_day >= last_day:
+        hour_ranges.append(Q(bucket_start__gte=first_hour, bucket_start__lt=last_hour))
+    else:
+        if first_hour and first_hour < first_day:
+            hour_ranges.append(Q(bucket_start__gte=first_hour, bucket_start__lt=first_day))
+        if last_hour and last_day < last_hour:
+            hour_ranges.append(Q(bucket_start__gte=last_day, bucket_start__lt=last_hour))
+        day_range = Q()
+        if first_day:
+            day_range &= Q(bucket_start__gte=first_day)
+        if last_day:
+            day_range &= Q(bucket_start__lt=last_day)
+        day_ranges.append(day_range)
+    return raw_ranges, hour_ranges, day_ranges
+
+
+def epoch(field: str) -> Cast:
+    """
+    Returns the expression of the number of seconds from the epoch to ``field``, as a float
+    rather than the slower numeric type.
+    """
+    return Cast(Extract(field, 'epoch', tzinfo=timezone.utc), FloatField())
+
+
+def bucket_index(field: str, origin: datetime, interval: timedelta) -> Cast:
+    """
+    Returns the expression numbering the buckets of ``interval`` starting at ``origin``, giving
+    the bucket ``field`` falls in.
+    """
+    return Cast(Floor((epoch(field) - origin.timestamp()) / interval.total_seconds()), IntegerField())
+
+
+class LevelRollupManager(Manager):
+    """
+    Custom manager for the LevelRollup model
+    """
+
+    def refresh(self, user_id, start: datetime, stop: datetime):
+        """
+        Recomputes the hourly and daily buckets of a user overlapping the range from ``start`` to ``stop``.
+        The hourly buckets are aggregated from the readings, the daily ones from the hourly buckets.
+
+        Args:
+            user_id (UUID): The ID of the user.
+            start (datetime): The first changed timestamp.
+            stop (datetime): The last changed timestamp.
+        """
+        hours = (floor_bucket(start, LevelRollup.Period.HOUR), floor_bucket(stop, LevelRollup.Period.HOUR)
+                 + timedelta(hours=1))
+        days = (floor_bucket(start, LevelRollup.Period.DAY), floor_bucket(stop, LevelRollup.Period.DAY)
+                + timedelta(days=1))
+        with transaction.atomic(using=self.db):
+            readings = Level.objects.using(self.db).filter(
+                user_id=user_id,
+                glucose_mg_dl__isnull=False,
+                device_timestamp__gte=hours[0],
+                device_timestamp__lt=hours[1],
+            )
+            self._replace_buckets(user_id, LevelRollup.Period.HOUR, hours, readings, 'device_timestamp', {
+                'glucose_min': Min('glucose_mg_dl'),
+                'glucose_max': Max('glucose_mg_dl'),
+                'glucose_sum': Sum('glucose_mg_dl'),
+                'glucose_count': Count('glucose_mg_dl'),
+            })
+            hourly = self.filter(
+                user_id=user_id, period=LevelRollup.Period.HOUR, bucket_start__gte=days[0], bucket_start__lt=days[1]
+            )
+            self._replace_buckets(user_id, LevelRollup.Period.DAY, days, hourly, 'bucket_start', {
+                'glucose_min': Min('glucose_min'),
+                'glucose_max': Max('glucose_max'),
+                'glucose_sum': Sum('glucose_sum'),
+                'glucose_count': Sum('glucose_count'),
+            })
+
+    def _replace_buckets(self, user_id, period: str, bounds: tuple, source, timestamp_field: str, aggregates: dict):
+        """
+        Replaces the buckets of a period between ``bounds`` with the aggregation of ``source``.
+        The buckets are written with a single INSERT ... SELECT, without going through model instances.
+        """
+        buckets = source.annotate(
+            bucket=Trunc(timestamp_field, period, tzinfo=timezone.utc)
+        ).values('bucket', 'recording_type').annotate(**aggregates).order_by()
+        self.filter(
+            user_id=user_id, period=period, bucket_start__gte=bounds[0], bucket_start__lt=bounds[1]
+        ).delete()
+
+        connection = connections[self.db]
+        quote = connection.ops.quote_name
+        select_sql, select_params = buckets.query.get_compiler(self.db).as_sql()
+        user_id = self.model._meta.get_field('user_id').get_db_prep_value(user_id, connection)
+        with connection.cursor() as cursor:
+            cursor.execute(
+                f"INSERT INTO {quote(self.model._meta.db_table)} (user_id, period, bucket_start, recording_type, "
+                f"glucose_min, glucose_max, glucose_sum, glucose_count) "
+                f"SELECT %s, %s, bucket, recording_type, glucose_min, glucose_max, glucose_sum, glucose_count "
+                f"FROM ({select_sql}) AS buckets WHERE glucose_count > 0",
+                [user_id, period, *select_params],
+            )
+
+    def rebuild(self, user_id=None) -> int:
+        """
+        Recomputes every bucket of a user, or of every user.
+
+        Args:
+            user_id (UUID, optional): The ID of the user. Defaults to every user.
+
+        Returns:
+            int: The number of users whose buckets were rebuilt.
+        """
+        readings = Level.objects.using(self.db)
+        if user_id is not None:
+            readings = readings.filter(user_id=user_id)
+        ranges = readings.values('user_id').annotate(
+            start=Min('device_timestamp'), stop=Max('device_timestamp')
+        ).order_by()
+        count = 0
+        with transaction.atomic(using=self.db):
+            stale = self.all() if user_id is None else self.filter(user_id=user_id)
+            stale.delete()
+            for user_range in ranges:
+                self.refresh(user_range['user_id'], user_range['start'], user_range['stop'])
+                count += 1
+        return count
+
+    def get_min_max(
+            self, user_id, start: Optional[datetime] = None, stop: Optional[datetime] = None
+    ) -> Optional[dict]:
+        """
+        Returns the minimum and maximum glucose levels of a user between ``start`` and ``stop``, both included.
+        Whole days and hours are read from the buckets, the readings only at the edges of the range.
+
+        Args:
+            user_id (UUID): The ID of the user.
+            start (datetime, optional): The first timestamp of the range.
+            stop (datetime, optional): The last timestamp of the range.
+
+        Returns:
+            Optional[dict]: The ``user_id``, ``glucose_level_min``, ``glucose_level_max`` and
+            ``glucose_level_count``, or None if there is no reading in the range.
+        """
+        result = self.get_min_max_many([user_id], start=start, stop=stop).get(uuid.UUID(str(user_id)))
+        if result is not None:
+            result['user_id'] = user_id
+        return result
+
+    async def aget_min_max(
+            self, user_id, start: Optional[datetime] = None, stop: Optional[datetime] = None
+    ) -> Optional[dict]:
+        """
+        Async variant of ``get_min_max``.
+        """
+        result = (await self.aget_min_max_many([user_id], start=start, stop=stop)).get(uuid.UUID(str(user_id)))
+        if result is not None:
+            result['user_id'] = user_id
+        return result
+
+    def get_count(self, user_id, start: Optional[datetime] = None, stop: Optional[datetime] = None) -> int:
+        """
+        Returns the number of readings of a user between ``start`` and ``stop``, both included.
+        The readings with a glucose value are counted like ``get_min_max`` does, only the other
+        ones, such as notes and insulin doses, are counted in the Level table.
+
+        Args:
+            user_id (UUID): The ID of the user.
+            start (datetime, optional): The first timestamp of the range.
+            stop (datetime, optional): The last timestamp of the range.
+
+        Returns:
+            int: The number of readings in the range.
+        """
+        result = self.get_min_max_many([user_id], start=start, stop=stop).get(uuid.UUID(str(user_id)))
+        others = self._uncounted_levels(user_id, start, stop)
+        return (result['glucose_level_count'] if result else 0) + others.count()
+
+    async def aget_count(self, user_id, start: Optional[datetime] = None, stop: Optional[datetime] = None) -> int:
+        """
+        Async variant of ``get_count``.
+        """
+        result = (await self.aget_min_max_many([user_id], start=start, stop=stop)).get(uuid.UUID(str(user_id)))
+        others = self._uncounted_levels(user_id, start, stop)
+        return (result['glucose_level_count'] if result else 0) + await others.acount()
+
+    def _uncounted_levels(self, user_id, start: Optional[datetime], stop: Optional[datetime]) -> models.QuerySet:
+        """
+        Returns the readings of a user without a glucose value between ``start`` and ``stop``,
+        which the buckets do not count.
+        """
+        others = Level.objects.using(self.db).filter(user_id=user_id, glucose_mg_dl__isnull=True)
+        if start:
+            others = others.filter(device_timestamp__gte=start)
+        if stop:
+            others = others.filter(device_timestamp__lte=stop)
+        return others
+
+    def get_min_max_many(
+            self, user_ids: list, start: Optional[datetime] = None, stop: Optional[datetime] = None,
+            chunk_size: int = 1000,
+    ) -> dict[uuid.UUID, dict]:
+        """
+        Returns the minimum and maximum glucose levels of several users between ``start`` and ``stop``,
+        both included, like ``get_min_max``. Every part of the range is aggregated for all the users
+        at once, grouped by user, so the number of queries does not depend on the number of users
+        but on the number of chunks of ``chunk_size`` users.
+
+        Args:
+            user_ids (list): The IDs of the users.
+            start (datetime, optional): The first timestamp of the range.
+            stop (datetime, optional): The last timestamp of the range.
+            chunk_size (int, optional): The number of users aggregated by a query. Defaults to 1000.
+
+        Returns:
+            dict[UUID, dict]: The ``user_id``, ``glucose_level_min``, ``glucose_level_max`` and
+            ``glucose_level_count`` of every user with readings in the range, by user ID.
+        """
+        results = {}
+        for source in self._min_max_sources(user_ids, start, stop, chunk_size):
+            for row in source:
+                self._merge_min_max(results, row)
+        return results
+
+    async def aget_min_max_many(
+            self, user_ids: list, start: Optional[datetime] = None, stop: Optional[datetime] = None,
+            chunk_size: int = 1000,
+    ) -> dict[uuid.UUID, dict]:
+        """
+        Async variant of ``get_min_max_many``.
+        """
+        results = {}
+        for source in self._min_max_sources(user_ids, start, stop, chunk_size):
+            async for row in source:
+                self._merge_min_max(results, row)
+        return results
+
+    def _min_max_sources(
+            self, user_ids: list, start: Optional[datetime], stop: Optional[datetime], chunk_size: int
+    ) -> list[models.QuerySet]:
+        """
+        Returns the querysets aggregating the readings at the edges of the range and the hour and day
+        buckets in between, grouped by user, for every chunk of ``chunk_size`` users.
+        """
+        raw_ranges, hour_ranges, day_ranges = split_range(start, stop)
+        user_ids = list(dict.fromkeys(uuid.UUID(str(user_id)) for user_id in user_ids))
+        sources = []
+        for offset in range(0, len(user_ids), chunk_size):
+            chunk = user_ids[offset:offset + chunk_size]
+            if raw_ranges:
+                sources.append(Level.objects.using(self.db).filter(
+                    Q(*raw_ranges, _connector=Q.OR),
+                    user_id__in=chunk,
+                    glucose_mg_dl__isnull=False,
+                ).values('user_id').annotate(
+                    glucose_min=Min('glucose_mg_dl'),
+                    glucose_max=Max('glucose_mg_dl'),
+                    glucose_count=Count('glucose_mg_dl'),
+                ).order_by())
+            for period, ranges in ((LevelRollup.Period.HOUR, hour_ranges), (LevelRollup.Period.DAY, day_ranges)):
+                if ranges:
+                    sources.append(self.filter(Q(*ranges, _connector=Q.OR), user_id__in=chunk, period=period).values(
+                        'user_id'
+                    ).annotate(
+                        glucose_min=Min('glucose_min'),
+                        glucose_max=Max('glucose_max'),
+                        glucose_count=Sum('glucose_count'),
+                    ).order_by())
+        return sources
+
+    @staticmethod
+    def _merge_min_max(results: dict, row: dict):
+        """
+        Merges a row aggregated by ``_min_max_sources`` into the results by user ID.
+        """
+        if not row['glucose_count']:
+            return
+        result = results.get(row['user_id'])
+        if result is None:
+            results[row['user_id']] = {
+                'user_id': row['user_id'],
+                'glucose_level_min': row['glucose_min'],
+                'glucose_level_max': row['glucose_max'],
+                'glucose_level_count': row['glucose_count'],
+            }
+            return
+        result['glucose_level_min'] = min(result['glucose_level_min'], row['glucose_min'])
+        result['glucose_level_max'] = max(result['glucose_level_max'], row['glucose_max'])
+        result['glucose_level_count'] += row['glucose_count']
+
+    def get_series(
+            self, user_id, start: datetime, stop: datetime, interval: timedelta
+    ) -> tuple[datetime, timedelta, list[dict]]:
+        """
+        Aggregates the glucose levels of a user between ``start`` and ``stop``, both included,
+        into buckets of ``interval``, without returning the readings themselves.
+
+        Intervals shorter than an hour are aggregated from the readings and buckets start at ``start``.
+        Longer intervals are rounded up to whole hours, or whole days from a day on, and buckets start
+        at the beginning of the hour, or day if the interval is made of whole days, of ``start``:
+        whole hours and days are then read from the rollups, the readings only at the edges of the range.
+
+        Args:
+            user_id (UUID): The ID of the user.
+            start (datetime): The first timestamp of the range.
+            stop (datetime): The last timestamp of the range.
+            interval (timedelta): The width of the buckets.
+
+        Returns:
+            tuple[datetime, timedelta, list[dict]]: The start of the first bucket, the width of the
+            buckets, and the non-empty buckets ordered by ``bucket``, their number counted from the
+            first bucket, with the ``glucose_min``, ``glucose_max``, ``glucose_sum`` and
+            ``glucose_count`` of the readings and the sum of their timestamps in seconds since the
+            epoch, ``timestamp_sum``.
+        """
+        Period = LevelRollup.Period
+        if interval < timedelta(hours=1):
+            origin = start
+            raw_ranges, hour_ranges, day_ranges = [Q(device_timestamp__gte=start, device_timestamp__lte=stop)], [], []
+        else:
+            period = timedelta(days=1) if interval >= timedelta(days=1) else timedelta(hours=1)
+            interval = -(-interval // period) * period
+            days = interval % timedelta(days=1) == timedelta()
+            origin = floor_bucket(start, Period.DAY if days else Period.HOUR)
+            raw_ranges, hour_ranges, day_ranges = split_range(start, stop, days=days)
+
+        sources = []
+        if raw_ranges:
+            sources.append(Level.objects.using(self.db).filter(
+                Q(*raw_ranges, _connector=Q.OR),
+                user_id=user_id,
+                glucose_mg_dl__isnull=False,
+            ).annotate(bucket=bucket_index('device_timestamp', origin, interval)).values('bucket').annotate(
+                glucose_min=Min('glucose_mg_dl'),
+                glucose_max=Max('glucose_mg_dl'),
+                glucose_sum=Sum('glucose_mg_dl'),
+                glucose_count=Count('glucose_mg_dl'),
+                timestamp_sum=Sum(epoch('device_timestamp')),
+            ))
+        for period, ranges, length in ((Period.HOUR, hour_ranges, timedelta(hours=1)),
+                                       (Period.DAY, day_ranges, timedelta(days=1))):
+            if ranges:
+                # The readings of a bucket are assumed to be spread around its middle
+                middle = epoch('bucket_start') + length.total_seconds() / 2
+                sources.append(self.filter(Q(*ranges, _connector=Q.OR), user_id=user_id, period=period).annotate(
+                    bucket=bucket_index('bucket_start', origin, interval)
+                ).values('bucket').annotate(
+                    # Before glucose_count, which would otherwise refer to the aggregate
+                    timestamp_sum=Sum(middle * F('glucose_count'), output_field=FloatField()),
+                    glucose_min=Min('glucose_min'),
+                    glucose_max=Max('glucose_max'),
+                    glucose_sum=Sum('glucose_sum'),
+                    glucose_count=Sum('glucose_count'),
+                ))
+
+        buckets = {}
+        for source in sources:
+            for row in source.order_by():
+                bucket = buckets.get(row['bucket'])
+                if bucket is None:
+                    buckets[row['bucket']] = row
+                    continue
+                bucket['glucose_min'] = min(bucket['glucose_min'], row['glucose_min'])
+                bucket['glucose_max'] = max(bucket['glucose_max'], row['glucose_max'])
+                for key in ('glucose_sum', 'glucose_count', 'timestamp_sum'):
+                    bucket[key] += row[key]
+        return origin, interval, [buckets[key] for key in sorted(buckets) if buckets[key]['glucose_count']]
+
+
+class LevelRollup(models.Model):
+    """
+    Model to store the glucose levels of a user aggregated per hour or per day and recording type.
+    """
+
+    class Period(models.TextChoices):
+        """
+        Choices for the length of a bucket.
+        """
+        HOUR: str = "hour"
+        DAY: str = "day"
+
+    user_id = models.UUIDField()
+    period = models.CharField(choices=Period.choices, max_length=15)
+    bucket_start = models.DateTimeField()
+    recording_type = models.CharField(choices=Level.RecordingType.choices, max_length=15)
+
+    glucose_min = models.IntegerField()
+    glucose_max = models.IntegerField()
+    glucose_sum = models.BigIntegerField()
+    glucose_count = models.PositiveIntegerField()
+
+    objects = LevelRollupManager()
+
+    class Meta:
+        constraints = [
+            models.UniqueConstraint(
+                fields=['user_id', 'period', 'bucket_start', 'recording_type'], name='level_rollup_bucket_unique'
+            ),
+        ]
+
+    def __str__(self):
+        return f"{self.user_id}::{self.period}::{self.bucket_start}::{self.recording_type}"
@@ -0,0 +1,322 @@
+import json
+from base64 import urlsafe_b64decode, urlsafe_b64encode
+from typing import Any, Optional
+
+from django.conf import settings
+from django.core.exceptions import ValidationError
+from django.db import connections
+from django.db.models import F, Q, QuerySet
+from rest_framework.exceptions import NotFound
+from rest_framework.pagination import BasePagination, LimitOffsetPagination, _positive_int
+from rest_framework.response import Response
+from rest_framework.settings import api_settings
+from rest_framework.utils.urls import remove_query_param, replace_query_param
+
+from glucosemonitor.levels.models import CountMode
+
+
+def estimate_count(queryset: QuerySet) -> Optional[int]:
+    """
+    Returns the number of rows of a queryset estimated by the query planner, without running
+    the query, or None if the database does not give estimates.
+    """
+    if connections[queryset.db].vendor != 'postgresql':
+        return None
+    plan = json.loads(queryset.order_by().explain(format='json'))
+    return int(plan[0]['Plan']['Plan Rows'])
+
+
+async def aestimate_count(queryset: QuerySet) -> Optional[int]:
+    """
+    Async variant of ``estimate_count``.
+    """
+    if connections[queryset.db].vendor != 'postgresql':
+        return None
+    plan = json.loads(await queryset.order_by().aexplain(format='json'))
+    return int(plan[0]['Plan']['Plan Rows'])
+
+
+class CountedLimitOffsetPagination(LimitOffsetPagination):
+    """
+    Limit/offset pagination of which the ``count`` is exact, estimated or left out, as chosen
+    with the ``count`` query parameter, ``LEVELS_PAGINATION_COUNT`` by default:
+
+    - ``exact``: counted by the ``get_exact_count(queryset)`` method of the view when it has
+      one, such as a count read from the rollups, with ``COUNT(*)`` otherwise.
+    - ``estimate``: the estimate of the query planner, counted exactly when it is below
+      ``LEVELS_COUNT_ESTIMATE_THRESHOLD`` rows or when the page reaches the last row.
+    - ``none``: no count at all.
+
+    When the count is not exact, one more row than the page is fetched to know whether there
+    is a next page.
+    """
+    count_query_param: str = 'count'
+
+    def paginate_queryset(self, queryset: QuerySet, request, view=None) -> Optional[list]:
+        self.view = view
+        self.count_mode = self.get_count_mode(request)
+        if self.count_mode == CountMode.EXACT:
+            return super().paginate_queryset(queryset, request, view)
+
+        self.request = request
+        self.limit = self.get_limit(request)
+        if self.limit is None:
+            return None
+        self.offset = self.get_offset(request)
+        results = self.trim_page(list(queryset[self.offset:self.offset + self.limit + 1]))
+
+        self.count = None
+        if self.count_mode == CountMode.ESTIMATE:
+            self.count = self.get_page_count(results)
+            if self.count is None:
+                self.count = max(self.estimate_count(queryset), self.get_seen_count(results))
+        return results
+
+    async def apaginate_queryset(self, queryset: QuerySet, request, view=None) -> Optional[list]:
+        """
+        Async variant of ``paginate_queryset``, reading the page and counting the rows with the
+        async queryset methods.
+        """
+        self.view = view
+        self.count_mode = self.get_count_mode(request)
+        self.request = request
+        self.limit = self.get_limit(request)
+        if self.limit is None:
+            return None
+        self.offset = self.get_offset(request)
+
+        if self.count_mode == CountMode.EXACT:
+            # Like LimitOffsetPagination.paginate_queryset
+            self.count = await self.aget_count(queryset)
+            if self.count > self.limit and self.template is not None:
+                self.display_page_controls = True
+            if self.count == 0 or self.offset > self.count:
+                return []
+            return [row async for row in queryset[self.offset:self.offset + self.limit]]
+
+        results = self.trim_page([row async for row in queryset[self.offset:self.offset + self.limit + 1]])
+        self.count = None
+        if self.count_mode == CountMode.ESTIMATE:
+            self.count = self.get_page_count(results)
+            if self.count is None:
+                self.count = max(await self.aestimate_count(queryset), self.get_seen_count(results))
+        return results
+
+    def trim_page(self, results: list) -> list:
+        """
+        Drops the row fetched past the page, which tells whether there is a next page.
+        """
+        self.has_more = len(results) > self.limit
+        return results[:self.limit]
+
+    def get_page_count(self, results: list) -> Optional[int]:
+        """
+        Returns the number of rows when the page reaches the last row, None otherwise.
+        """
+        if not self.has_more and (results or not self.offset):
+            return self.offset + len(results)
+        return None
+
+    def get_seen_count(self, results: list) -> int:
+        """
+        Returns the number of rows seen so far, a lower bound of the count.
+        """
+        return self.offset + len(results) + 1 if results else 0
+
+    def get_count_mode(self, request) -> str:
+        mode = request.query_params.get(self.count_query_param)
+        return mode if mode in CountMode.values else settings.LEVELS_PAGINATION_COUNT
+
+    def get_count(self, queryset: QuerySet) -> int:
+        get_exact_count = getattr(self.view, 'get_exact_count', None)
+        if get_exact_count is not None:
+            return get_exact_count(queryset)
+        return super().get_count(queryset)
+
+    async def aget_count(self, queryset: QuerySet) -> int:
+        aget_exact_count = getattr(self.view, 'aget_exact_count', None)
+        if aget_exact_count is not None:
+            return await aget_exact_count(queryset)
+        return await queryset.acount()
+
+    def estimate_count(self, queryset: QuerySet) -> int:
+        estimate = estimate_count(queryset)
+        if estimate is None or estimate < settings.LEVELS_COUNT_ESTIMATE_THRESHOLD:
+            return self.get_count(queryset)
+        return estimate
+
+    async def aestimate_count(self, queryset: QuerySet) -> int:
+        estimate = await aestimate_count(queryset)
+        if estimate is None or estimate < settings.LEVELS_COUNT_ESTIMATE_THRESHOLD:
+            return await self.aget_count(queryset)
+        return estimate
+
+    def get_next_link(self) -> Optional[str]:
+        if self.count_mode == CountMode.EXACT:
+            return super().get_next_link()
+        if not self.has_more:
+            return None
+        url = self.request.build_absolute_uri()
+        url = replace_query_param(url, self.limit_query_param, self.limit)
+        return replace_query_param(url, self.offset_query_param, self.offset + self.limit)
+
+    def get_paginated_response(self, data) -> Response:
+        if self.count is None:
+            return Response({
+                'next': self.get_next_link(),
+                'previous': self.get_previous_link(),
+                'results': data,
+            })
+        return super().get_paginated_response(data)
+
+
+class KeysetPagination(BasePagination):
+    """
+    Cursor pagination seeking on (ordering field, id) instead of using an offset.
+
+    A page is fetched with a ``WHERE (field, id) > (value, id)`` condition on the last row of
+    the previous page, so every page costs the same however deep it is, and no ``COUNT(*)``
+    is run. The ordering field is the first field requested through the ``ordering``
+    parameter, ``device_timestamp`` by default. Rows where it is NULL come last.
+    """
+    cursor_query_param: str = 'cursor'
+    page_size_query_param: str = 'page_size'
+    page_size: int = api_settings.PAGE_SIZE
+    max_page_size: int = 1000
+    default_ordering: str = 'device_timestamp'
+    invalid_cursor_message: str = 'Invalid cursor'
+
+    def paginate_queryset(self, queryset: QuerySet, request, view=None) -> list:
+        queryset, cursor = self.seek(queryset, request, view)
+        # Fetch one more row to know whether there is a page after this one
+        return self.set_page(list(queryset[:self.page_size + 1]), cursor)
+
+    async def apaginate_queryset(self, queryset: QuerySet, request, view=None) -> list:
+        """
+        Async variant of ``paginate_queryset``, reading the page with the async queryset methods.
+        """
+        queryset, cursor = self.seek(queryset, request, view)
+        return self.set_page([row async for row in queryset[:self.page_size + 1]], cursor)
+
+    def seek(self, queryset: QuerySet, request, view) -> tuple[QuerySet, Optional[dict]]:
+        """
+        Returns the queryset ordered and filtered to start at the cursor of the request, and the cursor.
+        """
+        self.base_url = request.build_absolute_uri()
+        self.page_size = self.get_page_size(request)
+        self.field, self.descending = self.get_ordering(request, queryset, view)
+        self.model_field = queryset.model._meta.get_field(self.field)
+
+        cursor = self.decode_cursor(request)
+        reverse = cursor is not None and cursor['reverse']
+        # Walking backwards flips the direction and the position of the NULLs
+        descending = self.descending != reverse
+        nulls_last = not reverse
+
+        queryset = queryset.order_by(*self.get_order_by(descending, nulls_last))
+        if cursor is not None:
+            queryset = queryset.filter(self.get_seek_filter(cursor['value'], cursor['id'], descending, nulls_last))
+        return queryset, cursor
+
+    def set_page(self, results: list, cursor: Optional[dict]) -> list:
+        """
+        Keeps the rows of the page out of the rows read after the cursor, one more than the page size.
+        """
+        has_more = len(results) > self.page_size
+        self.page = results[:self.page_size]
+        if cursor is not None and cursor['reverse']:
+            self.page.reverse()
+            self.has_next, self.has_previous = True, has_more
+        else:
+            self.has_next, self.has_previous = has_more, cursor is not None
+        return self.page
+
+    def get_page_size(self, request) -> int:
+        try:
+            return _positive_int(
+                request.query_params[self.page_size_query_param], strict=True, cutoff=self.max_page_size
+            )
+        except (KeyError, ValueError):
+            return self.page_size
+
+    def get_ordering(self, request, queryset: QuerySet, view) -> tuple[str, bool]:
+        """
+        Returns the field to seek on and whether it is sorted in descending order,
+        following the ordering filter of the view.
+        """
+        ordering = None
+        for backend in getattr(view, 'filter_backends', []):
+            if hasattr(backend, 'get_ordering'):
+                ordering = backend().get_ordering(request, queryset, view)
+                break
+        term = ordering[0] if ordering else self.default_ordering
+        return term.lstrip('-'), term.startswith('-')
+
+    def get_order_by(self, descending: bool, nulls_last: bool) -> list:
+        nulls = {'nulls_last': True} if nulls_last else {'nulls_first': True}
+        if descending:
+            return [F(self.field).desc(**nulls), F('id').desc()]
+        return [F(self.field).asc(**nulls), F('id').asc()]
+
+    def get_seek_filter(self, value: Any, id_: int, descending: bool, nulls_last: bool) -> Q:
+        """
+        Returns the condition matching the rows following (value, id) in the given ordering.
+        """
+        after = 'lt' if descending else 'gt'
+        if value is None:
+            # Among the NULLs only the id decides, the other rows come before or after all of them
+            following = Q(**{f'{self.field}__isnull': True, f'id__{after}': id_})
+            return following if nulls_last else following | Q(**{f'{self.field}__isnull': False})
+
+        # The non-strict bound lets the database start an index range scan at the cursor
+        following = Q(**{f'{self.field}__{after}e': value}) & (
+            Q(**{f'{self.field}__{after}': value}) | Q(**{f'id__{after}': id_})
+        )
+        if nulls_last and self.model_field.null:
+            following |= Q(**{f'{self.field}__isnull': True})
+        return following
+
+    def decode_cursor(self, request) -> Optional[dict]:
+        encoded = request.query_params.get(self.cursor_query_param)
+        if not encoded:
+            return None
+        try:
+            cursor = json.loads(urlsafe_b64decode(encoded.encode('ascii')))
+            value = cursor['v']
+            return {
+                'value': None if value is None else self.model_field.to_python(value),
+                'id': int(cursor['i']),
+                'reverse': bool(cursor.get('r')),
+            }
+        except (TypeError, ValueError, KeyError, ValidationError):
+            raise NotFound(self.invalid_cursor_message)
+
+    def encode_cursor(self, instance, reverse: bool) -> str:
+        # The rows may be model instances or named tuples of their fields, see RowEncoder
+        value = getattr(instance, self.field)
+        cursor = {'v': None if value is None else self.model_field.value_to_string(instance), 'i': instance.id}
+        if reverse:
+            cursor['r'] = 1
+        encoded = urlsafe_b64encode(json.dumps(cursor, separators=(',', ':')).encode()).decode('ascii')
+        return replace_query_param(self.base_url, self.cursor_query_param, encoded)
+
+    def get_next_link(self) -> Optional[str]:
+        if not self.has_next:
+            return None
+        if not self.page:
+            return remove_query_param(self.base_url, self.cursor_query_param)
+        return self.encode_cursor(self.page[-1], reverse=False)
+
+    def get_previous_link(self) -> Optional[str]:
+        if not self.has_previous:
+            return None
+        if not self.page:
+            return remove_query_param(self.base_url, self.cursor_query_param)
+        return self.encode_cursor(self.page[0], reverse=True)
+
+    def get_paginated_response(self, data) -> Response:
+        return Response({
+            'next': self.get_next_link(),
+            'previous': self.get_previous_link(),
+            'results': data,
+        })
@@ -0,0 +1,43 @@
+from rest_framework.renderers import JSONRenderer
+
+try:
+    import orjson
+except ImportError:  # pragma: no cover
+    orjson = None
+
+
+class FastJSONRenderer(JSONRenderer):
+    """
+    JSON renderer encoding with orjson when it is installed, with the same output as ``JSONRenderer``.
+
+    The output is identical for strings, integers, booleans, None, lists and dicts, and for the
+    types left to the DRF encoder, such as datetimes and decimals. Floats written in scientific
+    notation differ (orjson writes ``1e16`` where Python writes ``1e+16``), so the renderer is
+    only meant for responses without floats, such as the rows of the level list. Indented,
+    ASCII-only or non-compact output and the data orjson rejects are rendered by ``JSONRenderer``.
+    """
+    options: int = 0 if orjson is None else orjson.OPT_PASSTHROUGH_DATETIME | orjson.OPT_PASSTHROUGH_DATACLASS
+
+    def render(self, data, accepted_media_type=None, renderer_context=None) -> bytes:
+        if orjson is None or data is None or self.ensure_ascii or not self.compact:
+            return super().render(data, accepted_media_type, renderer_context)
+        renderer_context = renderer_context or {}
+        if self.get_indent(accepted_media_type, renderer_context) is not None:
+            return super().render(data, accepted_media_type, renderer_context)
+
+        try:
+            ret = orjson.dumps(data, default=self.encoder_class().default, option=self.options)
+        except (orjson.JSONEncodeError, TypeError):
+            return super().render(data, accepted_media_type, renderer_context)
+        # The line and paragraph separators are escaped by JSONRenderer, see its render()
+        if b'\xe2\x80\xa8' in ret or b'\xe2\x80\xa9' in ret:
+            ret = ret.replace(b'\xe2\x80\xa8', b'\\u2028').replace(b'\xe2\x80\xa9', b'\\u2029')
+        return ret
+
+
+class ColumnarJSONRenderer(FastJSONRenderer):
+    """
+    Renderer selected with ``?format=columnar``, for views building a columnar representation
+    of their rows when it is the accepted renderer. The output is JSON.
+    """
+    format: str = 'columnar'
@@ -0,0 +1,120 @@
+import uuid
+from contextlib import asynccontextmanager, contextmanager
+from contextvars import ContextVar
+from typing import Iterable, Optional
+
+from django.conf import settings
+from django.core.cache import cache
+from django.db import transaction
+
+from glucosemonitor.levels.cache import KEY_PREFIX
+
+# Alias of the database the levels are read from in the current request, None for the primary
+_read_database: ContextVar[Optional[str]] = ContextVar('levels_read_database', default=None)
+
+
+def _pin_keys(user_ids: Iterable) -> list[str]:
+    keys = []
+    for user_id in user_ids:
+        try:
+            keys.append(f'{KEY_PREFIX}:pinned:{uuid.UUID(str(user_id))}')
+        except ValueError:
+            continue
+    return keys
+
+
+def pin_to_primary(user_id):
+    """
+    Serves the reads of a user from the primary for ``LEVELS_REPLICA_PIN_SECONDS``, so that the
+    user reads the readings just written rather than a replica lagging behind.
+
+    The window starts right away and once more when the current transaction commits. The pins
+    are kept in the cache: processes share them when they share the cache backend.
+    """
+    if settings.LEVELS_REPLICA_DATABASE is None:
+        return
+
+    keys = _pin_keys([user_id])
+
+    def pin():
+        cache.set_many(dict.fromkeys(keys, True), timeout=settings.LEVELS_REPLICA_PIN_SECONDS)
+
+    pin()
+    transaction.on_commit(pin)
+
+
+def get_read_database(user_ids: Iterable) -> Optional[str]:
+    """
+    Returns the alias of the replica when one is configured and none of the users is pinned to the
+    primary, None otherwise.
+    """
+    replica = settings.LEVELS_REPLICA_DATABASE
+    if replica is None or cache.get_many(_pin_keys(user_ids)):
+        return None
+    return replica
+
+
+async def aget_read_database(user_ids: Iterable) -> Optional[str]:
+    """
+    Async variant of ``get_read_database``.
+    """
+    replica = settings.LEVELS_REPLICA_DATABASE
+    if replica is None or await cache.aget_many(_pin_keys(user_ids)):
+        return None
+    return replica
+
+
+@contextmanager
+def read_from_replica(user_ids: Iterable = ()):
+    """
+    Reads the levels from the replica within the block, unless one of ``user_ids`` is pinned to
+    the primary, see ``ReplicaRouter``.
+    """
+    token = _read_database.set(get_read_database(user_ids))
+    try:
+        yield
+    finally:
+        _read_database.reset(token)
+
+
+@asynccontextmanager
+async def aread_from_replica(user_ids: Iterable = ()):
+    """
+    Async variant of ``read_from_replica``.
+    """
+    token = _read_database.set(await aget_read_database(user_ids))
+    try:
+        yield
+    finally:
+        _read_database.reset(token)
+
+
+class ReplicaRouter:
+    """
+    Database router sending the reads of the levels app to the replica within ``read_from_replica``
+    blocks, entered by the read endpoints. Every other read, such as the ones of the imports, and
+    every write goes to the primary.
+    """
+    app_label: str = 'levels'
+
+    def db_for_read(self, model, **hints) -> Optional[str]:
+        # Related objects are read from the database of the instance they are read from
+        if model._meta.app_label != self.app_label or hints.get('instance') is not None:
+            return None
+        return _read_database.get()
+
+    def db_for_write(self, model, **hints) -> Optional[str]:
+        return None
+
+    def allow_relation(self, obj1, obj2, **hints) -> Optional[bool]:
+        # The replica holds the rows of the primary
+        databases = {'default', settings.LEVELS_REPLICA_DATABASE}
+        if obj1._state.db in databases and obj2._state.db in databases:
+            return True
+        return None
+
+    def allow_migrate(self, db: str, app_label: str, **hints) -> Optional[bool]:
+        # The replica is migrated by the replication of the primary
+        if db == settings.LEVELS_REPLICA_DATABASE:
+            return False
+        return None
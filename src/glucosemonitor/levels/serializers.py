@@ -1,9 +1,27 @@
+from datetime import timedelta
+
 from rest_framework import serializers
 
-from glucosemonitor.levels.models import Level
+from glucosemonitor.levels.models import Device, Level, IngestMode, ImportJob, SeriesMode
+from glucosemonitor.levels.series import SERIES_DEFAULT_POINTS, SERIES_MAX_POINTS
+from glucosemonitor.levels.utils.csv_processing import validate_csv_header
+
+# Content types sent for CSV files by browsers and HTTP clients. Clients that do not know the
+# type of a file send application/octet-stream, its content is checked anyway.
+UPLOAD_CONTENT_TYPES: tuple = (
+    'text/csv',
+    'text/plain',
+    'text/comma-separated-values',
+    'application/csv',
+    'application/vnd.ms-excel',
+    'application/octet-stream',
+)
 
 
 class LevelSerializer(serializers.ModelSerializer):
+    device_name = serializers.CharField(source='device.name', read_only=True)
+    device_serial_number = serializers.UUIDField(source='device.serial_number', read_only=True)
+
     class Meta:
         model = Level
         fields = [
@@ -14,15 +32,82 @@ class LevelSerializer(serializers.ModelSerializer):
             'device_timestamp',
             'recording_type',
             'glucose_history_mg_dl',
-            'glucose_scan_mg_dl'
+            'glucose_scan_mg_dl',
+            'glucose_mg_dl',
+        ]
+
+
+class DeviceSerializer(serializers.ModelSerializer):
+    class Meta:
+        model = Device
+        fields = [
+            'id',
+            'user_id',
+            'serial_number',
+            'name',
+            'first_device_timestamp',
+            'last_device_timestamp',
         ]
 
 
 class LevelCSVDataUploadSerializer(serializers.Serializer):
     file = serializers.FileField()
+    mode = serializers.ChoiceField(choices=IngestMode.choices, default=IngestMode.IGNORE)
+
+    def validate_file(self, file):
+        """
+        Rejects files that are not CSV files by their extension or content type, or whose header
+        row lacks the required columns, before any import job is created.
+        """
+        if not file.name.lower().endswith('.csv'):
+            raise serializers.ValidationError("The file must be a .csv file.")
+        if file.content_type not in UPLOAD_CONTENT_TYPES:
+            raise serializers.ValidationError(f"Unsupported content type '{file.content_type}'.")
+        try:
+            validate_csv_header(file)
+        except ValueError as e:
+            raise serializers.ValidationError(str(e))
+        return file
+
+
+class ImportJobSerializer(serializers.ModelSerializer):
+    class Meta:
+        model = ImportJob
+        fields = [
+            'id',
+            'user_id',
+            'mode',
+            'state',
+            'rows_processed',
+            'rows_inserted',
+            'rows_updated',
+            'rows_skipped',
+            'error',
+            'created_at',
+            'started_at',
+            'finished_at',
+        ]
 
 
 class LevelMinMaxSerializer(serializers.Serializer):
     user_id = serializers.UUIDField()
     glucose_level_min = serializers.FloatField()
     glucose_level_max = serializers.FloatField()
+
+
+class LevelMinMaxBatchQuerySerializer(serializers.Serializer):
+    user_ids = serializers.ListField(child=serializers.UUIDField(), allow_empty=False, max_length=10000)
+    start = serializers.DateTimeField(required=False, default=None)
+    stop = serializers.DateTimeField(required=False, default=None)
+
+
+class LevelMinMaxCountSerializer(LevelMinMaxSerializer):
+    glucose_level_min = serializers.FloatField(allow_null=True)
+    glucose_level_max = serializers.FloatField(allow_null=True)
+    glucose_level_count = serializers.IntegerField()
+
+
+class LevelSeriesQuerySerializer(serializers.Serializer):
+    mode = serializers.ChoiceField(choices=SeriesMode.choices, default=SeriesMode.AGGREGATE)
+    points = serializers.IntegerField(min_value=3, max_value=SERIES_MAX_POINTS, default=SERIES_DEFAULT_POINTS)
+    interval = serializers.DurationField(required=False, min_value=timedelta(seconds=1))
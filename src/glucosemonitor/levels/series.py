@@ -0,0 +1,100 @@
+from datetime import datetime, timedelta, timezone
+from typing import Optional
+
+import numpy as np
+from django.db.models import Max, Min
+
+from glucosemonitor.levels.models import Level, LevelRollup, SeriesMode
+from glucosemonitor.levels.utils.downsampling import largest_triangle_three_buckets
+
+# Number of points returned by default, and at most
+SERIES_DEFAULT_POINTS: int = 500
+SERIES_MAX_POINTS: int = 5000
+# Number of buckets aggregated in the database for every point selected by LTTB
+LTTB_OVERSAMPLING: int = 20
+
+
+def get_data_range(user_id, start: Optional[datetime], stop: Optional[datetime]) -> tuple[datetime, datetime]:
+    """
+    Returns the given range, its missing bounds replaced with the timestamps of the first and last
+    glucose levels of the user. Both bounds are None if the user has none.
+    """
+    if start is None or stop is None:
+        bounds = Level.objects.filter(user_id=user_id, glucose_mg_dl__isnull=False).aggregate(
+            first=Min('device_timestamp'), last=Max('device_timestamp')
+        )
+        start = start if start is not None else bounds['first']
+        stop = stop if stop is not None else bounds['last']
+    return start, stop
+
+
+def get_series(
+        user_id,
+        start: Optional[datetime],
+        stop: Optional[datetime],
+        mode: str = SeriesMode.AGGREGATE,
+        points: int = SERIES_DEFAULT_POINTS,
+        interval: Optional[timedelta] = None,
+) -> dict:
+    """
+    Returns the glucose levels of a user downsampled for charts, as columns of at most ``points`` values.
+
+    The AGGREGATE mode returns the minimum, average and maximum glucose level and the number of
+    readings of every bucket of ``interval``, or of the interval splitting the range into
+    ``points`` buckets. The LTTB mode selects ``points`` points keeping the shape of the series
+    with Largest-Triangle-Three-Buckets, out of ``LTTB_OVERSAMPLING`` times more buckets averaged
+    in the database. Either way the database returns a bounded number of rows, whatever the
+    length of the range, see ``LevelRollupManager.get_series``.
+
+    Args:
+        user_id (UUID): The ID of the user.
+        start (datetime, optional): The first timestamp, the first reading of the user if None.
+        stop (datetime, optional): The last timestamp, the last reading of the user if None.
+        mode (str): How the readings are downsampled, see ``SeriesMode``.
+        points (int): The number of points to return at most.
+        interval (timedelta, optional): The width of the buckets of the AGGREGATE mode,
+            used instead of ``points``.
+
+    Returns:
+        dict: The series, its columns are lists of the same length.
+
+    Raises:
+        ValueError: If ``interval`` splits the range into more than ``SERIES_MAX_POINTS`` buckets.
+    """
+    start, stop = get_data_range(user_id, start, stop)
+    series = {'user_id': user_id, 'mode': mode, 'start': start, 'stop': stop}
+    if mode == SeriesMode.LTTB:
+        series.update(timestamps=[], values=[])
+    else:
+        series.update(interval=None, timestamps=[], min=[], avg=[], max=[], count=[])
+    if start is None or stop is None or start > stop:
+        return series
+
+    span = stop - start
+    if mode == SeriesMode.LTTB:
+        interval = max(span / (points * LTTB_OVERSAMPLING), timedelta(seconds=1))
+    elif interval is None:
+        # Buckets are aligned on hours or days, so the range may start within the first one
+        # and end within an additional one
+        interval = max(span / (points - 2), timedelta(seconds=1))
+    elif span / interval > SERIES_MAX_POINTS:
+        raise ValueError(f"The interval splits the range into more than {SERIES_MAX_POINTS} buckets")
+    origin, interval, buckets = LevelRollup.objects.get_series(user_id, start, stop, interval)
+
+    if mode == SeriesMode.LTTB:
+        # Every bucket stands for the average of its readings
+        counts = np.array([bucket['glucose_count'] for bucket in buckets], dtype=float)
+        timestamps = np.array([bucket['timestamp_sum'] for bucket in buckets], dtype=float) / counts
+        values = np.array([bucket['glucose_sum'] for bucket in buckets], dtype=float) / counts
+        selected = largest_triangle_three_buckets(timestamps, values, points)
+        series['timestamps'] = [datetime.fromtimestamp(round(timestamps[i]), timezone.utc) for i in selected]
+        series['values'] = [round(float(values[i]), 1) for i in selected]
+        return series
+
+    series['interval'] = int(interval.total_seconds())
+    series['timestamps'] = [origin + bucket['bucket'] * interval for bucket in buckets]
+    series['min'] = [bucket['glucose_min'] for bucket in buckets]
+    series['avg'] = [round(bucket['glucose_sum'] / bucket['glucose_count'], 1) for bucket in buckets]
+    series['max'] = [bucket['glucose_max'] for bucket in buckets]
+    series['count'] = [bucket['glucose_count'] for bucket in buckets]
+    return series
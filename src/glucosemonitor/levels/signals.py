@@ -0,0 +1,36 @@
+import uuid
+
+from django.db.models.signals import post_delete, post_save
+from django.dispatch import receiver
+
+from glucosemonitor.levels.device_cache import device_cache
+from glucosemonitor.levels.models import Device, Level
+
+
+@receiver(post_save, sender=Level)
+def refresh_level_rollups(sender, instance: Level, raw: bool = False, using: str = None, **kwargs):
+    """
+    Keeps the buckets and the device bounds of a reading saved through the ORM up to date, moves
+    the data version of its user forward so that the cached responses of the user are not used
+    anymore, and serves the reads of the user from the primary for a while, see
+    ``LevelManager.refresh_derived``. Bulk imports refresh every chunk instead, see
+    ``process_csv_file``, and deletions refresh what they deleted, see ``LevelQuerySet.delete``.
+    """
+    if raw:
+        return
+    timestamp = instance.device_timestamp
+    Level.objects.db_manager(using).refresh_derived(instance.user_id, {instance.device_id: (timestamp, timestamp)})
+
+
+@receiver(post_delete, sender=Device)
+def evict_device(sender, instance: Device, using: str = None, **kwargs):
+    """
+    Removes a deleted device from the in-process cache of the imports, see ``DeviceCache``, and
+    refreshes the buckets of the readings deleted along with it.
+    """
+    device_cache.evict([(using, uuid.UUID(str(instance.user_id)), uuid.UUID(str(instance.serial_number)))])
+    if instance.first_device_timestamp is not None:
+        Level.objects.db_manager(using).refresh_derived(
+            instance.user_id, {instance.pk: (instance.first_device_timestamp, instance.last_device_timestamp)},
+            deleted=True,
+        )
@@ -0,0 +1,115 @@
+from datetime import datetime, time
+from typing import Optional
+
+from django.contrib.postgres.fields import ArrayField
+from django.db.models import Aggregate, Avg, Count, F, FloatField, Func, IntegerField, Q, StdDev, Value
+from django.db.models.functions import Cast
+from django.utils import timezone
+
+from glucosemonitor.levels.models import Level
+
+# Glucose ranges of the international consensus on time in range, in mg/dL, bounds included
+GLUCOSE_RANGES: dict[str, Q] = {
+    'very_low': Q(glucose_mg_dl__lt=54),
+    'low': Q(glucose_mg_dl__gte=54, glucose_mg_dl__lt=70),
+    'in_range': Q(glucose_mg_dl__gte=70, glucose_mg_dl__lte=180),
+    'high': Q(glucose_mg_dl__gt=180, glucose_mg_dl__lte=250),
+    'very_high': Q(glucose_mg_dl__gt=250),
+}
+# Percentiles of the ambulatory glucose profile, and the width of its time of day slots in minutes
+AGP_PERCENTILES: tuple = (5, 25, 50, 75, 95)
+AGP_SLOT_MINUTES: int = 15
+
+
+class PercentileCont(Aggregate):
+    """
+    The ``percentile_cont`` ordered-set aggregate of PostgreSQL, returning the continuous
+    percentiles of the expression for several fractions at once, in a single sort.
+    """
+    function = 'PERCENTILE_CONT'
+    template = '%(function)s(ARRAY[%(fractions)s]) WITHIN GROUP (ORDER BY %(expressions)s)'
+
+    def __init__(self, expression, fractions: tuple, **extra):
+        fractions = ', '.join(repr(float(fraction)) for fraction in fractions)
+        super().__init__(expression, fractions=fractions, output_field=ArrayField(FloatField()), **extra)
+
+
+def local_date_part(name: str, field: str) -> Cast:
+    """
+    Returns the expression of a part of ``field`` in the current time zone, as an integer.
+    ``DATE_PART`` computes in double precision, where ``EXTRACT`` uses the slower numeric type.
+    """
+    local = Func(
+        F(field), Value(timezone.get_current_timezone_name()), arg_joiner=' AT TIME ZONE ', template='(%(expressions)s)'
+    )
+    return Cast(Func(Value(name), local, function='DATE_PART', output_field=FloatField()), IntegerField())
+
+
+def get_glycemic_stats(user_id, start: Optional[datetime] = None, stop: Optional[datetime] = None) -> Optional[dict]:
+    """
+    Returns the glycemic statistics of a user between ``start`` and ``stop``, both included.
+
+    Everything is aggregated by the database from the (user_id, device_timestamp) index holding
+    the glucose levels, with one query for the whole range and one for the time of day slots:
+    - ``mean``, ``sd`` and ``cv``, the coefficient of variation in percent
+    - ``gmi``, the glucose management indicator in percent, estimated from the mean
+    - ``time_in_ranges``, the percentage of readings in every range of ``GLUCOSE_RANGES``
+    - ``percentiles``, the ``AGP_PERCENTILES`` of the glucose levels
+    - ``agp``, the ambulatory glucose profile: the ``AGP_PERCENTILES`` of every slot of
+      ``AGP_SLOT_MINUTES`` of the day, in the current time zone, the one of the devices
+
+    Args:
+        user_id (UUID): The ID of the user.
+        start (datetime, optional): The first timestamp of the range.
+        stop (datetime, optional): The last timestamp of the range.
+
+    Returns:
+        Optional[dict]: The statistics, or None if there is no reading in the range.
+    """
+    readings = Level.objects.filter(user_id=user_id, glucose_mg_dl__isnull=False)
+    if start is not None:
+        readings = readings.filter(device_timestamp__gte=start)
+    if stop is not None:
+        readings = readings.filter(device_timestamp__lte=stop)
+
+    fractions = tuple(percentile / 100 for percentile in AGP_PERCENTILES)
+    totals = readings.aggregate(
+        count=Count('glucose_mg_dl'),
+        mean=Avg('glucose_mg_dl'),
+        sd=StdDev('glucose_mg_dl', sample=True),
+        percentiles=PercentileCont('glucose_mg_dl', fractions),
+        **{name: Count('glucose_mg_dl', filter=condition) for name, condition in GLUCOSE_RANGES.items()},
+    )
+    count = totals['count']
+    if not count:
+        return None
+
+    minutes = local_date_part('hour', 'device_timestamp') * 60 + local_date_part('minute', 'device_timestamp')
+    slots = readings.annotate(
+        # Integer division
+        slot=minutes / AGP_SLOT_MINUTES
+    ).values('slot').annotate(percentiles=PercentileCont('glucose_mg_dl', fractions)).order_by('slot')
+
+    mean, sd = totals['mean'], totals['sd']
+    agp = {'slot_minutes': AGP_SLOT_MINUTES, 'time': []}
+    agp.update({f'p{percentile}': [] for percentile in AGP_PERCENTILES})
+    for slot in slots:
+        minute = slot['slot'] * AGP_SLOT_MINUTES
+        agp['time'].append(time(minute // 60, minute % 60))
+        for percentile, value in zip(AGP_PERCENTILES, slot['percentiles']):
+            agp[f'p{percentile}'].append(round(value, 1))
+
+    return {
+        'user_id': user_id,
+        'count': count,
+        'mean': round(mean, 1),
+        'sd': round(sd, 1) if sd is not None else None,
+        'cv': round(sd / mean * 100, 1) if sd is not None else None,
+        # Bergenstal et al., 2018
+        'gmi': round(3.31 + 0.02392 * mean, 2),
+        'time_in_ranges': {name: round(totals[name] / count * 100, 1) for name in GLUCOSE_RANGES},
+        'percentiles': {
+            f'p{percentile}': round(value, 1) for percentile, value in zip(AGP_PERCENTILES, totals['percentiles'])
+        },
+        'agp': agp,
+    }
@@ -0,0 +1,39 @@
+from django.core.files.uploadhandler import FileUploadHandler
+from rest_framework import status
+from rest_framework.exceptions import APIException
+
+# Upper bound of the multipart framing around the uploaded file and the other form fields
+MULTIPART_OVERHEAD: int = 64 * 1024
+
+
+class UploadTooLarge(APIException):
+    status_code = status.HTTP_413_REQUEST_ENTITY_TOO_LARGE
+    default_detail = 'The uploaded file is too large.'
+    default_code = 'upload_too_large'
+
+
+class MaxSizeUploadHandler(FileUploadHandler):
+    """
+    Upload handler aborting the upload as soon as a file exceeds ``max_size`` bytes.
+
+    It must come first in ``request.upload_handlers``: it passes the data through to the
+    next handlers, so the limit is enforced while the upload is streamed and before
+    anything is buffered in memory or written to disk.
+    """
+
+    def __init__(self, request=None, max_size: int = None):
+        super().__init__(request)
+        self.max_size = max_size
+
+    def handle_raw_input(self, input_data, META, content_length, boundary, encoding=None):
+        # Reject oversized bodies before reading any of them
+        if content_length > self.max_size + MULTIPART_OVERHEAD:
+            raise UploadTooLarge()
+
+    def receive_data_chunk(self, raw_data, start):
+        if start + len(raw_data) > self.max_size:
+            raise UploadTooLarge()
+        return raw_data
+
+    def file_complete(self, file_size):
+        return None
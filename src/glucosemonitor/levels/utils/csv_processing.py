@@ -1,15 +1,24 @@
+import codecs
+import csv
+import uuid
 from datetime import datetime, tzinfo
-from io import StringIO
+from io import TextIOWrapper
 from logging import Logger, getLogger
 from pathlib import Path
+from typing import BinaryIO, Callable, Optional, TextIO, Union
 
+import numpy as np
 import pandas as pd
 import pytz
-from pandas import DataFrame
+from django.db import models, transaction
+from pandas import DataFrame, Series
 from pandas.io.parsers import TextFileReader
 
 from glucosemonitor import settings
-from glucosemonitor.levels.models import Level
+from glucosemonitor.levels.models import (
+    Device, Level, LevelEvent, IngestMode, EVENT_FIELDS, NATURAL_KEY_FIELDS
+)
+from glucosemonitor.levels.utils.ingest_backends import IngestBackend, IngestResult, get_ingest_backend
 
 logger: Logger = getLogger(__name__)
 
@@ -39,60 +48,375 @@ COLUMNS: dict = {
     'USER_ADJUSTED_INSULIN_UNITS': 'Insulin-Änderung durch Anwender (Einheiten)'
 }
 
+# Define a mapping from the Level model fields to the csv columns they are populated from. The device
+# fields are stored in the Device table and the event fields in the LevelEvent table, see split_chunk.
+LEVEL_FIELDS: dict = {
+    'device_name': COLUMNS['DEVICE_NAME'],
+    'device_serial_number': COLUMNS['DEVICE_SERIAL_NUMBER'],
+    'device_timestamp': COLUMNS['DEVICE_TIMESTAMP'],
+    'recording_type': COLUMNS['RECORDING_TYPE'],
+    'glucose_history_mg_dl': COLUMNS['GLUCOSE_HISTORY_MG_DL'],
+    'glucose_scan_mg_dl': COLUMNS['GLUCOSE_SCAN_MG_DL'],
+    'fast_acting_insulin': COLUMNS['FAST_ACTING_INSULIN'],
+    'fast_acting_insulin_units': COLUMNS['FAST_ACTING_INSULIN_UNITS'],
+    'food_data': COLUMNS['FOOD_DATA'],
+    'carbohydrates_grams': COLUMNS['CARBS_GRAMS'],
+    'carbohydrates_servings': COLUMNS['CARBS_SERVINGS'],
+    'long_acting_insulin': COLUMNS['LONG_ACTING_INSULIN'],
+    'long_acting_insulin_units': COLUMNS['LONG_ACTING_INSULIN_UNITS'],
+    'notes': COLUMNS['NOTES'],
+    'glucose_test_strip_mg_dl': COLUMNS['GLUCOSE_TEST_STRIP_MG_DL'],
+    'ketone_mmol_l': COLUMNS['KETONE_MMOL_L'],
+    'meal_insulin_units': COLUMNS['MEAL_INSULIN_UNITS'],
+    'correction_insulin_units': COLUMNS['CORRECTION_INSULIN_UNITS'],
+    'user_adjusted_insulin_units': COLUMNS['USER_ADJUSTED_INSULIN_UNITS'],
+}
+
+# Columns every upload must have, the readings cannot be stored without them
+REQUIRED_COLUMNS: tuple = (
+    COLUMNS['DEVICE_NAME'],
+    COLUMNS['DEVICE_SERIAL_NUMBER'],
+    COLUMNS['DEVICE_TIMESTAMP'],
+    COLUMNS['RECORDING_TYPE'],
+)
+
+# Format of the device timestamps in the csv file
+TIMESTAMP_FORMAT: str = "%d-%m-%Y %H:%M"
+
+# Byte order marks and the codecs they select. UTF-32 LE must be checked before UTF-16 LE,
+# as its BOM starts with the UTF-16 LE one.
+BYTE_ORDER_MARKS: tuple = (
+    (codecs.BOM_UTF8, 'utf-8-sig'),
+    (codecs.BOM_UTF32_LE, 'utf-32'),
+    (codecs.BOM_UTF32_BE, 'utf-32'),
+    (codecs.BOM_UTF16_LE, 'utf-16'),
+    (codecs.BOM_UTF16_BE, 'utf-16'),
+)
+
+# Encoding used for exports that have no BOM and are not valid UTF-8
+FALLBACK_ENCODING: str = 'cp1252'
+
+# Number of bytes read from the start of a file to detect its encoding
+ENCODING_SAMPLE_SIZE: int = 64 * 1024
+
+
+def detect_encoding(sample: bytes) -> str:
+    """
+    Detects the text encoding of a csv file from its first bytes.
+
+    Byte order marks are honoured first. Files without a BOM are read as UTF-8 if the
+    sample decodes as such, otherwise as Windows-1252, which older LibreLink exports use.
+
+    Args:
+        sample (bytes): The first bytes of the file.
 
-def read_csv_content_and_find_header(csv_file: Path, max_lines: int = 20) -> tuple[StringIO, int]:
+    Returns:
+        str: The name of the codec to decode the file with.
+    """
+    for bom, encoding in BYTE_ORDER_MARKS:
+        if sample.startswith(bom):
+            return encoding
+    try:
+        # The sample may end in the middle of a multibyte character
+        codecs.getincrementaldecoder('utf-8')().decode(sample, final=False)
+    except UnicodeDecodeError:
+        return FALLBACK_ENCODING
+    return 'utf-8'
+
+
+def open_csv_file(csv_file: Union[Path, BinaryIO]) -> BinaryIO:
     """
-    Reads the content of a CSV file and identifies the header row.
+    Returns a binary file object to read a CSV file from, without copying its content.
 
     Args:
-        csv_file (Path): The path to the CSV file.
+        csv_file (Union[Path, BinaryIO]): The path to the CSV file, or a seekable binary file object
+            such as a Django ``UploadedFile``. Uploads spooled to disk are reopened from their
+            temporary path.
+
+    Returns:
+        BinaryIO: The file object, positioned at the start of the file.
+    """
+    if hasattr(csv_file, 'temporary_file_path'):
+        csv_file = Path(csv_file.temporary_file_path())
+    if isinstance(csv_file, (str, Path)):
+        return open(csv_file, 'rb')
+    csv_file.seek(0)
+    return csv_file
+
+
+def read_csv_content_and_find_header(csv_file: Union[Path, BinaryIO], max_lines: int = 20) -> tuple[TextIO, int]:
+    """
+    Opens a CSV file and positions the returned stream at its header row.
+
+    Only the first ``max_lines`` lines are read to find the header row, the rest of the
+    file is left unread so it can be streamed into the csv parser.
+
+    Args:
+        csv_file (Union[Path, BinaryIO]): The path to the CSV file or a binary file object, see ``open_csv_file``.
         max_lines (int): The maximum number of lines to read to find the header row.
 
     Returns:
-        tuple[StringIO, int]: A tuple containing a StringIO stream of the CSV content and the header row index.
+        tuple[TextIO, int]: A tuple containing the open text stream, positioned at the header row,
+            and the header row index. The caller is responsible for closing the stream, which
+            closes the underlying file object as well.
 
     Raises:
         ValueError: If the header row cannot be found.
     """
-    buffer = []
-    header_row = None
-
+    file: BinaryIO = open_csv_file(csv_file)
     try:
-        with open(csv_file, 'r') as file:
-            lines: str = file.readlines()
-            for i, line in enumerate(lines):
-                buffer.append(line)
-                # Check if the line contains the required columns
-                if COLUMNS['DEVICE_NAME'] in line and COLUMNS['DEVICE_SERIAL_NUMBER'] in line:
-                    header_row = i
-                # Stop reading if the header row is not found within max_lines
-                if i >= max_lines and header_row is None:
-                    break
-        if header_row is None:
-            raise ValueError("Unable to find header row in the CSV file.")
+        encoding = detect_encoding(file.read(ENCODING_SAMPLE_SIZE))
+        file.seek(0)
+        stream = TextIOWrapper(file, encoding=encoding, newline='')
+        for i in range(max_lines):
+            position = stream.tell()
+            line = stream.readline()
+            if not line:
+                break
+            # Check if the line contains the required columns
+            if COLUMNS['DEVICE_NAME'] in line and COLUMNS['DEVICE_SERIAL_NUMBER'] in line:
+                stream.seek(position)
+                return stream, i
+        raise ValueError("Unable to find header row in the CSV file.")
     except Exception as e:
+        file.close()
         logger.error(f"Error reading CSV file: {e}")
         raise
 
-    stream = StringIO(''.join(buffer))
-    return stream, header_row
 
+def validate_csv_header(csv_file: BinaryIO, max_lines: int = 20) -> list[str]:
+    """
+    Checks that an uploaded CSV file has a header row with the ``REQUIRED_COLUMNS``, reading only
+    the lines up to the header row, see ``read_csv_content_and_find_header``.
+
+    Args:
+        csv_file (BinaryIO): A seekable binary file object such as a Django ``UploadedFile``, left
+            open and positioned at its start.
+        max_lines (int): The maximum number of lines to read to find the header row.
+
+    Returns:
+        list[str]: The columns of the header row.
 
-def process_csv_file(csv_file_path: Path, user_id: str, chunk_size: int = 10000):
+    Raises:
+        ValueError: If the file cannot be decoded, or the header row or a required column is missing.
     """
-    Processes a CSV file and loads the data into the Level model.
+    try:
+        stream, _ = read_csv_content_and_find_header(csv_file, max_lines=max_lines)
+    except UnicodeDecodeError as e:
+        raise ValueError("Unable to decode the CSV file.") from e
+    columns = next(csv.reader([stream.readline()]))
+    # Uploads spooled to disk were reopened from their temporary path, other files are left open
+    file = stream.detach()
+    if file is csv_file:
+        file.seek(0)
+    else:
+        file.close()
+    missing = [column for column in REQUIRED_COLUMNS if column not in columns]
+    if missing:
+        raise ValueError(f"Missing columns in the CSV header: {', '.join(missing)}.")
+    return columns
+
+
+def get_model_field(field_name: str) -> models.Field:
+    """
+    Returns the model field a field of ``LEVEL_FIELDS`` is stored in, on Level, Device or LevelEvent.
+    """
+    if field_name in EVENT_FIELDS:
+        return LevelEvent._meta.get_field(field_name)
+    if field_name in ('device_name', 'device_serial_number'):
+        return Device._meta.get_field(field_name.removeprefix('device_'))
+    return Level._meta.get_field(field_name)
+
+
+def normalize_chunk(chunk_df: DataFrame, user_id: str) -> DataFrame:
+    """
+    Converts a chunk of raw csv rows into a DataFrame with one typed column per Level field.
+
+    All conversions are done column-wise: timestamps are parsed and localized in one pass,
+    integer columns are rounded into nullable integers and missing values become None.
 
     Args:
-        csv_file_path (Path): The path to the CSV file.
+        chunk_df (DataFrame): The chunk as read from the csv file.
+        user_id (str): The ID of the user.
+
+    Returns:
+        DataFrame: The normalized chunk, with the ``user_id``, the fields of ``LEVEL_FIELDS`` and the ``glucose_mg_dl``.
+
+    Raises:
+        ValueError: If a device timestamp does not match the expected format.
+    """
+    data: dict[str, Series] = {
+        'user_id': pd.Series(str(uuid.UUID(user_id)), index=chunk_df.index, dtype=object),
+    }
+    for field_name, column in LEVEL_FIELDS.items():
+        if column not in chunk_df:
+            # Columns missing in the export are stored as NULL
+            data[field_name] = pd.Series(None, index=chunk_df.index, dtype=object)
+            continue
+
+        values: Series = chunk_df[column]
+        field = get_model_field(field_name)
+        if isinstance(field, models.DateTimeField):
+            # Convert device timestamps to localized datetime objects
+            values = pd.to_datetime(values, format=TIMESTAMP_FORMAT).dt.tz_localize(
+                default_timezone,
+                ambiguous=np.zeros(len(values), dtype=bool),
+                nonexistent='shift_forward',
+            )
+        elif isinstance(field, models.UUIDField):
+            # Use the canonical form, so values compare equal to the stored ones
+            values = values.map({value: str(uuid.UUID(value)) for value in values.dropna().unique()})
+        elif isinstance(field, models.IntegerField):
+            values = pd.to_numeric(values).round().astype('Int64')
+        elif isinstance(field, models.FloatField):
+            values = pd.to_numeric(values).astype(float)
+        data[field_name] = values
+
+    # The glucose value of the reading is the history or the scan value, depending on its recording type
+    recording_type = data['recording_type']
+    data['glucose_mg_dl'] = data['glucose_history_mg_dl'].astype('Int64').where(
+        recording_type == Level.RecordingType.HISTORY,
+        data['glucose_scan_mg_dl'].astype('Int64').where(recording_type == Level.RecordingType.SCAN),
+    )
+
+    return pd.DataFrame(data, index=chunk_df.index)
+
+
+def assign_devices(df: DataFrame, user_id: str, device_ids: dict[str, int], using: str, update: bool) -> DataFrame:
+    """
+    Adds the ``device_id`` column to a normalized chunk, looking up or creating the devices
+    that are not in ``device_ids`` yet, all at once, see ``DeviceManager.resolve``.
+
+    Args:
+        df (DataFrame): A chunk returned by ``normalize_chunk``.
+        user_id (str): The ID of the user.
+        device_ids (dict[str, int]): The IDs of the devices already looked up by serial number, updated in place.
+        using (str): The alias of the database to write to.
+        update (bool): Whether the names of the stored devices are overwritten.
+
+    Returns:
+        DataFrame: The chunk with the ``device_id`` column.
+    """
+    devices = df[['device_serial_number', 'device_name']].drop_duplicates('device_serial_number', keep='last')
+    names = {
+        serial_number: name for serial_number, name in zip(devices['device_serial_number'], devices['device_name'])
+        if serial_number not in device_ids
+    }
+    if names:
+        device_ids.update(Device.objects.db_manager(using).resolve(user_id, names, update=update))
+    return df.assign(device_id=df['device_serial_number'].map(device_ids))
+
+
+def split_chunk(df: DataFrame) -> tuple[DataFrame, DataFrame]:
+    """
+    Splits a chunk into the rows of the Level table and the rows of the LevelEvent table, the
+    latter only for the rows with an insulin dose, food, a note or a test strip measurement.
+
+    Args:
+        df (DataFrame): A chunk returned by ``assign_devices``.
+
+    Returns:
+        tuple[DataFrame, DataFrame]: The rows of Level and of LevelEvent, each with the columns
+        of the concrete fields of its model in their order.
+    """
+    level_fields = [field.attname for field in Level._meta.concrete_fields if not field.primary_key]
+    event_fields = [field.attname for field in LevelEvent._meta.concrete_fields if not field.primary_key]
+    has_event = df[list(EVENT_FIELDS)].notna().any(axis=1)
+    return df[level_fields], df.loc[has_event, event_fields]
+
+
+def delete_replaced_events(df: DataFrame, using: str) -> int:
+    """
+    Deletes the stored events of the rows of a chunk, the rows overwriting them without any.
+
+    Args:
+        df (DataFrame): The rows without an event of a chunk split by ``split_chunk``.
+        using (str): The alias of the database to write to.
+
+    Returns:
+        int: The number of deleted events.
+    """
+    if df.empty:
+        return 0
+    keys = set(zip(*(df[name] for name in NATURAL_KEY_FIELDS)))
+    timestamps = df['device_timestamp']
+    # Events are rare, every event of the devices over the time range of the chunk is read
+    stored = LevelEvent.objects.using(using).filter(
+        device_id__in=df['device_id'].unique().tolist(),
+        device_timestamp__range=(timestamps.min(), timestamps.max()),
+    ).values_list('pk', *NATURAL_KEY_FIELDS)
+    replaced = [
+        pk for pk, device_id, device_timestamp, recording_type in stored
+        if (device_id, pd.Timestamp(device_timestamp), recording_type) in keys
+    ]
+    if not replaced:
+        return 0
+    return LevelEvent.objects.using(using).filter(pk__in=replaced).delete()[0]
+
+
+def drop_known_rows(df: DataFrame, watermarks: dict[int, datetime]) -> DataFrame:
+    """
+    Drops the rows of a normalized chunk that do not need to be written.
+
+    Rows sharing a natural key keep only their last occurrence, and rows older than the
+    latest stored timestamp of their device are dropped, so whole chunks of an overlapping
+    export are skipped without touching the database.
+
+    Args:
+        df (DataFrame): A chunk returned by ``assign_devices``.
+        watermarks (dict[int, datetime]): The latest stored device timestamp per device ID.
+
+    Returns:
+        DataFrame: The remaining rows.
+    """
+    df = df.drop_duplicates(subset=list(NATURAL_KEY_FIELDS), keep='last')
+    if watermarks:
+        watermark = pd.to_datetime(df['device_id'].map(watermarks), utc=True)
+        df = df[~(df['device_timestamp'] < watermark)]
+    return df
+
+
+def process_csv_file(
+        csv_file_path: Union[Path, BinaryIO],
+        user_id: str,
+        chunk_size: int = 10000,
+        backend: str = 'auto',
+        mode: str = IngestMode.IGNORE,
+        progress_callback: Optional[Callable[[IngestResult], None]] = None,
+) -> IngestResult:
+    """
+    Processes a CSV file and loads the data into the Level model, the devices into the Device model
+    and the insulin doses, food, notes and test strip measurements into the LevelEvent model.
+    The hourly and daily LevelRollup buckets covered by the imported rows and the first and last reading
+    timestamps of their devices are refreshed along the way, and the data version of the user is moved
+    forward, see ``LevelManager.refresh_derived``.
+
+    Args:
+        csv_file_path (Union[Path, BinaryIO]): The path to the CSV file, or a binary file object such as
+            a Django ``UploadedFile``, which is parsed in place and closed afterwards.
         user_id (str): The ID of the user.
         chunk_size (int, optional): The number of rows to process in each chunk. Defaults to 10000.
+        backend (str, optional): The name of the ingest backend writing the chunks, see
+            ``get_ingest_backend``. Defaults to 'auto'.
+        mode (str, optional): How rows that are already stored are handled, see ``IngestMode``.
+            APPEND inserts every row and fails on duplicates. IGNORE skips stored rows, including
+            every row older than the latest stored reading of its device. UPDATE overwrites them.
+            Defaults to IGNORE.
+        progress_callback (Callable[[IngestResult], None], optional): Called with the running totals
+            after every chunk.
+
+    Returns:
+        IngestResult: The counts of inserted, updated and skipped rows.
     """
     try:
+        ingest_backend: IngestBackend = get_ingest_backend(backend)
+        watermarks = Level.objects.get_device_watermarks(user_id) if mode == IngestMode.IGNORE else {}
         stream, header_line = read_csv_content_and_find_header(csv_file_path)
+        logger.debug(f"Found header row {header_line} in {csv_file_path}")
+        # The stream is consumed chunk by chunk, so memory is bounded by chunk_size
         pd_chunk_dataframe: TextFileReader = pd.read_csv(
             stream,
             chunksize=chunk_size,
-            skiprows=header_line,
             dtype={
                 COLUMNS['DEVICE_NAME']: str,
                 COLUMNS['DEVICE_SERIAL_NUMBER']: str,
@@ -116,46 +440,44 @@ def process_csv_file(csv_file_path: Path, user_id: str, chunk_size: int = 10000)
             },
         )
 
-        objects = []
+        result = IngestResult()
+        device_ids: dict[str, int] = {}
         chunk_df: DataFrame
-        for chunk_df in pd_chunk_dataframe:
-            # Replace NaN values with None
-            chunk_df = chunk_df.replace({float('nan'): None})
-            for i, row in chunk_df.iterrows():
-                objects.append(
-                    Level(
-                        user_id=user_id,
-                        device_name=row[COLUMNS['DEVICE_NAME']],
-                        device_serial_number=row[COLUMNS['DEVICE_SERIAL_NUMBER']],
-                        # Convert device timestamp to localized datetime object
-                        device_timestamp=default_timezone.localize(
-                            datetime.strptime(row[COLUMNS['DEVICE_TIMESTAMP']], "%d-%m-%Y %H:%M")
-                        ),
-                        recording_type=row[COLUMNS['RECORDING_TYPE']],
-                        glucose_history_mg_dl=row.get(COLUMNS['GLUCOSE_HISTORY_MG_DL']),
-                        glucose_scan_mg_dl=row.get(COLUMNS['GLUCOSE_SCAN_MG_DL']),
-                        fast_acting_insulin=row.get(COLUMNS['FAST_ACTING_INSULIN']),
-                        fast_acting_insulin_units=row.get(COLUMNS['FAST_ACTING_INSULIN_UNITS']),
-                        food_data=row.get(COLUMNS['FOOD_DATA']),
-                        carbohydrates_grams=row.get(COLUMNS['CARBS_GRAMS']),
-                        carbohydrates_servings=row.get(COLUMNS['CARBS_SERVINGS']),
-                        long_acting_insulin=row.get(COLUMNS['LONG_ACTING_INSULIN']),
-                        long_acting_insulin_units=row.get(COLUMNS['LONG_ACTING_INSULIN_UNITS']),
-                        notes=row.get(COLUMNS['NOTES']),
-                        glucose_test_strip_mg_dl=row.get(COLUMNS['GLUCOSE_TEST_STRIP_MG_DL']),
-                        ketone_mmol_l=row.get(COLUMNS['KETONE_MMOL_L']),
-                        meal_insulin_units=row.get(COLUMNS['MEAL_INSULIN_UNITS']),
-                        correction_insulin_units=row.get(COLUMNS['CORRECTION_INSULIN_UNITS']),
-                        user_adjusted_insulin_units=row.get(COLUMNS['USER_ADJUSTED_INSULIN_UNITS'])
-                    )
-                )
-            # Bulk create Level objects in the database
-            if len(objects) >= chunk_size:
-                Level.objects.bulk_create(objects)
-                objects.clear()
-        # Create any remaining Level objects
-        if objects:
-            Level.objects.bulk_create(objects)
+        with stream, pd_chunk_dataframe:
+            for chunk_df in pd_chunk_dataframe:
+                df = normalize_chunk(chunk_df, user_id)
+                df = assign_devices(df, user_id, device_ids, ingest_backend.using, update=mode == IngestMode.UPDATE)
+                if mode != IngestMode.APPEND:
+                    rows = len(df)
+                    df = drop_known_rows(df, watermarks)
+                    result.skipped += rows - len(df)
+                if not df.empty:
+                    # The readings of the chunk, their events and what is derived from them are committed
+                    # together, so that a failure leaves neither readings without their events nor stale
+                    # rollups and device bounds, past which IGNORE imports would skip the rows again
+                    with transaction.atomic(using=ingest_backend.using):
+                        levels_df, events_df = split_chunk(df)
+                        chunk_result = ingest_backend.write(levels_df, mode)
+                        if mode == IngestMode.UPDATE:
+                            delete_replaced_events(
+                                levels_df[~levels_df.index.isin(events_df.index)], ingest_backend.using
+                            )
+                        if not events_df.empty:
+                            # Events are written in the mode of their readings, under the same natural key
+                            ingest_backend.write(events_df, mode, model=LevelEvent)
+                        if chunk_result.inserted or chunk_result.updated:
+                            # Only the buckets overlapping the time range of the chunk are recomputed, the
+                            # cached responses of the user are left behind by the new data version and the
+                            # user reads the new readings from the primary until the replica caught up
+                            bounds = df.groupby('device_id')['device_timestamp'].agg(['min', 'max'])
+                            Level.objects.db_manager(ingest_backend.using).refresh_derived(user_id, {
+                                int(device_id): (first.to_pydatetime(), last.to_pydatetime())
+                                for device_id, first, last in bounds.itertuples()
+                            })
+                    result += chunk_result
+                if progress_callback:
+                    progress_callback(result)
+        return result
     except Exception as e:
         logger.exception(f"Failed to import data from {csv_file_path}: {e}")
         raise
@@ -0,0 +1,51 @@
+import numpy as np
+
+
+def largest_triangle_three_buckets(x: np.ndarray, y: np.ndarray, threshold: int) -> np.ndarray:
+    """
+    Selects ``threshold`` points of a series with the Largest-Triangle-Three-Buckets algorithm,
+    which keeps the visual shape of the series, its peaks and troughs, unlike averaging.
+
+    The first and last points are always kept. The other points are split into ``threshold - 2``
+    buckets, and the point of each bucket forming the largest triangle with the point selected
+    in the previous bucket and the average point of the next bucket is selected.
+
+    Args:
+        x (np.ndarray): The x coordinates of the points, in increasing order.
+        y (np.ndarray): The y coordinates of the points.
+        threshold (int): The number of points to select.
+
+    Returns:
+        np.ndarray: The indexes of the selected points, in increasing order.
+    """
+    length = len(x)
+    if threshold >= length or threshold < 3:
+        return np.arange(length)
+
+    x = np.asarray(x, dtype=float)
+    y = np.asarray(y, dtype=float)
+    # Bucket i spans the points [edges[i], edges[i + 1]), the first and last points stand alone
+    edges = np.floor(np.arange(threshold - 1) * (length - 2) / (threshold - 2)).astype(int) + 1
+    edges[-1] = length - 1
+    x_sums = np.concatenate(([0.0], np.cumsum(x)))
+    y_sums = np.concatenate(([0.0], np.cumsum(y)))
+
+    selected = np.empty(threshold, dtype=int)
+    selected[0], selected[-1] = 0, length - 1
+    previous = 0
+    for i in range(threshold - 2):
+        start, stop = edges[i], edges[i + 1]
+        # The average point of the next bucket, the last point for the last bucket
+        next_start, next_stop = (stop, edges[i + 2]) if i + 2 < len(edges) else (length - 1, length)
+        count = next_stop - next_start
+        average_x = (x_sums[next_stop] - x_sums[next_start]) / count
+        average_y = (y_sums[next_stop] - y_sums[next_start]) / count
+
+        # Twice the area of the triangles, the factor does not change which one is the largest
+        areas = np.abs(
+            (x[previous] - average_x) * (y[start:stop] - y[previous])
+            - (x[previous] - x[start:stop]) * (average_y - y[previous])
+        )
+        previous = start + int(np.argmax(areas))
+        selected[i + 1] = previous
+    return selected
@@ -0,0 +1,219 @@
+from dataclasses import dataclass
+from io import StringIO
+from logging import Logger, getLogger
+
+import pandas as pd
+from django.db import DEFAULT_DB_ALIAS, connections, models, transaction
+from pandas import DataFrame, Series
+
+from glucosemonitor.levels.models import Level, IngestMode, NATURAL_KEY_FIELDS
+
+logger: Logger = getLogger(__name__)
+
+
+def build_levels(df: DataFrame, model: type[models.Model] = Level) -> list[models.Model]:
+    """
+    Builds unsaved Level or LevelEvent instances from a chunk split by ``split_chunk``.
+
+    The instances are created positionally from the column arrays, without
+    per-row Series access.
+
+    Args:
+        df (DataFrame): The rows of the model, with a column per concrete field but the primary key.
+        model (type[Model]): The model of the rows. Defaults to Level.
+
+    Returns:
+        list[Model]: The instances, in the order of the rows.
+    """
+    columns = []
+    for name in df.columns:
+        values: Series = df[name]
+        if pd.api.types.is_datetime64_any_dtype(values):
+            columns.append(values.array.to_pydatetime().tolist())
+        else:
+            # Replace NaN values with None
+            columns.append(values.astype(object).where(values.notna(), None).tolist())
+    return [model(None, *row) for row in zip(*columns)]
+
+
+@dataclass
+class IngestResult:
+    """
+    Counts of the rows handled by an import.
+    """
+    inserted: int = 0
+    updated: int = 0
+    skipped: int = 0
+
+    @property
+    def rows(self) -> int:
+        return self.inserted + self.updated + self.skipped
+
+    def __add__(self, other: 'IngestResult') -> 'IngestResult':
+        return IngestResult(
+            inserted=self.inserted + other.inserted,
+            updated=self.updated + other.updated,
+            skipped=self.skipped + other.skipped,
+        )
+
+
+class IngestBackend:
+    """
+    Base class for the backends writing normalized chunks into the Level and LevelEvent tables.
+    """
+    name: str = None
+
+    def __init__(self, using: str = DEFAULT_DB_ALIAS):
+        self.using = using
+
+    def write(self, df: DataFrame, mode: str = IngestMode.APPEND, model: type[models.Model] = Level) -> IngestResult:
+        """
+        Writes the rows of a chunk into the database.
+
+        Args:
+            df (DataFrame): The rows of the model split from a chunk by ``split_chunk``, without
+                duplicated natural keys unless the mode is APPEND.
+            mode (str): How rows whose natural key already exists are handled, see ``IngestMode``.
+                APPEND fails on them, IGNORE skips them and UPDATE overwrites them.
+            model (type[Model]): The model of the rows, Level or LevelEvent. Defaults to Level.
+
+        Returns:
+            IngestResult: The counts of inserted, updated and skipped rows.
+        """
+        raise NotImplementedError
+
+
+class BulkCreateBackend(IngestBackend):
+    """
+    Writes chunks through the ORM with ``bulk_create``. Works on every database.
+    """
+    name = 'bulk_create'
+
+    def write(self, df: DataFrame, mode: str = IngestMode.APPEND, model: type[models.Model] = Level) -> IngestResult:
+        queryset = model.objects.using(self.using)
+        if mode == IngestMode.APPEND:
+            queryset.bulk_create(build_levels(df, model), batch_size=len(df) or None)
+            return IngestResult(inserted=len(df))
+
+        exists = self.find_existing(df, model)
+        if mode == IngestMode.IGNORE:
+            new_df = df[~exists]
+            # Rows inserted concurrently since the lookup are ignored by the database
+            queryset.bulk_create(build_levels(new_df, model), batch_size=len(new_df) or None, ignore_conflicts=True)
+            return IngestResult(inserted=len(new_df), skipped=int(exists.sum()))
+
+        queryset.bulk_create(
+            build_levels(df, model),
+            batch_size=len(df) or None,
+            update_conflicts=True,
+            unique_fields=NATURAL_KEY_FIELDS,
+            update_fields=[name for name in df.columns if name not in NATURAL_KEY_FIELDS],
+        )
+        return IngestResult(inserted=int((~exists).sum()), updated=int(exists.sum()))
+
+    def find_existing(self, df: DataFrame, model: type[models.Model] = Level) -> Series:
+        """
+        Returns a boolean mask of the rows whose natural key is already stored.
+        """
+        if df.empty:
+            return pd.Series(False, index=df.index)
+        timestamps = df['device_timestamp']
+        stored_keys = {
+            (device_id, pd.Timestamp(device_timestamp), recording_type)
+            for device_id, device_timestamp, recording_type in model.objects.using(self.using).filter(
+                device_id__in=df['device_id'].unique().tolist(),
+                device_timestamp__range=(timestamps.min(), timestamps.max()),
+            ).values_list(*NATURAL_KEY_FIELDS)
+        }
+        keys = zip(*(df[name] for name in NATURAL_KEY_FIELDS))
+        return pd.Series([key in stored_keys for key in keys], index=df.index, dtype=bool)
+
+
+class CopyBackend(IngestBackend):
+    """
+    Streams chunks into PostgreSQL with ``COPY FROM STDIN``, bypassing model instantiation.
+    """
+    name = 'copy'
+
+    def __init__(self, using: str = DEFAULT_DB_ALIAS):
+        super().__init__(using)
+        if connections[using].vendor != 'postgresql':
+            raise ValueError(f"The '{self.name}' ingest backend requires PostgreSQL")
+
+    def write(self, df: DataFrame, mode: str = IngestMode.APPEND, model: type[models.Model] = Level) -> IngestResult:
+        connection = connections[self.using]
+        quote_name = connection.ops.quote_name
+        # Empty unquoted values are loaded as NULL
+        buffer = StringIO()
+        df.to_csv(buffer, index=False, header=False)
+        buffer.seek(0)
+
+        table = quote_name(model._meta.db_table)
+        fields = {field.attname: field for field in model._meta.concrete_fields}
+        column_names = [fields[name].column for name in df.columns]
+        columns = ', '.join(quote_name(column) for column in column_names)
+        if mode == IngestMode.APPEND:
+            with connection.cursor() as cursor:
+                cursor.copy_expert(f"COPY {table} ({columns}) FROM STDIN WITH (FORMAT csv)", buffer)
+            return IngestResult(inserted=len(df))
+
+        # Rows are copied into a staging table first and then merged with a single INSERT ... ON CONFLICT
+        staging = quote_name(f'{model._meta.db_table}_staging')
+        key_columns = [fields[name].column for name in NATURAL_KEY_FIELDS]
+        conflict_target = ', '.join(quote_name(column) for column in key_columns)
+        if mode == IngestMode.IGNORE:
+            conflict_action = 'DO NOTHING'
+        else:
+            conflict_action = 'DO UPDATE SET ' + ', '.join(
+                f'{quote_name(column)} = EXCLUDED.{quote_name(column)}'
+                for column in column_names if column not in key_columns
+            )
+
+        with transaction.atomic(using=self.using), connection.cursor() as cursor:
+            cursor.execute(
+                f"CREATE TEMPORARY TABLE {staging} ON COMMIT DROP AS SELECT {columns} FROM {table} WITH NO DATA"
+            )
+            cursor.copy_expert(f"COPY {staging} ({columns}) FROM STDIN WITH (FORMAT csv)", buffer)
+            # xmax is 0 only for freshly inserted row versions
+            cursor.execute(
+                f"INSERT INTO {table} ({columns}) SELECT {columns} FROM {staging} "
+                f"ON CONFLICT ({conflict_target}) {conflict_action} RETURNING (xmax = 0)"
+            )
+            inserted_flags = [inserted for inserted, in cursor.fetchall()]
+            # The staging table is dropped right away, the import may run inside an outer transaction
+            cursor.execute(f"DROP TABLE {staging}")
+
+        inserted = sum(inserted_flags)
+        if mode == IngestMode.IGNORE:
+            return IngestResult(inserted=inserted, skipped=len(df) - inserted)
+        return IngestResult(inserted=inserted, updated=len(inserted_flags) - inserted)
+
+
+# Define a mapping from the backend names to the ingest backend classes
+INGEST_BACKENDS: dict = {
+    BulkCreateBackend.name: BulkCreateBackend,
+    CopyBackend.name: CopyBackend,
+}
+
+
+def get_ingest_backend(name: str = 'auto', using: str = DEFAULT_DB_ALIAS) -> IngestBackend:
+    """
+    Returns the ingest backend with the given name.
+
+    Args:
+        name (str): The backend name, or 'auto' to use COPY on PostgreSQL and bulk_create elsewhere.
+        using (str): The alias of the database to write to.
+
+    Returns:
+        IngestBackend: The ingest backend instance.
+
+    Raises:
+        ValueError: If the backend is unknown or unsupported by the database.
+    """
+    if name == 'auto':
+        name = CopyBackend.name if connections[using].vendor == 'postgresql' else BulkCreateBackend.name
+    try:
+        backend_class = INGEST_BACKENDS[name]
+    except KeyError:
+        raise ValueError(f"Unknown ingest backend '{name}'")
+    return backend_class(using)
@@ -0,0 +1,189 @@
+from datetime import date, datetime, timezone
+from logging import Logger, getLogger
+
+from django.db import DEFAULT_DB_ALIAS, connections, transaction
+
+from glucosemonitor.levels.models import Level
+
+logger: Logger = getLogger(__name__)
+
+# Partition holding the rows outside of every monthly partition
+DEFAULT_PARTITION: str = f'{Level._meta.db_table}_default'
+BRIN_INDEX: str = 'level_timestamp_brin'
+
+
+def add_months(month: date, months: int) -> date:
+    """
+    Returns the first day of the month ``months`` months after ``month``.
+    """
+    index = month.year * 12 + month.month - 1 + months
+    return date(index // 12, index % 12 + 1, 1)
+
+
+def partition_name(month: date) -> str:
+    return f'{Level._meta.db_table}_y{month.year}m{month.month:02d}'
+
+
+def is_partitioned(using: str = DEFAULT_DB_ALIAS) -> bool:
+    """
+    Returns whether the Level table is a partitioned table.
+    """
+    with connections[using].cursor() as cursor:
+        cursor.execute("SELECT relkind FROM pg_class WHERE oid = %s::regclass", [Level._meta.db_table])
+        return cursor.fetchone()[0] == 'p'
+
+
+def get_partitions(using: str = DEFAULT_DB_ALIAS) -> list[str]:
+    """
+    Returns the names of the partitions of the Level table.
+    """
+    with connections[using].cursor() as cursor:
+        cursor.execute(
+            "SELECT inhrelid::regclass::text FROM pg_inherits WHERE inhparent = %s::regclass ORDER BY 1",
+            [Level._meta.db_table],
+        )
+        return [name for name, in cursor.fetchall()]
+
+
+def create_month_partition(month: date, using: str = DEFAULT_DB_ALIAS) -> bool:
+    """
+    Creates the partition of the Level table holding the readings of the given month.
+    Readings of that month found in the default partition are moved to the new partition.
+
+    Args:
+        month (date): The first day of the month.
+        using (str): The database alias.
+
+    Returns:
+        bool: Whether the partition was created, False if it already existed.
+    """
+    connection = connections[using]
+    quote = connection.ops.quote_name
+    table, name = Level._meta.db_table, partition_name(month)
+    start = datetime(month.year, month.month, 1, tzinfo=timezone.utc)
+    stop = datetime(*add_months(month, 1).timetuple()[:3], tzinfo=timezone.utc)
+
+    with transaction.atomic(using=using), connection.cursor() as cursor:
+        if name in get_partitions(using):
+            return False
+        # Tables with deferred foreign key checks still pending in the transaction cannot be altered
+        cursor.execute("SET CONSTRAINTS ALL IMMEDIATE")
+        # Attaching a table checks the default partition only, so the rows it holds for this
+        # month are moved first. The indexes of the parent table are created on attach.
+        cursor.execute(f"CREATE TABLE {quote(name)} (LIKE {quote(table)} INCLUDING DEFAULTS)")
+        cursor.execute(
+            f"WITH moved AS (DELETE FROM {quote(DEFAULT_PARTITION)} "
+            f"WHERE device_timestamp >= %s AND device_timestamp < %s RETURNING *) "
+            f"INSERT INTO {quote(name)} SELECT * FROM moved",
+            [start, stop],
+        )
+        if cursor.rowcount:
+            logger.info(f"Moved {cursor.rowcount} rows from {DEFAULT_PARTITION} to {name}")
+        cursor.execute(
+            f"ALTER TABLE {quote(table)} ATTACH PARTITION {quote(name)} FOR VALUES FROM (%s) TO (%s)",
+            [start, stop],
+        )
+    return True
+
+
+def create_partitions(until: date, since: date = None, using: str = DEFAULT_DB_ALIAS) -> list[str]:
+    """
+    Creates the missing monthly partitions of the Level table up to the month of ``until``.
+
+    Args:
+        until (date): The last month to create a partition for.
+        since (date, optional): The first month to create a partition for. Defaults to the month
+            of the oldest reading stored in the default partition, or the month of ``until``.
+        using (str): The database alias.
+
+    Returns:
+        list[str]: The names of the created partitions.
+    """
+    if since is None:
+        connection = connections[using]
+        with connection.cursor() as cursor:
+            cursor.execute(f"SELECT MIN(device_timestamp) FROM {connection.ops.quote_name(DEFAULT_PARTITION)}")
+            oldest = cursor.fetchone()[0]
+        since = min(oldest.astimezone(timezone.utc).date(), until) if oldest else until
+
+    created = []
+    month = since.replace(day=1)
+    while month <= until:
+        if create_month_partition(month, using=using):
+            created.append(partition_name(month))
+        month = add_months(month, 1)
+    return created
+
+
+def partition_level_table(until: date, using: str = DEFAULT_DB_ALIAS) -> list[str]:
+    """
+    Converts the Level table into a table partitioned by the month of ``device_timestamp``
+    and moves the existing rows into it.
+
+    Partitioned tables require the partition key in every unique constraint, so the primary
+    key becomes (id, device_timestamp). The ids are still unique, they come from a sequence.
+    The constraints, the foreign keys and the indexes of the model are created again, along
+    with a BRIN index on ``device_timestamp``.
+
+    Args:
+        until (date): The last month to create a partition for.
+        using (str): The database alias.
+
+    Returns:
+        list[str]: The names of the created partitions.
+    """
+    connection = connections[using]
+    if connection.vendor != 'postgresql':
+        raise ValueError("Partitioning requires a PostgreSQL database")
+
+    quote = connection.ops.quote_name
+    table = Level._meta.db_table
+    unpartitioned = f'{table}_unpartitioned'
+    sequence = f'{table}_id_seq'
+
+    with transaction.atomic(using=using), connection.cursor() as cursor:
+        # Tables with deferred foreign key checks still pending in the transaction cannot be altered
+        cursor.execute("SET CONSTRAINTS ALL IMMEDIATE")
+        # The old table hands over its name, the names of its constraints and its id sequence
+        cursor.execute(f"ALTER TABLE {quote(table)} RENAME TO {quote(unpartitioned)}")
+        cursor.execute(
+            "SELECT conname, pg_get_constraintdef(oid) FROM pg_constraint WHERE conrelid = %s::regclass "
+            "AND contype = 'f'",
+            [unpartitioned],
+        )
+        foreign_keys = cursor.fetchall()
+        constraints = [table + '_pkey'] + [constraint.name for constraint in Level._meta.constraints]
+        for constraint in constraints + [name for name, _ in foreign_keys]:
+            cursor.execute(f"ALTER TABLE {quote(unpartitioned)} DROP CONSTRAINT {quote(constraint)}")
+        for index in Level._meta.indexes:
+            cursor.execute(f"DROP INDEX {quote(index.name)}")
+        cursor.execute(f"SELECT COALESCE(MAX(id), 0), MIN(device_timestamp) FROM {quote(unpartitioned)}")
+        last_id, oldest = cursor.fetchone()
+        cursor.execute(f"ALTER TABLE {quote(unpartitioned)} ALTER COLUMN id DROP IDENTITY IF EXISTS")
+
+        cursor.execute(
+            f"CREATE TABLE {quote(table)} (LIKE {quote(unpartitioned)}) PARTITION BY RANGE (device_timestamp)"
+        )
+        cursor.execute(f"CREATE SEQUENCE {quote(sequence)} OWNED BY {quote(table)}.id")
+        cursor.execute("SELECT setval(%s, %s, %s)", [sequence, max(last_id, 1), last_id > 0])
+        cursor.execute(f"ALTER TABLE {quote(table)} ALTER COLUMN id SET DEFAULT nextval(%s::regclass)", [sequence])
+        cursor.execute(f"CREATE TABLE {quote(DEFAULT_PARTITION)} PARTITION OF {quote(table)} DEFAULT")
+        since = min(oldest.astimezone(timezone.utc).date(), until) if oldest else until
+        created = create_partitions(until, since=since, using=using)
+
+        # The indexes are built once the rows are in place
+        cursor.execute(f"INSERT INTO {quote(table)} SELECT * FROM {quote(unpartitioned)}")
+        logger.info(f"Moved {cursor.rowcount} rows to the partitioned {table} table")
+        cursor.execute(f"DROP TABLE {quote(unpartitioned)}")
+
+        cursor.execute(f"ALTER TABLE {quote(table)} ADD CONSTRAINT {quote(table + '_pkey')} "
+                       f"PRIMARY KEY (id, device_timestamp)")
+        for name, definition in foreign_keys:
+            cursor.execute(f"ALTER TABLE {quote(table)} ADD CONSTRAINT {quote(name)} {definition}")
+        with connection.schema_editor(atomic=False) as schema_editor:
+            for constraint in Level._meta.constraints:
+                schema_editor.add_constraint(Level, constraint)
+            for index in Level._meta.indexes:
+                schema_editor.add_index(Level, index)
+        cursor.execute(f"CREATE INDEX {quote(BRIN_INDEX)} ON {quote(table)} USING brin (device_timestamp)")
+    return created
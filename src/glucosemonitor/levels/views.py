@@ -1,23 +1,55 @@
-import os
-from pathlib import Path
+import uuid
+from typing import Optional
 
-import pandas as pd
-from django.core.files.base import ContentFile
-from django.core.files.storage import default_storage
-from django.http import JsonResponse, HttpResponse
+from django.conf import settings
+from django.http import StreamingHttpResponse
 from django_filters.rest_framework import DjangoFilterBackend
 from rest_framework import generics, mixins, permissions, status
 from rest_framework.filters import OrderingFilter
+from rest_framework.renderers import BrowsableAPIRenderer
 from rest_framework.response import Response
+from rest_framework.reverse import reverse
 from rest_framework.views import APIView
 
-from glucosemonitor.levels.filters import LevelFilter
-from glucosemonitor.levels.models import Level
-from glucosemonitor.levels.serializers import LevelSerializer, LevelCSVDataUploadSerializer, LevelMinMaxSerializer
-from glucosemonitor.levels.utils.csv_processing import process_csv_file
+from glucosemonitor.levels.cache import acached_value, cached_value, get_cache_stats
+from glucosemonitor.levels.conditional import aget_state, conditional_response, get_state
+from glucosemonitor.levels.encoders import ColumnarEncoder, RowEncoder
+from glucosemonitor.levels.exports import EXPORT_CHUNK_SIZE, batched, stream_csv, stream_json, stream_ndjson
+from glucosemonitor.levels.filters import DeviceFilter, LevelFilter
+from glucosemonitor.levels.jobs import create_import_job
+from glucosemonitor.levels.models import Device, Level, LevelRollup, ImportJob
+from glucosemonitor.levels.pagination import CountedLimitOffsetPagination, KeysetPagination
+from glucosemonitor.levels.renderers import ColumnarJSONRenderer, FastJSONRenderer
+from glucosemonitor.levels.routers import read_from_replica
+from glucosemonitor.levels.serializers import (
+    LevelSerializer, LevelCSVDataUploadSerializer, LevelMinMaxSerializer, LevelMinMaxBatchQuerySerializer,
+    LevelMinMaxCountSerializer, LevelSeriesQuerySerializer, ImportJobSerializer, DeviceSerializer
+)
+from glucosemonitor.levels.series import get_series
+from glucosemonitor.levels.stats import get_glycemic_stats
+from glucosemonitor.levels.uploads import MaxSizeUploadHandler
 
 
-class LevelListView(generics.GenericAPIView, mixins.ListModelMixin):
+class ReplicaReadMixin:
+    """
+    Serves the reads of a view from the read replica, unless a user of the request has just
+    written readings, see ``read_from_replica``. Querysets are bound to their database as they are
+    built, so that streamed exports keep reading from it once the view returned.
+    """
+
+    def get_read_user_ids(self, request) -> list:
+        return request.GET.getlist('user_id')
+
+    def dispatch(self, request, *args, **kwargs):
+        with read_from_replica(self.get_read_user_ids(request)):
+            return super().dispatch(request, *args, **kwargs)
+
+    def get_queryset(self):
+        queryset = super().get_queryset()
+        return queryset.using(queryset.db)
+
+
+class LevelListView(ReplicaReadMixin, generics.GenericAPIView, mixins.ListModelMixin):
     """
     API view to list glucose levels with filtering, sorting, and pagination.
     """
@@ -26,74 +58,206 @@ class LevelListView(generics.GenericAPIView, mixins.ListModelMixin):
     serializer_class = LevelSerializer
     filter_backends = (DjangoFilterBackend, OrderingFilter)
     filterset_class = LevelFilter
-    ordering_fields = ['glucose_history_mg_dl', 'glucose_scan_mg_dl', "device_timestamp"]
+    ordering_fields = ['glucose_history_mg_dl', 'glucose_scan_mg_dl', 'glucose_mg_dl', "device_timestamp"]
+    renderer_classes = (FastJSONRenderer, ColumnarJSONRenderer, BrowsableAPIRenderer)
+    pagination_class = CountedLimitOffsetPagination
+    # Fields of which the columnar format lists the distinct values once
+    dictionary_fields = ('device_name', 'device_serial_number')
+
+    @property
+    def paginator(self):
+        """
+        Uses keyset pagination when a cursor is given or ``pagination=cursor`` is requested,
+        the default limit/offset pagination otherwise.
+        """
+        if not hasattr(self, '_paginator'):
+            params = self.request.query_params
+            if KeysetPagination.cursor_query_param in params or params.get('pagination') == 'cursor':
+                self._paginator = KeysetPagination()
+            else:
+                self._paginator = self.pagination_class()
+        return self._paginator
 
     def get(self, request, *args, **kwargs):
         format_export = request.query_params.get('export')
         if format_export:
-            return self.handle_export(request, format_export)
-        return self.list(request, *args, **kwargs)
+            def build():
+                return self.handle_export(request, format_export)
+        else:
+            def build():
+                return self.list(request, *args, **kwargs)
+
+        # Unchanged pages and exports are answered with 304 Not Modified before they are read,
+        # pages are cached, exports are not
+        filterset = LevelFilter(request.query_params, queryset=self.get_queryset())
+        if not filterset.is_valid():
+            return build()
+        return conditional_response('level-list', request, filterset.qs, build, cached=not format_export)
+
+    def get_exact_count(self, queryset) -> int:
+        """
+        Returns the number of levels matching the filters for ``CountedLimitOffsetPagination``.
+        The count is read from the rollups, and cached under the state of the readings of the
+        range for every page of the same range, whatever its offset, limit, ordering or format.
+        """
+        user_id, start, stop, readings = self.get_count_range()
+        key = self.get_count_key(start, stop, get_state(readings))
+        return cached_value(
+            'level-count', user_id, key, lambda: LevelRollup.objects.get_count(user_id, start=start, stop=stop)
+        )
+
+    async def aget_exact_count(self, queryset) -> int:
+        """
+        Async variant of ``get_exact_count``.
+        """
+        user_id, start, stop, readings = self.get_count_range()
+        key = self.get_count_key(start, stop, await aget_state(readings))
+        return await acached_value(
+            'level-count', user_id, key, lambda: LevelRollup.objects.aget_count(user_id, start=start, stop=stop)
+        )
+
+    def get_count_range(self) -> tuple:
+        """
+        Returns the user, the start and the stop filtered on, and the readings of the range.
+        """
+        filterset = LevelFilter(self.request.query_params, queryset=self.get_queryset())
+        filterset.is_valid()
+        user_id, start, stop = (filterset.form.cleaned_data[name] for name in ('user_id', 'start', 'stop'))
+        return user_id, start, stop, filterset.qs
+
+    def get_count_key(self, start, stop, state: str) -> str:
+        return f"{start.isoformat() if start else ''}/{stop.isoformat() if stop else ''}/{state}"
+
+    def is_columnar(self) -> bool:
+        """
+        Returns whether the columnar format was requested with ``format=columnar``.
+        """
+        return self.request.accepted_renderer.format == ColumnarJSONRenderer.format
+
+    def get_encoder(self) -> RowEncoder:
+        if self.is_columnar():
+            return ColumnarEncoder(self.get_serializer(), dictionary_fields=self.dictionary_fields)
+        return RowEncoder(self.get_serializer())
+
+    def list(self, request, *args, **kwargs):
+        """
+        Lists the levels like ``ListModelMixin.list``, reading the serialized fields as tuples
+        encoded by a ``RowEncoder`` rather than through model instances and ``LevelSerializer``.
+        The rows of the page are a single object of columns in the columnar format.
+        """
+        queryset = self.filter_queryset(self.get_queryset())
+        encoder = self.get_encoder()
+        encode = encoder.encode_columns if self.is_columnar() else encoder.encode_rows
+        rows = encoder.values_list(queryset)
+
+        page = self.paginate_queryset(rows)
+        if page is not None:
+            return self.get_paginated_response(encode(page))
+        return Response(encode(rows))
 
     def handle_export(self, request, format_):
         """
         Handles data export in the specified format.
+        The rows are read from a database cursor and streamed, so the memory use does not
+        depend on the number of exported rows. In the columnar format, the JSON exports are
+        made of columnar blocks of ``EXPORT_CHUNK_SIZE`` rows.
 
         Args:
             request (Request): The request object.
-            format_ (str): The export format ('json' or 'csv').
+            format_ (str): The export format ('json', 'ndjson' or 'csv').
 
         Returns:
             Response: The response object.
         """
-        queryset = self.filter_queryset(self.get_queryset())
-        serializer = self.get_serializer(queryset, many=True)
-        data = serializer.data
+        invalid = self.check_export_format(format_)
+        if invalid is not None:
+            return invalid
 
-        if format_ == 'json':
-            return self.export_json(data)
-        elif format_ == 'csv':
-            return self.export_csv(data)
+        queryset = self.filter_queryset(self.get_queryset())
+        encoder = self.get_encoder()
+        rows = encoder.values_list(queryset).iterator(chunk_size=EXPORT_CHUNK_SIZE)
+        if self.is_columnar():
+            rows = map(encoder.encode_columns, batched(rows, EXPORT_CHUNK_SIZE))
         else:
+            rows = map(encoder.encode, rows)
+        return self.export(format_, rows, encoder.field_names)
+
+    def check_export_format(self, format_) -> Optional[Response]:
+        """
+        Returns the error response of an export format that does not exist, or has no columnar
+        format when the columnar format is requested, None if the format is valid.
+        """
+        if format_ not in ('json', 'ndjson', 'csv'):
             return Response({"detail": "Invalid export format"}, status=status.HTTP_400_BAD_REQUEST)
+        if self.is_columnar() and format_ == 'csv':
+            return Response({"detail": "The csv export has no columnar format"}, status=status.HTTP_400_BAD_REQUEST)
+        return None
 
-    def export_json(self, data):
+    def export(self, format_, rows, fields):
+        """
+        Exports the serialized rows in a valid export format, see ``check_export_format``.
+        """
+        columnar = self.is_columnar()
+        if format_ == 'json':
+            return self.export_json(rows, compact=columnar)
+        elif format_ == 'ndjson':
+            return self.export_ndjson(rows, compact=columnar)
+        return self.export_csv(rows, fields)
+
+    def export_json(self, rows, compact=False):
         """
         Exports data in JSON format.
 
         Args:
-            data (Any): The data to be exported.
+            rows (Iterable[dict]): The serialized rows to be exported.
+            compact (bool): Whether to write every row on a single line, without whitespace.
 
         Returns:
-            JsonResponse: The JSON response with exported data.
+            StreamingHttpResponse: The streamed JSON array.
         """
-        return JsonResponse(data, safe=False, json_dumps_params={'indent': 2})
+        return StreamingHttpResponse(stream_json(rows, compact=compact), content_type='application/json')
 
-    def export_csv(self, data):
+    def export_ndjson(self, rows, compact=False):
+        """
+        Exports data in newline-delimited JSON format.
+
+        Args:
+            rows (Iterable[dict]): The serialized rows to be exported.
+            compact (bool): Whether to leave out the whitespace after the separators.
+
+        Returns:
+            StreamingHttpResponse: The streamed JSON lines.
+        """
+        return StreamingHttpResponse(stream_ndjson(rows, compact=compact), content_type='application/x-ndjson')
+
+    def export_csv(self, rows, fields):
         """
         Exports data in CSV format.
 
         Args:
-            data (Any): The data to be exported.
+            rows (Iterable[dict]): The serialized rows to be exported.
+            fields (list[str]): The exported columns.
 
         Returns:
-            HttpResponse: The CSV response with exported data.
+            StreamingHttpResponse: The streamed CSV file.
         """
-        df = pd.DataFrame(data)
-        response = HttpResponse(content_type='text/csv')
+        response = StreamingHttpResponse(stream_csv(rows, fields), content_type='text/csv')
         response['Content-Disposition'] = 'attachment; filename="levels.csv"'
-        df.to_csv(path_or_buf=response, index=False)
         return response
 
 
-class LevelDetailView(generics.GenericAPIView, mixins.RetrieveModelMixin):
+class LevelDetailView(ReplicaReadMixin, generics.GenericAPIView, mixins.RetrieveModelMixin):
     """
     API view to retrieve a specific glucose level by ID.
     """
-    queryset = Level.objects.all()
+    queryset = Level.objects.select_related('device')
     serializer_class = LevelSerializer
 
     def get(self, request, *args, **kwargs):
-        return self.retrieve(request, *args, **kwargs)
+        queryset = self.get_queryset().filter(pk=kwargs['pk'])
+        return conditional_response(
+            f"level-detail:{kwargs['pk']}", request, queryset, lambda: self.retrieve(request, *args, **kwargs)
+        )
 
 
 class LevelUploadView(APIView):
@@ -103,46 +267,193 @@ class LevelUploadView(APIView):
     serializer_class = LevelCSVDataUploadSerializer
     permission_classes = (permissions.IsAuthenticated,)
 
+    def initial(self, request, *args, **kwargs):
+        # The limit must be in place before anything reads the request body
+        request.upload_handlers.insert(0, MaxSizeUploadHandler(request, max_size=settings.LEVELS_UPLOAD_MAX_SIZE))
+        super().initial(request, *args, **kwargs)
+
     def post(self, request, *args, **kwargs):
         serializer = LevelCSVDataUploadSerializer(data=request.data)
         if not serializer.is_valid():
             return Response(serializer.errors, status=status.HTTP_400_BAD_REQUEST)
 
         file = serializer.validated_data['file']
-        # TODO: Implement security checks to ensure the file is safe to process (e.g., validate file type, size, and content)
-        file_path = default_storage.save(f'tmp/{file.name}', ContentFile(file.read()))
-        tmp_file = Path(default_storage.path(file_path))
         user_id = file.name[:-4]  # Assume the user_id is derived from the file name
         try:
-            process_csv_file(tmp_file, user_id)
-        except Exception as e:
-            return Response({"detail": "Cannot process uploaded file"}, status=status.HTTP_500_INTERNAL_SERVER_ERROR)
-        finally:
-            if tmp_file.exists():
-                os.remove(tmp_file)
-        return Response({"detail": "File processed successfully"}, status=status.HTTP_201_CREATED)
+            user_id = uuid.UUID(user_id)
+        except ValueError:
+            return Response({"detail": "The file name must be <user_id>.csv"}, status=status.HTTP_400_BAD_REQUEST)
+
+        job = create_import_job(user_id, file, serializer.validated_data['mode'])
+        job.refresh_from_db()
+
+        status_url = reverse('level-upload-job', args=[job.pk], request=request)
+        return Response(
+            {"job_id": job.pk, "state": job.state, "status_url": status_url},
+            status=status.HTTP_202_ACCEPTED,
+            headers={"Location": status_url},
+        )
+
+
+class ImportJobDetailView(generics.RetrieveAPIView):
+    """
+    API view to report the progress of a CSV import job.
+    """
+    permission_classes = (permissions.IsAuthenticated,)
+    queryset = ImportJob.objects.all()
+    serializer_class = ImportJobSerializer
+    lookup_url_kwarg = 'job_id'
 
 
-class MinMaxLevelView(generics.RetrieveAPIView):
+class MinMaxLevelView(ReplicaReadMixin, generics.RetrieveAPIView):
     permission_classes = (permissions.IsAuthenticated,)
     filter_backends = (DjangoFilterBackend, )
     filterset_class = LevelFilter
     serializer_class = LevelMinMaxSerializer
     queryset = Level.objects.all()
 
-    def get(self, *args, **kwargs):
+    def get(self, request, *args, **kwargs):
+        filterset = LevelFilter(request.query_params, queryset=self.queryset)
+        if not filterset.is_valid():
+            return self.get_min_max()
+        return conditional_response('level-minmax', request, filterset.qs, self.get_min_max, cached=True)
+
+    def get_min_max(self):
+        filters, invalid = self.clean_min_max_filters()
+        if invalid is not None:
+            return invalid
+
+        # Whole hours and days are read from the rollups, the raw readings only at the edges of the range
+        aggregation_result = LevelRollup.objects.get_min_max(
+            filters['user_id'], start=filters['start'], stop=filters['stop']
+        )
+        return self.min_max_response(aggregation_result)
+
+    def clean_min_max_filters(self) -> tuple[Optional[dict], Optional[Response]]:
+        """
+        Returns the cleaned filters of the request, or the response to send when they are invalid.
+        """
         user_id = self.request.query_params['user_id']
         if not user_id:
-            return Response({"detail": "user_id is required"}, status=status.HTTP_200_OK)
+            return None, Response({"detail": "user_id is required"}, status=status.HTTP_200_OK)
 
         filterset = LevelFilter(self.request.query_params, queryset=self.queryset)
+        if not filterset.is_valid():
+            return None, Response(filterset.errors, status=status.HTTP_400_BAD_REQUEST)
+        return filterset.form.cleaned_data, None
+
+    def min_max_response(self, aggregation_result: Optional[dict]) -> Response:
+        if aggregation_result is None:
+            return Response({"detail": "No data found for this user"}, status=status.HTTP_404_NOT_FOUND)
+
+        serializer = LevelMinMaxSerializer(aggregation_result)
+        return Response(serializer.data, status=status.HTTP_200_OK)
+
+
+class MinMaxBatchLevelView(APIView):
+    """
+    API view to return the minimum and maximum glucose levels of several users at once.
+    """
+    permission_classes = (permissions.IsAuthenticated,)
+
+    def post(self, request, *args, **kwargs):
+        query = LevelMinMaxBatchQuerySerializer(data=request.data)
+        if not query.is_valid():
+            return Response(query.errors, status=status.HTTP_400_BAD_REQUEST)
+
+        user_ids = list(dict.fromkeys(query.validated_data['user_ids']))
+        with read_from_replica(user_ids):
+            results = LevelRollup.objects.get_min_max_many(
+                user_ids, start=query.validated_data['start'], stop=query.validated_data['stop']
+            )
+        # Users without readings in the range are reported with a zero count
+        aggregation_results = [
+            results.get(user_id, {
+                'user_id': user_id, 'glucose_level_min': None, 'glucose_level_max': None, 'glucose_level_count': 0,
+            })
+            for user_id in user_ids
+        ]
+        serializer = LevelMinMaxCountSerializer(aggregation_results, many=True)
+        return Response({"results": serializer.data}, status=status.HTTP_200_OK)
+
+
+class StatsLevelView(ReplicaReadMixin, APIView):
+    """
+    API view to return the glycemic statistics of a user: time in ranges, GMI, coefficient of
+    variation and ambulatory glucose profile.
+    """
+    permission_classes = (permissions.IsAuthenticated,)
+
+    def get(self, request, *args, **kwargs):
+        filterset = LevelFilter(request.query_params, queryset=Level.objects.all())
         if not filterset.is_valid():
             return Response(filterset.errors, status=status.HTTP_400_BAD_REQUEST)
 
-        aggregation_result = Level.objects.get_min_max_aggregation(filterset.qs)
+        return conditional_response(
+            'level-stats', request, filterset.qs, lambda: self.get_stats(filterset), cached=True
+        )
 
-        if not aggregation_result.exists():
+    def get_stats(self, filterset):
+        stats = get_glycemic_stats(
+            filterset.form.cleaned_data['user_id'],
+            start=filterset.form.cleaned_data['start'],
+            stop=filterset.form.cleaned_data['stop'],
+        )
+        if stats is None:
             return Response({"detail": "No data found for this user"}, status=status.HTTP_404_NOT_FOUND)
+        return Response(stats, status=status.HTTP_200_OK)
 
-        serializer = LevelMinMaxSerializer(aggregation_result[0])
-        return Response(serializer.data, status=status.HTTP_200_OK)
+
+class LevelSeriesView(ReplicaReadMixin, APIView):
+    """
+    API view to return the glucose levels of a user downsampled for charts, as compact columns.
+    """
+    permission_classes = (permissions.IsAuthenticated,)
+
+    def get(self, request, *args, **kwargs):
+        filterset = LevelFilter(request.query_params, queryset=Level.objects.all())
+        if not filterset.is_valid():
+            return Response(filterset.errors, status=status.HTTP_400_BAD_REQUEST)
+        query = LevelSeriesQuerySerializer(data=request.query_params)
+        if not query.is_valid():
+            return Response(query.errors, status=status.HTTP_400_BAD_REQUEST)
+
+        return conditional_response(
+            'level-series', request, filterset.qs, lambda: self.get_series(filterset, query), cached=True
+        )
+
+    def get_series(self, filterset, query):
+        try:
+            series = get_series(
+                filterset.form.cleaned_data['user_id'],
+                start=filterset.form.cleaned_data['start'],
+                stop=filterset.form.cleaned_data['stop'],
+                **query.validated_data,
+            )
+        except ValueError as e:
+            return Response({"detail": str(e)}, status=status.HTTP_400_BAD_REQUEST)
+        return Response(series, status=status.HTTP_200_OK)
+
+
+class DeviceListView(ReplicaReadMixin, generics.ListAPIView):
+    """
+    API view to list the devices of a user with the timestamps of their first and last readings,
+    read from the Device table without scanning the readings.
+    """
+    permission_classes = (permissions.IsAuthenticated,)
+    queryset = Device.objects.order_by('first_device_timestamp', 'id')
+    serializer_class = DeviceSerializer
+    filter_backends = (DjangoFilterBackend,)
+    filterset_class = DeviceFilter
+    # A user has a handful of devices
+    pagination_class = None
+
+
+class CacheStatsView(APIView):
+    """
+    API view to report the hit and miss counters of the response cache of this process.
+    """
+    permission_classes = (permissions.IsAdminUser,)
+
+    def get(self, request, *args, **kwargs):
+        return Response(get_cache_stats(), status=status.HTTP_200_OK)
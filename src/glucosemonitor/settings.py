@@ -45,6 +45,7 @@ INSTALLED_APPS = [
 
 MIDDLEWARE = [
     'django.middleware.security.SecurityMiddleware',
+    'glucosemonitor.levels.middleware.CompressionMiddleware',
     'django.contrib.sessions.middleware.SessionMiddleware',
     'django.middleware.common.CommonMiddleware',
     'django.middleware.csrf.CsrfViewMiddleware',
@@ -85,9 +86,36 @@ DATABASES = {
         "NAME": config('DB_NAME'),
         "USER": config('DB_USER'),
         "PASSWORD": config('DB_PASSWORD'),
+        # Seconds a connection is kept open to serve the next requests of its thread. Under ASGI
+        # every request has a thread of its own, so connections must be closed after each request.
+        "CONN_MAX_AGE": config('DB_CONN_MAX_AGE', default=0, cast=int),
+        "CONN_HEALTH_CHECKS": True,
     }
 }
 
+# Optional read replica of the default database, serving the level list, exports, detail and
+# aggregates, see ReplicaRouter. Its connection settings default to the ones of the primary. The
+# tests read the replica through the connection of the primary, as a mirror.
+if config('DB_REPLICA_HOST', default=''):
+    DATABASES['replica'] = {
+        **DATABASES['default'],
+        "PORT": config('DB_REPLICA_PORT', default=DATABASES['default']['PORT'], cast=int),
+        "HOST": config('DB_REPLICA_HOST'),
+        "NAME": config('DB_REPLICA_NAME', default=DATABASES['default']['NAME']),
+        "USER": config('DB_REPLICA_USER', default=DATABASES['default']['USER']),
+        "PASSWORD": config('DB_REPLICA_PASSWORD', default=DATABASES['default']['PASSWORD']),
+        "TEST": {"MIRROR": "default"},
+    }
+
+DATABASE_ROUTERS = ['glucosemonitor.levels.routers.ReplicaRouter']
+
+# Alias of the database the read endpoints are served from, None to serve them from the primary
+LEVELS_REPLICA_DATABASE = 'replica' if 'replica' in DATABASES else None
+
+# Seconds the reads of a user stay on the primary after their readings were written, so that
+# they see their own writes despite the replication lag
+LEVELS_REPLICA_PIN_SECONDS = config('LEVELS_REPLICA_PIN_SECONDS', default=10, cast=int)
+
 # Password validation
 # https://docs.djangoproject.com/en/4.2/ref/settings/#auth-password-validators
 
@@ -137,4 +165,47 @@ REST_FRAMEWORK = {
     'PAGE_SIZE': 20
 }
 
+# How the pages of the level list count the matching readings by default: 'exact', 'estimate'
+# (the estimate of the query planner, counted exactly below LEVELS_COUNT_ESTIMATE_THRESHOLD
+# rows) or 'none', see CountedLimitOffsetPagination
+LEVELS_PAGINATION_COUNT = config('LEVELS_PAGINATION_COUNT', default='exact')
+LEVELS_COUNT_ESTIMATE_THRESHOLD = config('LEVELS_COUNT_ESTIMATE_THRESHOLD', default=10000, cast=int)
+
+# Whether the level list, detail and minmax endpoints are served by the natively asynchronous
+# views of levels.async_views, for ASGI servers
+LEVELS_ASYNC_VIEWS = config('LEVELS_ASYNC_VIEWS', default=False, cast=bool)
+
+# Responses smaller than this number of bytes are sent uncompressed, streamed responses are
+# always compressed when the client accepts it, see CompressionMiddleware
+RESPONSE_COMPRESSION_MIN_SIZE = config('RESPONSE_COMPRESSION_MIN_SIZE', default=1024, cast=int)
+
 MEDIA_ROOT = os.path.join(os.path.dirname(BASE_DIR), 'uploads')
+
+# How queued CSV imports are run: 'thread' (background thread of the web process),
+# 'inline' (within the upload request) or 'command' (the process_import_jobs command)
+LEVELS_IMPORT_WORKER = config('LEVELS_IMPORT_WORKER', default='thread')
+
+# Seconds after which a running import job that reported no progress is considered abandoned by
+# its worker, and failed, see jobs.reclaim_stale_jobs. Workers report progress after every chunk.
+LEVELS_IMPORT_JOB_TIMEOUT = config('LEVELS_IMPORT_JOB_TIMEOUT', default=600, cast=int)
+
+# Number of devices whose IDs are kept in memory by every process for the imports, see DeviceCache
+LEVELS_DEVICE_CACHE_SIZE = config('LEVELS_DEVICE_CACHE_SIZE', default=10000, cast=int)
+
+# Maximum size in bytes of an uploaded CSV file, enforced while the upload is streamed
+LEVELS_UPLOAD_MAX_SIZE = config('LEVELS_UPLOAD_MAX_SIZE', default=200 * 1024 * 1024, cast=int)
+
+# Cache of the level list pages and aggregates. Entries are keyed by the latest reading and the
+# data version of the user, so they never need to be invalidated: they expire after
+# LEVELS_CACHE_TIMEOUT seconds, and the least recently used ones are evicted past
+# LEVELS_CACHE_MAX_ENTRIES. The local memory cache is not shared between processes, see levels.checks.
+CACHES = {
+    'default': {
+        'BACKEND': config('CACHE_BACKEND', default='django.core.cache.backends.locmem.LocMemCache'),
+        'LOCATION': config('CACHE_LOCATION', default='glucosemonitor'),
+        'TIMEOUT': config('LEVELS_CACHE_TIMEOUT', default=300, cast=int),
+        'OPTIONS': {
+            'MAX_ENTRIES': config('LEVELS_CACHE_MAX_ENTRIES', default=10000, cast=int),
+        },
+    }
+}
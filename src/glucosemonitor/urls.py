@@ -14,15 +14,30 @@ Including another URLconf
     1. Import the include() function: from django.urls import include, path
     2. Add a URL to urlpatterns:  path('blog/', include('blog.urls'))
 """
+from django.conf import settings
 from django.contrib import admin
 from django.urls import path
 
-from glucosemonitor.levels.views import LevelListView, LevelDetailView, LevelUploadView, MinMaxLevelView
+from glucosemonitor.levels.async_views import AsyncLevelDetailView, AsyncLevelListView, AsyncMinMaxLevelView
+from glucosemonitor.levels.views import (
+    LevelListView, LevelDetailView, LevelUploadView, MinMaxLevelView, ImportJobDetailView, CacheStatsView,
+    LevelSeriesView, StatsLevelView, MinMaxBatchLevelView, DeviceListView,
+)
+
+# The natively asynchronous read views are meant for ASGI servers
+if settings.LEVELS_ASYNC_VIEWS:
+    LevelListView, LevelDetailView, MinMaxLevelView = AsyncLevelListView, AsyncLevelDetailView, AsyncMinMaxLevelView
 
 urlpatterns = [
     path('admin/', admin.site.urls),
     path('api/v1/levels/', LevelListView.as_view(), name='level-list'),
     path('api/v1/levels/aggregates/minmax/', MinMaxLevelView.as_view(), name='level-maximum'),
+    path('api/v1/levels/aggregates/minmax/batch/', MinMaxBatchLevelView.as_view(), name='level-maximum-batch'),
+    path('api/v1/levels/aggregates/stats/', StatsLevelView.as_view(), name='level-stats'),
+    path('api/v1/levels/series/', LevelSeriesView.as_view(), name='level-series'),
+    path('api/v1/levels/devices/', DeviceListView.as_view(), name='level-devices'),
+    path('api/v1/levels/cache/stats/', CacheStatsView.as_view(), name='level-cache-stats'),
     path('api/v1/levels/<int:pk>/', LevelDetailView.as_view(), name='level-detail'),
-    path('api/v1/levels/upload/', LevelUploadView.as_view(), name='level-upload')
+    path('api/v1/levels/upload/', LevelUploadView.as_view(), name='level-upload'),
+    path('api/v1/levels/upload/<uuid:job_id>/', ImportJobDetailView.as_view(), name='level-upload-job'),
 ]
@@ -14,3 +14,8 @@ from django.core.wsgi import get_wsgi_application
 os.environ.setdefault('DJANGO_SETTINGS_MODULE', 'glucosemonitor.settings')
 
 application = get_wsgi_application()
+
+from glucosemonitor.levels.jobs import start_import_worker  # noqa: E402
+
+# Runs the import jobs left over by the previous process
+start_import_worker()
@@ -2,6 +2,8 @@ import pytest
 from rest_framework.test import APIClient
 from faker import Faker
 
+from glucosemonitor.levels.device_cache import device_cache
+
 
 @pytest.fixture
 def api_client():
@@ -19,3 +21,16 @@ def authorized_client(django_user_model):
     user = django_user_model.objects.create_user(username='testuser', password='testpass')
     client.login(username='testuser', password='testpass')
     return client, user
+
+
+@pytest.fixture(autouse=True)
+def clear_device_cache():
+    # The devices cached by a test are gone once its transaction is rolled back
+    yield
+    device_cache.clear()
+
+
+@pytest.fixture(autouse=True)
+def read_from_primary(settings):
+    # Tests reading from the replica declare it and enable it, see test_routers
+    settings.LEVELS_REPLICA_DATABASE = None
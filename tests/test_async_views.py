@@ -0,0 +1,135 @@
+import importlib
+from datetime import datetime, timedelta, timezone
+
+import pytest
+from django.urls import clear_url_caches, reverse
+from rest_framework import status
+
+import glucosemonitor.urls
+from glucosemonitor.levels.models import Level
+
+
+# The test client reads asynchronous streams whole, like WSGI servers do
+pytestmark = pytest.mark.filterwarnings('ignore:StreamingHttpResponse must consume asynchronous iterators')
+
+
+def get_content(response) -> bytes:
+    return b''.join(response) if response.streaming else response.content
+
+
+@pytest.fixture
+def use_async_views(settings):
+    """
+    Returns a function routing the read endpoints to the asynchronous views or back to the synchronous ones.
+    """
+    def use(async_views: bool):
+        settings.LEVELS_ASYNC_VIEWS = async_views
+        importlib.reload(glucosemonitor.urls)
+        clear_url_caches()
+
+    yield use
+    use(False)
+
+
+@pytest.fixture
+def levels(faker):
+    user_id = faker.uuid4()
+    start = datetime(2024, 1, 1, tzinfo=timezone.utc)
+    return user_id, [
+        Level.objects.create(
+            user_id=user_id,
+            device_name='FreeStyle LibreLink',
+            device_serial_number=faker.uuid4(),
+            device_timestamp=start + timedelta(minutes=15 * i),
+            recording_type=Level.RecordingType.HISTORY,
+            glucose_history_mg_dl=None if i % 4 == 0 else 70 + i,
+        )
+        for i in range(9)
+    ]
+
+
+@pytest.mark.django_db
+@pytest.mark.parametrize('url_name, params', [
+    ('level-list', {}),
+    ('level-list', {'limit': 4, 'offset': 2, 'ordering': '-device_timestamp'}),
+    ('level-list', {'limit': 4, 'offset': 20}),
+    ('level-list', {'limit': 4, 'count': 'estimate'}),
+    ('level-list', {'limit': 4, 'offset': 6, 'count': 'none'}),
+    ('level-list', {'pagination': 'cursor', 'page_size': 4}),
+    ('level-list', {'format': 'columnar'}),
+    ('level-list', {'export': 'csv'}),
+    ('level-list', {'export': 'json'}),
+    ('level-list', {'export': 'ndjson', 'format': 'columnar'}),
+    ('level-list', {'export': 'xlsx'}),
+    ('level-list', {'start': 'garbage'}),
+    ('level-maximum', {}),
+    ('level-maximum', {'stop': '2024-01-01T01:00:00Z'}),
+])
+def test_async_views_match_sync_views(authorized_client, levels, use_async_views, url_name, params):
+    client, user = authorized_client
+    user_id, created = levels
+    url = reverse(url_name)
+    params = {'user_id': user_id, **params}
+
+    expected = client.get(url, params)
+    use_async_views(True)
+    response = client.get(url, params)
+
+    assert response.status_code == expected.status_code
+    assert get_content(response) == get_content(expected)
+    assert response.get('ETag') == expected.get('ETag')
+    assert response.get('Content-Type') == expected.get('Content-Type')
+    if expected.status_code == status.HTTP_200_OK:
+        assert response.streaming == ('export' in params)
+        assert not response.streaming or response.is_async
+        response = client.get(url, params, HTTP_IF_NONE_MATCH=expected['ETag'])
+        assert response.status_code == status.HTTP_304_NOT_MODIFIED
+
+
+@pytest.mark.django_db
+def test_async_detail_view(api_client, levels, use_async_views):
+    user_id, created = levels
+    urls = [reverse('level-detail', args=[created[1].pk]), reverse('level-detail', args=[created[-1].pk + 1])]
+    expected = [api_client.get(url) for url in urls]
+    use_async_views(True)
+    responses = [api_client.get(url) for url in urls]
+
+    assert [response.status_code for response in responses] == [status.HTTP_200_OK, status.HTTP_404_NOT_FOUND]
+    assert [response.content for response in responses] == [response.content for response in expected]
+    assert responses[0]['ETag'] == expected[0]['ETag']
+
+
+@pytest.mark.django_db
+def test_async_views_check_permissions(api_client, levels, use_async_views):
+    user_id, created = levels
+    use_async_views(True)
+
+    response = api_client.get(reverse('level-list'), {'user_id': user_id})
+    assert response.status_code == status.HTTP_403_FORBIDDEN
+    response = api_client.get(reverse('level-maximum'), {'user_id': user_id})
+    assert response.status_code == status.HTTP_403_FORBIDDEN
+    response = api_client.post(reverse('level-list'), {'user_id': user_id})
+    assert response.status_code == status.HTTP_403_FORBIDDEN
+
+
+@pytest.mark.django_db
+def test_async_cursor_pages_match_sync_pages(authorized_client, levels, use_async_views):
+    client, user = authorized_client
+    user_id, created = levels
+
+    def walk():
+        url, pages = f"{reverse('level-list')}?user_id={user_id}&pagination=cursor&page_size=4", []
+        while url:
+            pages.append(client.get(url).json())
+            url = pages[-1]['next']
+        # Back from the last page
+        url = pages[-1]['previous']
+        while url:
+            pages.append(client.get(url).json())
+            url = pages[-1]['previous']
+        return pages
+
+    expected = walk()
+    use_async_views(True)
+    assert walk() == expected
+    assert len(expected) == 5
@@ -0,0 +1,128 @@
+from datetime import datetime, timedelta, timezone
+
+import pytest
+from django.core.cache import cache
+from django.urls import reverse
+from rest_framework import status
+
+from glucosemonitor.levels.cache import _version_key, get_cache_stats, get_data_version
+from glucosemonitor.levels.models import Level
+from glucosemonitor.levels.utils.csv_processing import COLUMNS, TIMESTAMP_FORMAT
+
+
+def create_level(user_id, faker, glucose):
+    return Level.objects.create(
+        user_id=user_id,
+        device_name='FreeStyle LibreLink',
+        device_serial_number=faker.uuid4(),
+        device_timestamp=faker.date_time_this_year(tzinfo=timezone.utc),
+        recording_type=Level.RecordingType.HISTORY,
+        glucose_history_mg_dl=glucose,
+    )
+
+
+def get_counted(client, url, params):
+    """
+    Returns the response and whether it was served from the cache.
+    """
+    hits = get_cache_stats()['hits']
+    response = client.get(url, params)
+    assert response.status_code == status.HTTP_200_OK
+    return response, get_cache_stats()['hits'] > hits
+
+
+@pytest.mark.django_db
+def test_responses_are_cached(authorized_client, faker):
+    client, user = authorized_client
+    user_id = faker.uuid4()
+    create_level(user_id, faker, 100)
+
+    url = reverse('level-list')
+    first, cached = get_counted(client, url, {'user_id': user_id, 'ordering': 'glucose_mg_dl'})
+    assert not cached
+    # The order of the query parameters does not matter
+    second, cached = get_counted(client, url, {'ordering': 'glucose_mg_dl', 'user_id': user_id})
+    assert cached
+    assert second.json() == first.json()
+
+    response, cached = get_counted(client, url, {'user_id': user_id, 'ordering': '-glucose_mg_dl'})
+    assert not cached
+
+    # A saved reading moves the data version forward
+    create_level(user_id, faker, 150)
+    response, cached = get_counted(client, url, {'user_id': user_id, 'ordering': 'glucose_mg_dl'})
+    assert not cached
+    assert response.data['count'] == 2
+
+    url = reverse('level-maximum')
+    get_counted(client, url, {'user_id': user_id})
+    response, cached = get_counted(client, url, {'user_id': user_id})
+    assert cached
+    assert response.data['glucose_level_max'] == 150
+
+
+@pytest.mark.django_db
+def test_upload_invalidates_cache(authorized_client, faker, tmpdir, settings):
+    settings.LEVELS_IMPORT_WORKER = 'inline'
+    client, user = authorized_client
+    user_id = faker.uuid4()
+    create_level(user_id, faker, 100)
+
+    url = reverse('level-maximum')
+    get_counted(client, url, {'user_id': user_id})
+    version = get_data_version(user_id)
+
+    csv_file = tmpdir.join(f"{user_id}.csv")
+    csv_file.write('\n'.join([
+        ','.join(COLUMNS.values()),
+        ','.join(['FreeStyle LibreLink', faker.uuid4(), datetime(2024, 1, 1).strftime(TIMESTAMP_FORMAT), '0', '300']
+                 + [''] * (len(COLUMNS) - 5)),
+    ]))
+    with open(csv_file, 'rb') as f:
+        client.post(reverse('level-upload'), {'file': f})
+
+    assert get_data_version(user_id) != version
+    response, cached = get_counted(client, url, {'user_id': user_id})
+    assert not cached
+    assert response.data['glucose_level_max'] == 300
+
+
+@pytest.mark.django_db
+def test_cache_follows_readings_of_other_processes(authorized_client, faker):
+    client, user = authorized_client
+    user_id = faker.uuid4()
+    create_level(user_id, faker, 100)
+
+    list_url, minmax_url = reverse('level-list'), reverse('level-maximum')
+    get_counted(client, list_url, {'user_id': user_id})
+    get_counted(client, minmax_url, {'user_id': user_id})
+    etag = client.get(minmax_url, {'user_id': user_id})['ETag']
+
+    # Another process imports a later reading: the data version of this process does not move
+    version_key = _version_key(user_id)
+    version = cache.get(version_key)
+    level = create_level(user_id, faker, 300)
+    Level.objects.filter(pk=level.pk).update(device_timestamp=datetime.now(timezone.utc) + timedelta(days=1))
+    cache.set(version_key, version, timeout=None)
+
+    response, cached = get_counted(client, list_url, {'user_id': user_id})
+    assert not cached
+    assert response.data['count'] == 2
+    response, cached = get_counted(client, minmax_url, {'user_id': user_id})
+    assert not cached
+    assert response.data['glucose_level_max'] == 300
+    # The new body is sent under a new ETag, and the old one no longer matches
+    assert response['ETag'] != etag
+    response = client.get(minmax_url, {'user_id': user_id}, HTTP_IF_NONE_MATCH=etag)
+    assert response.status_code == status.HTTP_200_OK
+    assert response.data['glucose_level_max'] == 300
+
+
+@pytest.mark.django_db
+def test_cache_stats(authorized_client, admin_client):
+    client, user = authorized_client
+    assert client.get(reverse('level-cache-stats')).status_code == status.HTTP_403_FORBIDDEN
+
+    response = admin_client.get(reverse('level-cache-stats'))
+    assert response.status_code == status.HTTP_200_OK
+    assert set(response.json()) == {'hits', 'misses', 'hit_ratio'}
@@ -0,0 +1,126 @@
+import json
+from datetime import datetime, timedelta, timezone
+
+import pytest
+from django.urls import reverse
+from django.utils.dateparse import parse_datetime
+from rest_framework import status
+
+from glucosemonitor.levels.models import Level
+
+
+def decode(block):
+    """
+    Returns the rows of a columnar block as the objects of the default format.
+    """
+    rows = []
+    for i in range(block['length']):
+        row = {}
+        for field in block['fields']:
+            if field in block['constants']:
+                row[field] = block['constants'][field]
+                continue
+            value = block['columns'][field][i]
+            if value is not None and field in block['dictionaries']:
+                value = block['dictionaries'][field][value]
+            elif value is not None and field in block['timestamps']:
+                timestamp = block['timestamps'][field]
+                unit = timedelta(seconds=1) if timestamp['unit'] == 's' else timedelta(microseconds=1)
+                value = (parse_datetime(timestamp['origin']) + value * unit).isoformat().replace('+00:00', 'Z')
+            row[field] = value
+        rows.append(row)
+    return rows
+
+
+@pytest.fixture
+def levels(faker):
+    user_id = faker.uuid4()
+    serial_numbers = [faker.uuid4(), faker.uuid4()]
+    start = datetime(2024, 1, 1, tzinfo=timezone.utc)
+    for i in range(7):
+        Level.objects.create(
+            user_id=user_id,
+            device_name='FreeStyle LibreLink',
+            device_serial_number=serial_numbers[i // 5],
+            device_timestamp=start + timedelta(minutes=15 * i),
+            recording_type=Level.RecordingType.HISTORY,
+            glucose_history_mg_dl=None if i == 3 else 100 + i,
+        )
+    return user_id, serial_numbers
+
+
+@pytest.mark.django_db
+@pytest.mark.parametrize('params', [{}, {'pagination': 'cursor', 'page_size': 3}, {'ordering': '-device_timestamp'}])
+def test_columnar_page_matches_default_format(authorized_client, levels, params):
+    client, user = authorized_client
+    user_id, serial_numbers = levels
+    params = {'user_id': user_id, **params}
+
+    expected = client.get(reverse('level-list'), params).json()
+    response = client.get(reverse('level-list'), {**params, 'format': 'columnar'})
+    assert response.status_code == status.HTTP_200_OK
+    page = response.json()
+    block = page.pop('results')
+
+    assert decode(block) == expected.pop('results')
+    assert {key: value for key, value in page.items() if key not in ('next', 'previous')} == \
+        {key: value for key, value in expected.items() if key not in ('next', 'previous')}
+    assert block['constants']['user_id'] == user_id
+    assert block['constants']['device_name'] == 'FreeStyle LibreLink'
+    assert block['timestamps']['device_timestamp']['unit'] == 's'
+    if 'page_size' in params:
+        assert 'format=columnar' in page['next']
+    else:
+        assert set(block['dictionaries']['device_serial_number']) == set(serial_numbers)
+
+
+@pytest.mark.django_db
+def test_columnar_timestamps_keep_microseconds(authorized_client, levels):
+    client, user = authorized_client
+    user_id, serial_numbers = levels
+    Level.objects.filter(user_id=user_id, glucose_history_mg_dl=101).update(
+        device_timestamp=datetime(2024, 1, 1, 0, 15, 0, 250, tzinfo=timezone.utc)
+    )
+
+    expected = client.get(reverse('level-list'), {'user_id': user_id}).json()['results']
+    block = client.get(reverse('level-list'), {'user_id': user_id, 'format': 'columnar'}).json()['results']
+
+    assert block['timestamps']['device_timestamp']['unit'] == 'us'
+    assert decode(block) == expected
+
+
+@pytest.mark.django_db
+def test_columnar_empty_page(authorized_client, faker):
+    client, user = authorized_client
+
+    response = client.get(reverse('level-list'), {'user_id': faker.uuid4(), 'format': 'columnar'})
+
+    assert response.status_code == status.HTTP_200_OK
+    block = response.json()['results']
+    assert block['length'] == 0
+    assert block['constants'] == {}
+    assert block['timestamps']['device_timestamp'] == {'origin': None, 'unit': 's'}
+    assert block['columns']['device_timestamp'] == []
+    assert decode(block) == []
+
+
+@pytest.mark.django_db
+@pytest.mark.parametrize('export', ['json', 'ndjson'])
+def test_columnar_export(authorized_client, levels, monkeypatch, export):
+    client, user = authorized_client
+    user_id, serial_numbers = levels
+    monkeypatch.setattr('glucosemonitor.levels.views.EXPORT_CHUNK_SIZE', 3)
+
+    response = client.get(reverse('level-list'), {'user_id': user_id, 'export': export, 'format': 'columnar'})
+    content = b''.join(response.streaming_content).decode()
+    if export == 'json':
+        blocks = json.loads(content)
+    else:
+        blocks = [json.loads(line) for line in content.splitlines()]
+
+    expected = client.get(reverse('level-list'), {'user_id': user_id, 'export': 'json'})
+    assert [block['length'] for block in blocks] == [3, 3, 1]
+    assert [row for block in blocks for row in decode(block)] == json.loads(b''.join(expected.streaming_content))
+
+    response = client.get(reverse('level-list'), {'user_id': user_id, 'export': 'csv', 'format': 'columnar'})
+    assert response.status_code == status.HTTP_400_BAD_REQUEST
@@ -0,0 +1,148 @@
+from datetime import datetime, timedelta, timezone
+from io import StringIO
+
+import pytest
+from django.core.files.base import ContentFile
+from django.core.files.storage import default_storage
+from django.core.management import call_command
+from django.core.management.base import CommandError
+from django.db import connection
+from django.utils.timezone import now
+
+from glucosemonitor.levels.models import ImportJob, Level
+from glucosemonitor.levels.utils.partitioning import get_partitions, is_partitioned
+
+CSV_HEADER = "Gerät,Seriennummer,Gerätezeitstempel,Aufzeichnungstyp,Glukosewert-Verlauf mg/dL,Glukose-Scan mg/dL"
+CSV_DATA = "FreeStyle LibreLink,1D48A10E-DDFB-4888-8158-026F08814832,18-02-2021 11:57,0,75,"
+
+
+def write_csv_files(directory, user_ids):
+    for user_id in user_ids:
+        directory.join(f"{user_id}.csv").write(CSV_HEADER + "\n" + CSV_DATA + "\n")
+
+
+@pytest.mark.django_db
+def test_load_sample_data_directory(faker, tmpdir):
+    user_ids = [faker.uuid4() for _ in range(3)]
+    write_csv_files(tmpdir, user_ids)
+    tmpdir.join("broken.csv").write("no header here\n")
+
+    stdout = StringIO()
+    with pytest.raises(CommandError):
+        call_command('load_sample_data', str(tmpdir), stdout=stdout)
+
+    # The broken file does not abort the other imports
+    assert Level.objects.filter(user_id__in=user_ids).count() == 3
+    assert "FAILED" in stdout.getvalue()
+    assert "Imported 3 rows from 3/4 files" in stdout.getvalue()
+
+
+@pytest.mark.django_db
+def test_load_sample_data_from_file(faker, tmpdir):
+    user_ids = [faker.uuid4() for _ in range(2)]
+    write_csv_files(tmpdir, user_ids)
+    paths = tmpdir.join("paths.txt")
+    paths.write("\n".join(str(tmpdir.join(f"{user_id}.csv")) for user_id in user_ids) + "\n")
+
+    stdout = StringIO()
+    call_command('load_sample_data', f'--from_file={paths}', stdout=stdout)
+
+    assert Level.objects.filter(user_id__in=user_ids).count() == 2
+    assert "Imported 2 rows from 2/2 files" in stdout.getvalue()
+
+
+@pytest.mark.django_db(transaction=True)
+def test_load_sample_data_workers(faker, tmpdir):
+    user_ids = [faker.uuid4() for _ in range(4)]
+    write_csv_files(tmpdir, user_ids)
+
+    stdout = StringIO()
+    call_command('load_sample_data', str(tmpdir.join("*.csv")), workers=2, stdout=stdout)
+
+    assert Level.objects.filter(user_id__in=user_ids).count() == 4
+    assert "Imported 4 rows from 4/4 files" in stdout.getvalue()
+
+
+@pytest.mark.django_db
+def test_process_import_jobs(faker):
+    def create_job(state, heartbeat_at=None):
+        user_id = faker.uuid4()
+        file_name = default_storage.save(f"tmp/{user_id}.csv", ContentFile(CSV_HEADER + "\n" + CSV_DATA + "\n"))
+        return ImportJob.objects.create(user_id=user_id, file_name=file_name, state=state, heartbeat_at=heartbeat_at)
+
+    pending = create_job(ImportJob.State.PENDING)
+    # Abandoned by a worker that stopped an hour ago
+    stale = create_job(ImportJob.State.RUNNING, heartbeat_at=now() - timedelta(hours=1))
+    running = create_job(ImportJob.State.RUNNING, heartbeat_at=now())
+
+    stdout = StringIO()
+    call_command('process_import_jobs', once=True, stdout=stdout)
+
+    pending.refresh_from_db()
+    assert pending.state == ImportJob.State.SUCCEEDED
+    assert Level.objects.filter(user_id=pending.user_id).count() == 1
+    assert "Processed 1 import jobs" in stdout.getvalue()
+
+    stale.refresh_from_db()
+    assert stale.state == ImportJob.State.FAILED
+    assert stale.error and stale.finished_at
+    assert not default_storage.exists(stale.file_name)
+
+    running.refresh_from_db()
+    assert running.state == ImportJob.State.RUNNING
+    assert default_storage.exists(running.file_name)
+    default_storage.delete(running.file_name)
+
+
+@pytest.mark.django_db
+def test_partition_levels(faker, tmpdir):
+    user_id = faker.uuid4()
+    write_csv_files(tmpdir, [user_id])
+    call_command('load_sample_data', str(tmpdir), stdout=StringIO())
+    level = Level.objects.create(
+        user_id=user_id,
+        device_name='FreeStyle LibreLink',
+        device_serial_number=faker.uuid4(),
+        device_timestamp=datetime(2021, 4, 1, tzinfo=timezone.utc),
+        recording_type=Level.RecordingType.HISTORY,
+        glucose_history_mg_dl=100,
+    )
+
+    call_command('partition_levels', months_ahead=1, stdout=StringIO())
+
+    assert is_partitioned()
+    partitions = get_partitions()
+    assert {'levels_level_y2021m02', 'levels_level_y2021m03', 'levels_level_y2021m04'} <= set(partitions)
+    assert Level.objects.get(pk=level.pk).glucose_history_mg_dl == 100
+    assert Level.objects.filter(user_id=user_id).count() == 2
+    # The readings still reference their device
+    with connection.cursor() as cursor:
+        cursor.execute("SELECT confrelid::regclass::text FROM pg_constraint WHERE conrelid = %s::regclass "
+                       "AND contype = 'f'", [Level._meta.db_table])
+        assert cursor.fetchall() == [('levels_device',)]
+
+    # Bounded queries only scan the partitions of their range
+    plan = Level.objects.filter(
+        user_id=user_id, device_timestamp__gte=datetime(2021, 2, 1, tzinfo=timezone.utc),
+        device_timestamp__lte=datetime(2021, 2, 28, tzinfo=timezone.utc),
+    ).explain()
+    assert 'levels_level_y2021m02' in plan
+    assert 'levels_level_y2021m04' not in plan
+
+    # Re-importing the same file still finds the stored readings
+    call_command('load_sample_data', str(tmpdir), stdout=StringIO())
+    assert Level.objects.filter(user_id=user_id).count() == 2
+
+    # Readings beyond the last partition go to the default one until their partition is created
+    later = now() + timedelta(days=120)
+    new_level = Level.objects.create(
+        user_id=user_id,
+        device_name='FreeStyle LibreLink',
+        device_serial_number=faker.uuid4(),
+        device_timestamp=later,
+        recording_type=Level.RecordingType.HISTORY,
+    )
+    assert new_level.pk > level.pk
+    call_command('partition_levels', months_ahead=5, stdout=StringIO())
+    assert len(get_partitions()) > len(partitions)
+    assert f'levels_level_y{later.year}m{later.month:02d}' in Level.objects.filter(device_timestamp=later).explain()
@@ -0,0 +1,79 @@
+import gzip
+from datetime import datetime, timedelta, timezone
+
+import pytest
+from django.urls import reverse
+
+from glucosemonitor.levels.middleware import get_accepted_encodings
+from glucosemonitor.levels.models import Level
+
+
+@pytest.fixture
+def user_id(faker):
+    user_id = faker.uuid4()
+    start = datetime(2024, 1, 1, tzinfo=timezone.utc)
+    Level.objects.bulk_create(
+        Level(
+            user_id=user_id,
+            device_name='FreeStyle LibreLink',
+            device_serial_number='1d5ae4f6-1c6b-4b83-9e0e-6c7f4a3b2a10',
+            device_timestamp=start + timedelta(minutes=15 * i),
+            recording_type=Level.RecordingType.HISTORY,
+            glucose_history_mg_dl=100 + i % 50,
+        )
+        for i in range(50)
+    )
+    return user_id
+
+
+def test_get_accepted_encodings():
+    assert get_accepted_encodings('gzip, deflate, br;q=0.9, *;q=0') == {'gzip': 1.0, 'deflate': 1.0, 'br': 0.9, '*': 0.0}
+    assert get_accepted_encodings('') == {}
+    assert get_accepted_encodings('gzip;q=high, br') == {'br': 1.0}
+
+
+@pytest.mark.django_db
+def test_large_responses_are_gzipped(authorized_client, user_id, settings):
+    client, user = authorized_client
+    settings.RESPONSE_COMPRESSION_MIN_SIZE = 1024
+    url = reverse('level-list')
+
+    plain = client.get(url, {'user_id': user_id, 'limit': 50})
+    response = client.get(url, {'user_id': user_id, 'limit': 50}, HTTP_ACCEPT_ENCODING='gzip')
+    assert response['Content-Encoding'] == 'gzip'
+    assert 'Accept-Encoding' in response['Vary']
+    assert gzip.decompress(response.content) == plain.content
+    assert response['ETag'] == 'W/' + plain['ETag']
+
+    # The weakened ETag still matches
+    response = client.get(url, {'user_id': user_id, 'limit': 50}, HTTP_ACCEPT_ENCODING='gzip',
+                          HTTP_IF_NONE_MATCH=response['ETag'])
+    assert response.status_code == 304
+
+    small = client.get(url, {'user_id': user_id, 'limit': 1}, HTTP_ACCEPT_ENCODING='gzip')
+    assert not small.has_header('Content-Encoding')
+
+    export = client.get(url, {'user_id': user_id, 'export': 'csv'}, HTTP_ACCEPT_ENCODING='gzip')
+    plain_export = client.get(url, {'user_id': user_id, 'export': 'csv'})
+    assert export['Content-Encoding'] == 'gzip'
+    assert gzip.decompress(b''.join(export.streaming_content)) == b''.join(plain_export.streaming_content)
+
+
+@pytest.mark.django_db
+def test_large_responses_are_brotli_compressed(authorized_client, user_id):
+    brotli = pytest.importorskip('brotli')
+    client, user = authorized_client
+    url = reverse('level-list')
+
+    plain = client.get(url, {'user_id': user_id, 'limit': 50})
+    response = client.get(url, {'user_id': user_id, 'limit': 50}, HTTP_ACCEPT_ENCODING='gzip, br')
+    assert response['Content-Encoding'] == 'br'
+    assert brotli.decompress(response.content) == plain.content
+
+    response = client.get(url, {'user_id': user_id, 'limit': 50}, HTTP_ACCEPT_ENCODING='gzip, br;q=0.5')
+    assert response['Content-Encoding'] == 'gzip'
+
+    export = client.get(url, {'user_id': user_id, 'export': 'ndjson'}, HTTP_ACCEPT_ENCODING='br')
+    plain_export = client.get(url, {'user_id': user_id, 'export': 'ndjson'})
+    assert export['Content-Encoding'] == 'br'
+    assert brotli.decompress(b''.join(export.streaming_content)) == b''.join(plain_export.streaming_content)
@@ -0,0 +1,77 @@
+from datetime import datetime, timedelta, timezone
+
+import pytest
+from django.urls import reverse
+from rest_framework import status
+
+from glucosemonitor.levels.models import Level
+
+START = datetime(2024, 1, 1, tzinfo=timezone.utc)
+
+
+def create_level(user_id, faker, minutes, glucose=100):
+    return Level.objects.create(
+        user_id=user_id,
+        device_name='FreeStyle LibreLink',
+        device_serial_number=faker.uuid4(),
+        device_timestamp=START + timedelta(minutes=minutes),
+        recording_type=Level.RecordingType.HISTORY,
+        glucose_history_mg_dl=glucose,
+    )
+
+
+@pytest.mark.django_db
+@pytest.mark.parametrize('url_name, params', [
+    ('level-list', {}),
+    ('level-list', {'export': 'csv'}),
+    ('level-maximum', {}),
+])
+def test_conditional_get(authorized_client, faker, url_name, params):
+    client, user = authorized_client
+    user_id = faker.uuid4()
+    for minutes in range(10):
+        create_level(user_id, faker, minutes * 15)
+
+    url = reverse(url_name)
+    params = {'user_id': user_id, **params}
+    response = client.get(url, params)
+    assert response.status_code == status.HTTP_200_OK
+    etag = response.headers['ETag']
+    # Reading timestamps are not write times, so they are no validators
+    assert 'Last-Modified' not in response.headers
+
+    response = client.get(url, params, HTTP_IF_NONE_MATCH=etag)
+    assert response.status_code == status.HTTP_304_NOT_MODIFIED
+    assert response.headers['ETag'] == etag
+    assert not response.content
+    response = client.get(url, params, HTTP_IF_MODIFIED_SINCE='Mon, 01 Jan 2024 02:15:00 GMT')
+    assert response.status_code == status.HTTP_200_OK
+
+    # Other parameters have their own validators
+    response = client.get(url, {**params, 'stop': '2024-01-01T01:00:00Z'}, HTTP_IF_NONE_MATCH=etag)
+    assert response.status_code == status.HTTP_200_OK
+
+    # So does a reading imported before the latest one
+    create_level(user_id, faker, 5, glucose=300)
+    response = client.get(url, params, HTTP_IF_NONE_MATCH=etag)
+    assert response.status_code == status.HTTP_200_OK
+    assert response.headers['ETag'] != etag
+
+
+@pytest.mark.django_db
+def test_conditional_get_detail(authorized_client, faker):
+    client, user = authorized_client
+    level = create_level(faker.uuid4(), faker, 0)
+    url = reverse('level-detail', args=[level.pk])
+
+    etag = client.get(url).headers['ETag']
+    assert client.get(url, HTTP_IF_NONE_MATCH=etag).status_code == status.HTTP_304_NOT_MODIFIED
+
+    level.glucose_history_mg_dl = 120
+    level.save()
+    response = client.get(url, HTTP_IF_NONE_MATCH=etag)
+    assert response.status_code == status.HTTP_200_OK
+    assert response.data['glucose_history_mg_dl'] == 120
+
+    other = reverse('level-detail', args=[level.pk + 1])
+    assert client.get(other, HTTP_IF_NONE_MATCH=etag).status_code == status.HTTP_404_NOT_FOUND
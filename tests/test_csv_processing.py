@@ -1,7 +1,11 @@
 import pytest
 from pathlib import Path
-from glucosemonitor.levels.utils.csv_processing import process_csv_file
-from glucosemonitor.levels.models import Level
+from glucosemonitor.levels.utils.csv_processing import process_csv_file, read_csv_content_and_find_header
+from glucosemonitor.levels.models import Device, Level, LevelEvent, LevelRollup, IngestMode
+from glucosemonitor.levels.utils.ingest_backends import INGEST_BACKENDS
+
+CSV_HEADER = "Gerät,Seriennummer,Gerätezeitstempel,Aufzeichnungstyp,Glukosewert-Verlauf mg/dL,Glukose-Scan mg/dL,Notizen"
+CSV_DATA = "FreeStyle LibreLink,1D48A10E-DDFB-4888-8158-026F08814832,18-02-2021 11:57,0,75,,Frühstück"
 
 
 @pytest.mark.django_db
@@ -13,4 +17,192 @@ def test_process_csv_file(faker, tmpdir):
 
     process_csv_file(Path(csv_file), faker.uuid4())
 
-    assert Level.objects.count() == 1
\ No newline at end of file
+    assert Level.objects.count() == 1
+
+
+@pytest.mark.django_db
+@pytest.mark.parametrize('encoding', ['utf-8', 'utf-8-sig', 'utf-16', 'cp1252'])
+def test_process_csv_file_encodings(faker, tmpdir, encoding):
+    csv_file = tmpdir.join("sample.csv")
+    csv_file.write_binary(
+        f"Glukose-Werte,Erstellt am,25-02-2021 17:28 UTC,Erstellt von,aaa\r\n{CSV_HEADER}\r\n{CSV_DATA}\r\n".encode(encoding)
+    )
+
+    process_csv_file(Path(csv_file), faker.uuid4())
+
+    level = Level.objects.get()
+    assert level.device_name == "FreeStyle LibreLink"
+    assert level.glucose_history_mg_dl == 75
+    assert level.notes == "Frühstück"
+
+
+def test_read_csv_content_and_find_header_stops_at_header(tmpdir):
+    csv_file = tmpdir.join("sample.csv")
+    csv_file.write("Glukose-Werte\n\n" + CSV_HEADER + "\n" + CSV_DATA + "\n")
+
+    stream, header_row = read_csv_content_and_find_header(Path(csv_file))
+    with stream:
+        assert header_row == 2
+        assert stream.readline().rstrip() == CSV_HEADER
+
+
+def test_read_csv_content_and_find_header_missing_header(tmpdir):
+    csv_file = tmpdir.join("sample.csv")
+    csv_file.write("\n".join([CSV_DATA] * 30))
+
+    with pytest.raises(ValueError):
+        read_csv_content_and_find_header(Path(csv_file))
+
+
+@pytest.mark.django_db
+@pytest.mark.parametrize('backend', ['bulk_create', 'copy'])
+def test_process_csv_file_backends(faker, tmpdir, backend):
+    user_id = faker.uuid4()
+    csv_file = tmpdir.join("sample.csv")
+    csv_file.write(
+        f"{CSV_HEADER}\n{CSV_DATA}\n"
+        'FreeStyle LibreLink,1D48A10E-DDFB-4888-8158-026F08814832,18-02-2021 12:12,1,,80,"Notiz, mit ""Zitat"""\n'
+    )
+
+    result = process_csv_file(Path(csv_file), user_id, backend=backend)
+
+    assert result.inserted == 2
+    history, scan = Level.objects.filter(user_id=user_id).order_by('device_timestamp')
+    assert history.recording_type == Level.RecordingType.HISTORY
+    assert history.glucose_history_mg_dl == 75
+    assert history.glucose_scan_mg_dl is None
+    assert history.glucose_mg_dl == 75
+    assert history.device_timestamp.isoformat() == '2021-02-18T11:57:00+00:00'
+    assert scan.recording_type == Level.RecordingType.SCAN
+    assert scan.glucose_scan_mg_dl == 80
+    assert scan.glucose_mg_dl == 80
+    assert scan.notes == 'Notiz, mit "Zitat"'
+
+
+def write_history_csv(csv_file, readings):
+    csv_file.write(CSV_HEADER + "\n" + "\n".join(
+        f"FreeStyle LibreLink,1D48A10E-DDFB-4888-8158-026F08814832,{timestamp},0,{value},," for timestamp, value in readings
+    ) + "\n")
+
+
+@pytest.mark.django_db
+@pytest.mark.parametrize('backend', ['bulk_create', 'copy'])
+def test_process_csv_file_ignore_overlapping_upload(faker, tmpdir, backend):
+    user_id = faker.uuid4()
+    csv_file = tmpdir.join("sample.csv")
+    write_history_csv(csv_file, [("18-02-2021 10:57", 70), ("18-02-2021 11:12", 71)])
+    process_csv_file(Path(csv_file), user_id, backend=backend)
+
+    write_history_csv(csv_file, [("18-02-2021 10:57", 70), ("18-02-2021 11:12", 99), ("18-02-2021 11:27", 72)])
+    result = process_csv_file(Path(csv_file), user_id, backend=backend, mode=IngestMode.IGNORE)
+
+    assert (result.inserted, result.updated, result.skipped) == (1, 0, 2)
+    assert list(Level.objects.filter(user_id=user_id).order_by('device_timestamp').values_list(
+        'glucose_history_mg_dl', flat=True
+    )) == [70, 71, 72]
+
+
+@pytest.mark.django_db
+@pytest.mark.parametrize('backend', ['bulk_create', 'copy'])
+def test_process_csv_file_update_overlapping_upload(faker, tmpdir, backend):
+    user_id = faker.uuid4()
+    csv_file = tmpdir.join("sample.csv")
+    write_history_csv(csv_file, [("18-02-2021 10:57", 70), ("18-02-2021 11:12", 71)])
+    process_csv_file(Path(csv_file), user_id, backend=backend)
+
+    write_history_csv(csv_file, [("18-02-2021 11:12", 99), ("18-02-2021 11:27", 72), ("18-02-2021 11:27", 73)])
+    result = process_csv_file(Path(csv_file), user_id, backend=backend, mode=IngestMode.UPDATE)
+
+    assert (result.inserted, result.updated, result.skipped) == (1, 1, 1)
+    assert list(Level.objects.filter(user_id=user_id).order_by('device_timestamp').values_list(
+        'glucose_history_mg_dl', 'glucose_mg_dl'
+    )) == [(70, 70), (99, 99), (73, 73)]
+
+
+@pytest.mark.django_db
+@pytest.mark.parametrize('backend', ['bulk_create', 'copy'])
+def test_process_csv_file_routes_events(faker, tmpdir, backend):
+    user_id = faker.uuid4()
+    csv_file = tmpdir.join("sample.csv")
+    csv_file.write(
+        f"{CSV_HEADER}\n{CSV_DATA}\n"
+        "FreeStyle LibreLink,1D48A10E-DDFB-4888-8158-026F08814832,18-02-2021 12:12,0,80,,\n"
+        "FreeStyle LibreLink,1D48A10E-DDFB-4888-8158-026F08814832,18-02-2021 12:12,6,,,Mittagessen\n"
+    )
+    process_csv_file(Path(csv_file), user_id, backend=backend)
+
+    assert Level.objects.filter(user_id=user_id).count() == 3
+    device = Device.objects.get(user_id=user_id)
+    assert (str(device.serial_number), device.name) == ('1d48a10e-ddfb-4888-8158-026f08814832', 'FreeStyle LibreLink')
+    assert sorted(LevelEvent.objects.filter(device=device).values_list('recording_type', 'notes')) == [
+        ('0', 'Frühstück'), ('6', 'Mittagessen'),
+    ]
+
+    # Overwritten readings lose the events they no longer have
+    csv_file.write(f"{CSV_HEADER}\nFreeStyle Libre 3,1D48A10E-DDFB-4888-8158-026F08814832,18-02-2021 11:57,0,76,,\n")
+    result = process_csv_file(Path(csv_file), user_id, backend=backend, mode=IngestMode.UPDATE)
+
+    assert (result.inserted, result.updated) == (0, 1)
+    assert list(LevelEvent.objects.filter(device=device).values_list('notes', flat=True)) == ['Mittagessen']
+    assert Device.objects.get(user_id=user_id).name == 'FreeStyle Libre 3'
+    level = Level.objects.get(user_id=user_id, recording_type='0', glucose_history_mg_dl=76)
+    assert (level.device_name, level.notes) == ('FreeStyle Libre 3', None)
+
+
+@pytest.mark.django_db
+def test_process_csv_file_device_bounds(faker, tmpdir):
+    user_id = faker.uuid4()
+    csv_file = tmpdir.join("sample.csv")
+    write_history_csv(csv_file, [("18-02-2021 11:12", 71), ("18-02-2021 10:57", 70)])
+    process_csv_file(Path(csv_file), user_id)
+
+    device = Device.objects.get(user_id=user_id)
+    assert (device.first_device_timestamp, device.last_device_timestamp) == (
+        Level.objects.get(glucose_history_mg_dl=70).device_timestamp,
+        Level.objects.get(glucose_history_mg_dl=71).device_timestamp,
+    )
+    assert Level.objects.get_device_watermarks(user_id) == {device.id: device.last_device_timestamp}
+
+    write_history_csv(csv_file, [("18-02-2021 10:42", 69), ("18-02-2021 11:27", 72)])
+    process_csv_file(Path(csv_file), user_id, mode=IngestMode.APPEND)
+
+    device.refresh_from_db()
+    assert (device.first_device_timestamp, device.last_device_timestamp) == (
+        Level.objects.get(glucose_history_mg_dl=69).device_timestamp,
+        Level.objects.get(glucose_history_mg_dl=72).device_timestamp,
+    )
+
+
+@pytest.mark.django_db
+@pytest.mark.parametrize('backend', ['bulk_create', 'copy'])
+def test_process_csv_file_rolls_back_failed_chunk(faker, tmpdir, monkeypatch, backend):
+    user_id = faker.uuid4()
+    csv_file = tmpdir.join("sample.csv")
+    write_history_csv(csv_file, [("18-02-2021 10:57", 70), ("18-02-2021 11:12", 71)])
+    process_csv_file(Path(csv_file), user_id, backend=backend)
+    device = Device.objects.get(user_id=user_id)
+    rollups = list(LevelRollup.objects.filter(user_id=user_id).order_by('pk').values())
+
+    backend_class = INGEST_BACKENDS[backend]
+    write = backend_class.write
+
+    def fail_events(self, df, mode=IngestMode.APPEND, model=Level):
+        if model is LevelEvent:
+            raise RuntimeError("event write failed")
+        return write(self, df, mode, model)
+
+    monkeypatch.setattr(backend_class, 'write', fail_events)
+    csv_file.write(f"{CSV_HEADER}\nFreeStyle LibreLink,1D48A10E-DDFB-4888-8158-026F08814832,18-02-2021 11:57,0,90,,Notiz\n")
+    with pytest.raises(RuntimeError):
+        process_csv_file(Path(csv_file), user_id, backend=backend)
+
+    # Neither the readings of the chunk nor what is derived from them were kept
+    assert Level.objects.filter(user_id=user_id).count() == 2
+    assert list(LevelRollup.objects.filter(user_id=user_id).order_by('pk').values()) == rollups
+    assert Device.objects.get(pk=device.pk).last_device_timestamp == device.last_device_timestamp
+
+    # So the rows are not skipped by the next import
+    monkeypatch.undo()
+    result = process_csv_file(Path(csv_file), user_id, backend=backend)
+    assert (result.inserted, result.skipped) == (1, 0)
+    assert LevelEvent.objects.get(device=device).notes == 'Notiz'
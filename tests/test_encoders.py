@@ -0,0 +1,73 @@
+from datetime import timedelta
+
+import pytest
+from django.urls import reverse
+from django.utils import timezone
+from rest_framework.renderers import JSONRenderer
+
+from glucosemonitor.levels.encoders import RowEncoder
+from glucosemonitor.levels.exports import stream_csv, stream_json, stream_ndjson
+from glucosemonitor.levels.models import Level
+from glucosemonitor.levels.renderers import FastJSONRenderer
+from glucosemonitor.levels.serializers import LevelSerializer
+
+
+@pytest.fixture
+def levels(faker):
+    user_id = faker.uuid4()
+    now = timezone.now()
+    for i, device_name in enumerate(['FreeStyle LibreLink', 'Gerät "Ä" \\ /', 'line\u2028separator', '\t\x01\x1f']):
+        Level.objects.create(
+            user_id=user_id,
+            device_name=device_name,
+            device_serial_number=faker.uuid4(),
+            device_timestamp=now - timedelta(days=i, microseconds=i * 1234),
+            recording_type=Level.RecordingType.HISTORY if i % 2 else Level.RecordingType.SCAN,
+            glucose_history_mg_dl=faker.random_int(min=70, max=180) if i % 2 else None,
+            glucose_scan_mg_dl=None if i % 2 else faker.random_int(min=70, max=180),
+        )
+    return user_id
+
+
+@pytest.mark.django_db
+@pytest.mark.parametrize('time_zone', ['UTC', 'Europe/Berlin'])
+def test_row_encoder_matches_serializer(levels, time_zone):
+    queryset = Level.objects.filter(user_id=levels).order_by('id')
+    with timezone.override(time_zone):
+        encoder = RowEncoder(LevelSerializer())
+        rows = encoder.encode_rows(encoder.values_list(queryset))
+        expected = LevelSerializer(queryset, many=True).data
+
+    assert rows == expected
+    assert FastJSONRenderer().render(rows) == JSONRenderer().render(expected)
+    assert FastJSONRenderer().render({'big': 2 ** 70}) == JSONRenderer().render({'big': 2 ** 70})
+
+
+@pytest.mark.django_db
+@pytest.mark.parametrize('params', [
+    {}, {'pagination': 'cursor', 'page_size': 2}, {'export': 'csv'}, {'export': 'json'}, {'export': 'ndjson'},
+])
+def test_list_output_is_unchanged(authorized_client, levels, params):
+    client, user = authorized_client
+    params = {'user_id': levels, 'ordering': '-device_timestamp', **params}
+    response = client.get(reverse('level-list'), params)
+    content = b''.join(response.streaming_content) if response.streaming else response.content
+
+    # The output of LevelSerializer and JSONRenderer
+    queryset = Level.objects.filter(user_id=levels).order_by('-device_timestamp', 'id')
+    expected = LevelSerializer(queryset, many=True).data
+    if params.get('export') == 'csv':
+        expected_content = ''.join(stream_csv(expected, list(LevelSerializer().fields))).encode()
+    elif params.get('export') == 'json':
+        expected_content = ''.join(stream_json(expected)).encode()
+    elif params.get('export') == 'ndjson':
+        expected_content = ''.join(stream_ndjson(expected)).encode()
+    elif 'pagination' in params:
+        expected_content = JSONRenderer().render({
+            'next': response.data['next'], 'previous': None, 'results': expected[:2],
+        })
+    else:
+        expected_content = JSONRenderer().render({
+            'count': len(expected), 'next': None, 'previous': None, 'results': expected,
+        })
+    assert content == expected_content
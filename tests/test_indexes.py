@@ -0,0 +1,55 @@
+from datetime import timedelta
+
+import pytest
+from django.db import connection
+from django.utils import timezone
+
+from glucosemonitor.levels.filters import LevelFilter
+from glucosemonitor.levels.models import Level
+
+
+@pytest.fixture
+def level_queries(faker):
+    """
+    Returns the querysets of the list, export and minmax endpoints for a user with some readings.
+    """
+    user_ids = [faker.uuid4() for _ in range(20)]
+    serial_numbers = [faker.uuid4() for _ in user_ids]
+    now = timezone.now()
+    Level.objects.bulk_create(
+        Level(
+            user_id=user_ids[i % 20],
+            device_name='FreeStyle LibreLink',
+            device_serial_number=serial_numbers[i % 20],
+            device_timestamp=now - timedelta(minutes=i),
+            # Notes and other events are stored next to the glucose readings
+            recording_type=Level.RecordingType.HISTORY if i % 3 else '6',
+            glucose_history_mg_dl=faker.random_int(min=70, max=180) if i % 3 else None,
+        )
+        for i in range(6000)
+    )
+    with connection.cursor() as cursor:
+        cursor.execute('ANALYZE levels_level')
+
+    params = {'user_id': user_ids[0], 'start': (now - timedelta(days=1)).isoformat(), 'stop': now.isoformat()}
+    queryset = LevelFilter(params, queryset=Level.objects.all()).qs
+    return {
+        'list': queryset.order_by('device_timestamp', 'id')[:20],
+        'list_by_glucose': Level.objects.filter(user_id=user_ids[0]).order_by('glucose_mg_dl', 'id')[:20],
+        'export': queryset,
+        'minmax': Level.objects.get_min_max_aggregation(queryset),
+    }
+
+
+@pytest.mark.django_db
+@pytest.mark.parametrize('query, index', [
+    ('list', 'level_user_timestamp_idx'),
+    ('list_by_glucose', 'level_user_glucose_value_idx'),
+    ('export', 'level_user_timestamp_idx'),
+    ('minmax', 'level_user_glucose_idx'),
+])
+def test_queries_use_indexes(level_queries, query, index):
+    plan = level_queries[query].explain()
+
+    assert index in plan
+    assert 'Sort' not in plan or query == 'minmax'
@@ -1,5 +1,8 @@
+from datetime import timezone
+
 import pytest
-from glucosemonitor.levels.models import Level
+from glucosemonitor.levels.device_cache import DeviceCache, device_cache
+from glucosemonitor.levels.models import Device, Level, LevelEvent
 
 
 @pytest.mark.django_db
@@ -28,3 +31,179 @@ def test_level_creation(faker):
     )
     assert level.pk is not None
     assert isinstance(level.glucose_history_mg_dl, int)
+
+
+@pytest.mark.django_db
+def test_level_glucose_mg_dl(faker):
+    level = Level.objects.create(
+        user_id=faker.uuid4(),
+        device_name=faker.word(),
+        device_serial_number=faker.uuid4(),
+        device_timestamp=faker.date_time_this_year(tzinfo=timezone.utc),
+        recording_type=Level.RecordingType.HISTORY,
+        glucose_history_mg_dl=90,
+        glucose_scan_mg_dl=120,
+    )
+    assert Level.objects.get(pk=level.pk).glucose_mg_dl == 90
+
+    level.recording_type = Level.RecordingType.SCAN
+    level.save(update_fields=['recording_type'])
+    assert Level.objects.get(pk=level.pk).glucose_mg_dl == 120
+
+
+@pytest.mark.django_db
+def test_level_bulk_glucose_mg_dl(faker):
+    user_id, serial_number = faker.uuid4(), faker.uuid4()
+    levels = Level.objects.bulk_create([
+        Level(
+            user_id=user_id,
+            device_name='FreeStyle LibreLink',
+            device_serial_number=serial_number,
+            device_timestamp=faker.date_time_this_year(tzinfo=timezone.utc),
+            recording_type=recording_type,
+            glucose_history_mg_dl=90,
+            glucose_scan_mg_dl=120,
+        )
+        for recording_type in (Level.RecordingType.HISTORY, Level.RecordingType.SCAN)
+    ])
+    assert sorted(Level.objects.filter(user_id=user_id).values_list('glucose_mg_dl', flat=True)) == [90, 120]
+
+    for level in levels:
+        level.glucose_scan_mg_dl = 130
+    Level.objects.bulk_update(levels, ['glucose_scan_mg_dl'])
+    assert sorted(Level.objects.filter(user_id=user_id).values_list('glucose_mg_dl', flat=True)) == [90, 130]
+
+
+@pytest.mark.django_db
+def test_level_device_and_event(faker):
+    user_id, serial_number = faker.uuid4(), faker.uuid4()
+    level = Level.objects.create(
+        user_id=user_id,
+        device_name='FreeStyle LibreLink',
+        device_serial_number=serial_number,
+        device_timestamp=faker.date_time_this_year(tzinfo=timezone.utc),
+        recording_type='4',
+        fast_acting_insulin_units=4,
+    )
+    other = Level.objects.create(
+        user_id=user_id,
+        device_name='FreeStyle Libre 3',
+        device_serial_number=serial_number,
+        device_timestamp=faker.date_time_this_year(tzinfo=timezone.utc),
+        recording_type=Level.RecordingType.HISTORY,
+        glucose_history_mg_dl=100,
+    )
+
+    # Readings of a device share its row, which keeps the last name saved
+    device = Device.objects.get(user_id=user_id)
+    assert level.device_id == other.device_id == device.pk
+    assert (str(device.serial_number), device.name) == (serial_number, 'FreeStyle Libre 3')
+    assert not LevelEvent.objects.filter(device=device, recording_type=Level.RecordingType.HISTORY).exists()
+
+    level = Level.objects.get(pk=level.pk)
+    assert (level.fast_acting_insulin_units, level.notes) == (4, None)
+    level.notes = 'Vor dem Sport'
+    level.save()
+    assert LevelEvent.objects.get(device=device).notes == 'Vor dem Sport'
+
+    # An event without any value left is deleted
+    level.fast_acting_insulin_units = level.notes = None
+    level.save()
+    assert not LevelEvent.objects.exists()
+    assert Level.objects.get(pk=level.pk).event is None
+
+
+@pytest.mark.django_db
+def test_device_resolve_cache(faker, django_assert_num_queries, django_capture_on_commit_callbacks):
+    user_id, serial_number = faker.uuid4(), faker.uuid4()
+    with django_capture_on_commit_callbacks(execute=True):
+        ids = Device.objects.resolve(user_id, {serial_number: 'FreeStyle LibreLink'})
+
+    # Cached devices are only checked to still exist, unless their name is overwritten
+    with django_assert_num_queries(1):
+        assert Device.objects.resolve(user_id, {serial_number.upper(): 'FreeStyle LibreLink'}) == {
+            serial_number.upper(): ids[serial_number]
+        }
+    with django_assert_num_queries(2):
+        Device.objects.resolve(user_id, {serial_number: 'FreeStyle Libre 3'}, update=True)
+    assert Device.objects.get(pk=ids[serial_number]).name == 'FreeStyle Libre 3'
+
+    Device.objects.filter(user_id=user_id).delete()
+    assert len(device_cache) == 0
+
+
+@pytest.mark.django_db
+def test_device_resolve_deleted_by_other_process(faker, django_capture_on_commit_callbacks):
+    user_id, serial_number = faker.uuid4(), faker.uuid4()
+    with django_capture_on_commit_callbacks(execute=True):
+        ids = Device.objects.resolve(user_id, {serial_number: 'FreeStyle LibreLink'})
+
+    # Deleted without the signal, like another process would, so it stays cached
+    Device.objects.filter(pk=ids[serial_number])._raw_delete(Device.objects.db)
+    assert len(device_cache) == 1
+
+    new_ids = Device.objects.resolve(user_id, {serial_number: 'FreeStyle LibreLink'})
+    assert new_ids[serial_number] != ids[serial_number]
+    assert Device.objects.filter(pk=new_ids[serial_number], user_id=user_id).exists()
+    assert len(device_cache) == 0
+
+
+def test_device_cache_evicts_least_recently_used():
+    cache = DeviceCache(max_size=2)
+    cache.update({'a': (1, 'a'), 'b': (2, 'b')})
+    assert cache.get('a') == (1, 'a')
+    cache.update({'c': (3, 'c')})
+
+    assert (cache.get('a'), cache.get('b'), cache.get('c')) == ((1, 'a'), None, (3, 'c'))
+
+
+@pytest.mark.django_db
+def test_level_extends_device_bounds(faker):
+    user_id, serial_number = faker.uuid4(), faker.uuid4()
+    timestamps = [faker.date_time_this_year(tzinfo=timezone.utc) for _ in range(3)]
+    for timestamp in timestamps:
+        Level.objects.create(
+            user_id=user_id,
+            device_name='FreeStyle LibreLink',
+            device_serial_number=serial_number,
+            device_timestamp=timestamp,
+            recording_type=Level.RecordingType.HISTORY,
+            glucose_history_mg_dl=100,
+        )
+
+    device = Device.objects.get(user_id=user_id)
+    assert (device.first_device_timestamp, device.last_device_timestamp) == (min(timestamps), max(timestamps))
+
+    Level.objects.filter(device_timestamp=max(timestamps)).delete()
+    assert Device.objects.rebuild_bounds(user_id=user_id) == 1
+    device.refresh_from_db()
+    assert device.last_device_timestamp == sorted(timestamps)[1]
+
+
+@pytest.mark.django_db
+def test_level_bulk_create_events(faker):
+    user_id, serial_number = faker.uuid4(), faker.uuid4()
+    timestamp = faker.date_time_this_year(tzinfo=timezone.utc)
+
+    def build(**fields):
+        return Level(
+            user_id=user_id,
+            device_name='FreeStyle LibreLink',
+            device_serial_number=serial_number,
+            device_timestamp=timestamp,
+            recording_type='4',
+            **fields,
+        )
+
+    Level.objects.bulk_create([build(fast_acting_insulin_units=4, notes='Vor dem Sport')])
+    level = Level.objects.get(user_id=user_id)
+    assert (level.fast_acting_insulin_units, level.notes) == (4, 'Vor dem Sport')
+
+    Level.objects.bulk_create([build(notes='Ignoriert')], ignore_conflicts=True)
+    assert LevelEvent.objects.get(device_id=level.device_id).notes == 'Vor dem Sport'
+
+    Level.objects.bulk_create(
+        [build(notes='Nach dem Sport')], update_conflicts=True,
+        unique_fields=['device_id', 'device_timestamp', 'recording_type'], update_fields=['glucose_history_mg_dl'],
+    )
+    assert LevelEvent.objects.get(device_id=level.device_id).notes == 'Nach dem Sport'
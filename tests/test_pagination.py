@@ -0,0 +1,167 @@
+from datetime import datetime, timedelta, timezone
+
+import pytest
+from django.db import connection
+from django.test.utils import CaptureQueriesContext
+from django.urls import reverse
+from rest_framework import status
+
+from glucosemonitor.levels.models import Level
+
+
+def walk(client, url, params, link):
+    """
+    Follows the ``link`` links from the first response and returns the ids of every visited page.
+    """
+    response = client.get(url, params)
+    pages = []
+    while True:
+        assert response.status_code == status.HTTP_200_OK
+        assert 'count' not in response.data
+        pages.append([level['id'] for level in response.data['results']])
+        if response.data[link] is None:
+            return pages
+        response = client.get(response.data[link])
+
+
+def order_by_timestamp(created):
+    """
+    Gives every reading its own timestamp, so that limit/offset pages sorted by timestamp follow each other.
+    """
+    for i, level in enumerate(created):
+        Level.objects.filter(pk=level.pk).update(device_timestamp=level.device_timestamp + timedelta(seconds=i))
+
+
+@pytest.fixture
+def levels(faker):
+    user_id = faker.uuid4()
+    start = datetime(2024, 1, 1, tzinfo=timezone.utc)
+    created = []
+    for i in range(23):
+        created.append(Level.objects.create(
+            user_id=user_id,
+            device_name='FreeStyle LibreLink',
+            device_serial_number=faker.uuid4(),
+            # Every timestamp is shared by several readings
+            device_timestamp=start + timedelta(minutes=15 * (i // 3)),
+            recording_type=Level.RecordingType.HISTORY,
+            glucose_history_mg_dl=None if i % 4 == 0 else faker.random_int(min=70, max=180),
+        ))
+    return user_id, created
+
+
+@pytest.mark.django_db
+@pytest.mark.parametrize('ordering', ['device_timestamp', '-device_timestamp', 'glucose_history_mg_dl',
+                                      '-glucose_history_mg_dl', 'glucose_mg_dl'])
+def test_keyset_pagination(authorized_client, levels, ordering):
+    client, user = authorized_client
+    user_id, created = levels
+
+    field = ordering.lstrip('-')
+    descending = ordering.startswith('-')
+    with_value = sorted((level for level in created if getattr(level, field) is not None),
+                        key=lambda level: (getattr(level, field), level.pk), reverse=descending)
+    without_value = sorted((level for level in created if getattr(level, field) is None),
+                           key=lambda level: level.pk, reverse=descending)
+    expected = [level.pk for level in with_value + without_value]
+
+    url = reverse('level-list')
+    params = {'user_id': user_id, 'ordering': ordering, 'pagination': 'cursor', 'page_size': 4}
+    pages = walk(client, url, params, 'next')
+    assert [pk for page in pages for pk in page] == expected
+    assert all(len(page) == 4 for page in pages[:-1])
+
+    # Walk back from the last page
+    last_page = client.get(url, params)
+    while last_page.data['next'] is not None:
+        last_page = client.get(last_page.data['next'])
+    back = walk(client, last_page.data['previous'], {}, 'previous')
+    assert [pk for page in reversed(back) for pk in page] == expected[:-len(pages[-1])]
+
+
+@pytest.mark.django_db
+def test_keyset_pagination_filters(authorized_client, levels):
+    client, user = authorized_client
+    user_id, created = levels
+
+    params = {
+        'user_id': user_id, 'start': '2024-01-01T00:30:00Z', 'stop': '2024-01-01T01:00:00Z',
+        'pagination': 'cursor', 'page_size': 2,
+    }
+    pages = walk(client, reverse('level-list'), params, 'next')
+    expected = [level.pk for level in created
+                if datetime(2024, 1, 1, 0, 30, tzinfo=timezone.utc) <= level.device_timestamp
+                <= datetime(2024, 1, 1, 1, 0, tzinfo=timezone.utc)]
+    assert [pk for page in pages for pk in page] == expected
+
+    response = client.get(reverse('level-list'), {'user_id': user_id, 'cursor': 'garbage'})
+    assert response.status_code == status.HTTP_404_NOT_FOUND
+
+
+@pytest.mark.django_db
+def test_exact_count_is_read_from_the_rollups_and_cached(authorized_client, levels):
+    client, user = authorized_client
+    user_id, created = levels
+    url = reverse('level-list')
+    params = {'user_id': user_id, 'start': '2024-01-01T00:10:00Z', 'limit': 5}
+    expected = Level.objects.filter(user_id=user_id, device_timestamp__gte='2024-01-01T00:10:00Z').count()
+
+    response = client.get(url, params)
+    assert response.data['count'] == expected
+    assert response.data['next'] is not None
+
+    # The other pages of the range reuse the count
+    with CaptureQueriesContext(connection) as queries:
+        response = client.get(url, {**params, 'offset': 5, 'ordering': '-device_timestamp'})
+    assert response.data['count'] == expected
+    assert not any('COUNT(' in query['sql'] for query in queries.captured_queries)
+
+    # Saving a reading moves the data version of the user forward
+    Level.objects.create(
+        user_id=user_id, device_name='FreeStyle LibreLink', device_serial_number=created[0].device_serial_number,
+        device_timestamp=datetime(2024, 1, 2, tzinfo=timezone.utc), recording_type='6',
+    )
+    assert client.get(url, {**params, 'offset': 10}).data['count'] == expected + 1
+
+
+@pytest.mark.django_db
+def test_estimated_count(authorized_client, levels, settings):
+    client, user = authorized_client
+    user_id, created = levels
+    order_by_timestamp(created)
+    url = reverse('level-list')
+    params = {'user_id': user_id, 'count': 'estimate', 'limit': 5, 'ordering': 'device_timestamp'}
+
+    settings.LEVELS_COUNT_ESTIMATE_THRESHOLD = 1000
+    assert client.get(url, params).data['count'] == len(created)
+
+    settings.LEVELS_COUNT_ESTIMATE_THRESHOLD = 0
+    response = client.get(url, params)
+    counts, pks = [], []
+    while True:
+        counts.append(response.data['count'])
+        pks.extend(level['id'] for level in response.data['results'])
+        if response.data['next'] is None:
+            break
+        response = client.get(response.data['next'])
+
+    assert sorted(pks) == [level.pk for level in created]
+    # The count is at least the number of rows seen, and exact on the last page
+    assert all(count > 5 * (i + 1) for i, count in enumerate(counts[:-1]))
+    assert counts[-1] == len(created)
+
+
+@pytest.mark.django_db
+def test_no_count(authorized_client, levels, settings):
+    client, user = authorized_client
+    user_id, created = levels
+    settings.LEVELS_PAGINATION_COUNT = 'none'
+    order_by_timestamp(created)
+
+    params = {'user_id': user_id, 'limit': 5, 'ordering': 'device_timestamp'}
+    pages = walk(client, reverse('level-list'), params, 'next')
+    assert sorted(pk for page in pages for pk in page) == [level.pk for level in created]
+    assert [len(page) for page in pages] == [5, 5, 5, 5, 3]
+
+    response = client.get(reverse('level-list'), {'user_id': user_id, 'limit': 5, 'count': 'exact'})
+    assert response.data['count'] == len(created)
@@ -0,0 +1,211 @@
+import random
+import threading
+from datetime import datetime, timedelta, timezone
+from io import StringIO
+from pathlib import Path
+
+import pytest
+from asgiref.sync import async_to_sync
+from django.core.management import call_command
+from django.db import connection, transaction
+from django.urls import reverse
+from rest_framework import status
+
+from glucosemonitor.levels.cache import get_data_version
+from glucosemonitor.levels.models import Device, Level, LevelRollup, lock_user
+from glucosemonitor.levels.utils.csv_processing import COLUMNS, TIMESTAMP_FORMAT, process_csv_file
+
+START = datetime(2024, 3, 1, tzinfo=timezone.utc)
+
+
+def raw_min_max(user_id, start=None, stop=None):
+    queryset = Level.objects.filter(user_id=user_id)
+    if start:
+        queryset = queryset.filter(device_timestamp__gte=start)
+    if stop:
+        queryset = queryset.filter(device_timestamp__lte=stop)
+    results = list(Level.objects.get_min_max_aggregation(queryset))
+    return results and {key: results[0][key] for key in ('glucose_level_min', 'glucose_level_max')} or None
+
+
+@pytest.fixture
+def readings(faker, tmpdir):
+    """
+    Imports four days of history readings every 15 minutes and adds some scans through the ORM.
+    """
+    user_id = faker.uuid4()
+    rng = random.Random(0)
+    lines = [','.join(COLUMNS.values())]
+    for i in range(4 * 96):
+        timestamp = START + timedelta(minutes=15 * i)
+        lines.append(','.join(
+            ['FreeStyle LibreLink', '1D48A10E-DDFB-4888-8158-026F08814832', timestamp.strftime(TIMESTAMP_FORMAT), '0',
+             str(rng.randint(40, 400))] + [''] * (len(COLUMNS) - 5)
+        ))
+    csv_file = tmpdir.join(f"{user_id}.csv")
+    csv_file.write('\n'.join(lines))
+    process_csv_file(Path(csv_file), user_id, chunk_size=100)
+
+    for _ in range(30):
+        Level.objects.create(
+            user_id=user_id,
+            device_name='FreeStyle LibreLink',
+            device_serial_number=faker.uuid4(),
+            device_timestamp=START + timedelta(minutes=rng.randint(0, 4 * 24 * 60 - 1)),
+            recording_type=Level.RecordingType.SCAN,
+            glucose_scan_mg_dl=rng.randint(20, 450),
+        )
+    return user_id
+
+
+@pytest.mark.django_db
+def test_rollups_match_raw_aggregation(readings):
+    user_id = readings
+    rng = random.Random(1)
+    ranges = [(None, None), (START + timedelta(hours=5), None), (None, START + timedelta(days=2, minutes=7))]
+    for _ in range(50):
+        start = START + timedelta(minutes=rng.randint(-60, 4 * 24 * 60))
+        ranges.append((start, start + timedelta(minutes=rng.choice([10, 90, 24 * 60, rng.randint(0, 4 * 24 * 60)]))))
+
+    for start, stop in ranges:
+        result = LevelRollup.objects.get_min_max(user_id, start=start, stop=stop)
+        assert async_to_sync(LevelRollup.objects.aget_min_max)(user_id, start=start, stop=stop) == result
+        count = LevelRollup.objects.get_count(user_id, start=start, stop=stop)
+        assert async_to_sync(LevelRollup.objects.aget_count)(user_id, start=start, stop=stop) == count
+        expected = raw_min_max(user_id, start, stop)
+        if expected is None:
+            assert result is None
+        else:
+            assert {key: result[key] for key in expected} == expected, (start, stop)
+
+
+@pytest.mark.django_db
+def test_rebuild_rollups(readings):
+    user_id = readings
+    fields = ('period', 'bucket_start', 'recording_type', 'glucose_min', 'glucose_max', 'glucose_sum', 'glucose_count')
+    maintained = list(LevelRollup.objects.filter(user_id=user_id).order_by(*fields).values_list(*fields))
+    LevelRollup.objects.filter(period=LevelRollup.Period.DAY).delete()
+
+    call_command('rebuild_rollups', user_id=user_id, stdout=StringIO())
+
+    assert list(LevelRollup.objects.filter(user_id=user_id).order_by(*fields).values_list(*fields)) == maintained
+
+
+def assert_rollups_match(user_id):
+    fields = ('period', 'bucket_start', 'recording_type', 'glucose_min', 'glucose_max', 'glucose_sum', 'glucose_count')
+    maintained = list(LevelRollup.objects.filter(user_id=user_id).order_by(*fields).values_list(*fields))
+    LevelRollup.objects.rebuild(user_id=user_id)
+    assert list(LevelRollup.objects.filter(user_id=user_id).order_by(*fields).values_list(*fields)) == maintained
+
+
+@pytest.mark.django_db
+def test_rollups_follow_bulk_writes_and_deletes(readings, faker):
+    user_id = readings
+    version = get_data_version(user_id)
+    Level.objects.bulk_create([
+        Level(
+            user_id=user_id,
+            device_name='FreeStyle LibreLink',
+            device_serial_number='1D48A10E-DDFB-4888-8158-026F08814832',
+            device_timestamp=START + timedelta(days=5, minutes=i),
+            recording_type=Level.RecordingType.SCAN,
+            glucose_scan_mg_dl=10 + i,
+        )
+        for i in range(3)
+    ])
+    assert LevelRollup.objects.get_min_max(user_id)['glucose_level_min'] == 10
+    assert get_data_version(user_id) != version
+    assert_rollups_match(user_id)
+
+    version = get_data_version(user_id)
+    Level.objects.filter(user_id=user_id, glucose_mg_dl__lt=20).delete()
+    result = LevelRollup.objects.get_min_max(user_id)
+    assert {key: result[key] for key in ('glucose_level_min', 'glucose_level_max')} == raw_min_max(user_id)
+    assert get_data_version(user_id) != version
+    assert_rollups_match(user_id)
+    device = Device.objects.get(user_id=user_id, serial_number='1D48A10E-DDFB-4888-8158-026F08814832')
+    assert device.last_device_timestamp == Level.objects.filter(device=device).latest('device_timestamp').device_timestamp
+
+    Level.objects.filter(user_id=user_id).first().delete()
+    assert_rollups_match(user_id)
+
+    Device.objects.filter(user_id=user_id).delete()
+    assert not LevelRollup.objects.filter(user_id=user_id).exists()
+
+
+@pytest.mark.skipif(connection.vendor != 'postgresql', reason="Advisory locks require PostgreSQL")
+@pytest.mark.django_db(transaction=True)
+def test_refresh_derived_is_serialized_per_user(faker):
+    user_id = faker.uuid4()
+    level = Level.objects.create(
+        user_id=user_id,
+        device_name='FreeStyle LibreLink',
+        device_serial_number='1D48A10E-DDFB-4888-8158-026F08814832',
+        device_timestamp=START,
+        recording_type=Level.RecordingType.HISTORY,
+        glucose_history_mg_dl=100,
+    )
+    refreshed = threading.Event()
+
+    def refresh():
+        try:
+            Level.objects.refresh_derived(user_id, {level.device_id: (START, START)})
+            refreshed.set()
+        finally:
+            connection.close()
+
+    with transaction.atomic():
+        lock_user(user_id, 'default')
+        thread = threading.Thread(target=refresh)
+        thread.start()
+        # The refresh of another transaction waits for the lock, the locks of other users do not
+        assert not refreshed.wait(0.5)
+        lock_user(faker.uuid4(), 'default')
+    thread.join(5)
+    assert refreshed.is_set()
+
+
+@pytest.mark.django_db
+def test_min_max_batch(authorized_client, readings, faker):
+    client, user = authorized_client
+    other_user_id = faker.uuid4()
+    Level.objects.create(
+        user_id=other_user_id,
+        device_name='FreeStyle LibreLink',
+        device_serial_number=faker.uuid4(),
+        device_timestamp=START + timedelta(hours=30, minutes=10),
+        recording_type=Level.RecordingType.SCAN,
+        glucose_scan_mg_dl=123,
+    )
+    missing_user_id = faker.uuid4()
+    start, stop = START + timedelta(hours=5, minutes=20), START + timedelta(days=3, minutes=7)
+    url = reverse('level-maximum-batch')
+
+    response = client.post(url, {
+        'user_ids': [readings, missing_user_id, other_user_id, readings],
+        'start': start.isoformat(),
+        'stop': stop.isoformat(),
+    }, format='json')
+
+    assert response.status_code == status.HTTP_200_OK
+    results = response.json()['results']
+    assert [result['user_id'] for result in results] == [readings, missing_user_id, other_user_id]
+    expected = raw_min_max(readings, start, stop)
+    assert results[0]['glucose_level_min'] == expected['glucose_level_min']
+    assert results[0]['glucose_level_max'] == expected['glucose_level_max']
+    assert results[0]['glucose_level_count'] == Level.objects.filter(
+        user_id=readings, device_timestamp__gte=start, device_timestamp__lte=stop
+    ).count()
+    assert results[1] == {
+        'user_id': missing_user_id, 'glucose_level_min': None, 'glucose_level_max': None, 'glucose_level_count': 0,
+    }
+    assert results[2]['glucose_level_count'] == 1
+
+    # Users are aggregated by chunks
+    chunked = LevelRollup.objects.get_min_max_many([readings, other_user_id], start, stop, chunk_size=1)
+    assert [result['glucose_level_count'] for result in chunked.values()] == [
+        results[0]['glucose_level_count'], 1
+    ]
+
+    response = client.post(url, {'user_ids': []}, format='json')
+    assert response.status_code == status.HTTP_400_BAD_REQUEST
@@ -0,0 +1,85 @@
+import time
+from pathlib import Path
+
+import pytest
+from django.conf import settings as django_settings
+from django.contrib.auth import get_user_model
+from django.db import connections
+from django.test.utils import CaptureQueriesContext
+from django.urls import reverse
+from rest_framework import status
+
+from glucosemonitor.levels.models import Device, Level
+from glucosemonitor.levels.routers import ReplicaRouter, pin_to_primary, read_from_replica
+from glucosemonitor.levels.utils.csv_processing import process_csv_file
+
+requires_replica = pytest.mark.skipif(
+    'replica' not in django_settings.DATABASES, reason='No replica is configured, see DB_REPLICA_HOST'
+)
+
+CSV_HEADER = "Gerät,Seriennummer,Gerätezeitstempel,Aufzeichnungstyp,Glukosewert-Verlauf mg/dL,Glukose-Scan mg/dL"
+
+
+@pytest.mark.django_db
+def test_replica_router(settings, faker):
+    settings.LEVELS_REPLICA_DATABASE = 'replica'
+    router = ReplicaRouter()
+    user_id, pinned_user_id = faker.uuid4(), faker.uuid4()
+    pin_to_primary(pinned_user_id)
+
+    assert router.db_for_read(Level) is None
+    with read_from_replica([user_id, 'garbage']):
+        assert router.db_for_read(Level) == router.db_for_read(Device) == 'replica'
+        assert router.db_for_read(get_user_model()) is None
+        assert router.db_for_read(Device, instance=Level()) is None
+        assert router.db_for_write(Level) is None
+    with read_from_replica([user_id, pinned_user_id]):
+        assert router.db_for_read(Level) is None
+    assert router.allow_migrate('replica', 'levels') is False
+    assert router.allow_migrate('default', 'levels') is None
+
+
+@requires_replica
+@pytest.mark.django_db(databases=['default', 'replica'], transaction=True)
+def test_reads_from_replica_after_pin(authorized_client, faker, settings, tmpdir):
+    settings.LEVELS_REPLICA_DATABASE = 'replica'
+    settings.LEVELS_REPLICA_PIN_SECONDS = 1
+    client, user = authorized_client
+    user_id = faker.uuid4()
+    csv_file = tmpdir.join("sample.csv")
+    csv_file.write(f"{CSV_HEADER}\n" + "\n".join(
+        f"FreeStyle LibreLink,1D48A10E-DDFB-4888-8158-026F08814832,18-02-2021 {hour:02}:00,0,{70 + hour},"
+        for hour in range(10)
+    ) + "\n")
+    process_csv_file(Path(csv_file), user_id)
+
+    # The user reads their own writes from the primary
+    with CaptureQueriesContext(connections['replica']) as replica_queries:
+        response = client.get(reverse('level-list'), {'user_id': user_id})
+    assert response.status_code == status.HTTP_200_OK
+    assert response.json()['count'] == 10
+    assert not replica_queries
+
+    time.sleep(1.1)
+    for url_name, params in [
+        ('level-list', {'limit': 5}),
+        ('level-list', {'export': 'ndjson'}),
+        ('level-maximum', {}),
+        ('level-devices', {}),
+    ]:
+        with CaptureQueriesContext(connections['replica']) as replica_queries:
+            response = client.get(reverse(url_name), {'user_id': user_id, **params})
+            content = b''.join(response) if response.streaming else response.content
+        assert response.status_code == status.HTTP_200_OK
+        assert content
+        assert replica_queries
+        # Sessions and users are read from the primary
+        assert all('auth_user' not in query['sql'] for query in replica_queries)
+
+    # Exports keep reading from the replica while they are streamed, once the view returned
+    with CaptureQueriesContext(connections['replica']) as replica_queries:
+        response = client.get(reverse('level-list'), {'user_id': user_id, 'export': 'csv'})
+        queries = len(replica_queries)
+        content = b''.join(response)
+    assert content.count(b'\n') == 11
+    assert len(replica_queries) > queries
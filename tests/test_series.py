@@ -0,0 +1,77 @@
+import random
+from datetime import timedelta
+
+import pytest
+from django.urls import reverse
+from rest_framework import status
+
+from glucosemonitor.levels.models import Level, LevelRollup, SeriesMode, floor_bucket
+from glucosemonitor.levels.series import get_series
+from tests.test_rollups import START, readings  # noqa: F401
+
+
+def expected_series(user_id, start, stop, origin, interval):
+    """
+    Aggregates the readings of the range into buckets in Python.
+    """
+    buckets = {}
+    for timestamp, glucose in Level.objects.filter(
+            user_id=user_id, device_timestamp__gte=start, device_timestamp__lte=stop, glucose_mg_dl__isnull=False
+    ).values_list('device_timestamp', 'glucose_mg_dl'):
+        buckets.setdefault((timestamp - origin) // interval, []).append(glucose)
+    return {
+        'timestamps': [origin + bucket * interval for bucket in sorted(buckets)],
+        'min': [min(buckets[bucket]) for bucket in sorted(buckets)],
+        'max': [max(buckets[bucket]) for bucket in sorted(buckets)],
+        'count': [len(buckets[bucket]) for bucket in sorted(buckets)],
+    }
+
+
+@pytest.mark.django_db
+@pytest.mark.parametrize('interval', [timedelta(minutes=7), timedelta(hours=1), timedelta(hours=5), timedelta(days=1)])
+def test_series_matches_readings(readings, interval):
+    user_id = readings
+    rng = random.Random(2)
+    for _ in range(10):
+        start = START + timedelta(minutes=rng.randint(-60, 2 * 24 * 60))
+        stop = start + timedelta(minutes=rng.randint(0, 3 * 24 * 60))
+        series = get_series(user_id, start, stop, interval=interval)
+
+        if interval < timedelta(hours=1):
+            origin = start
+        else:
+            origin = floor_bucket(start, LevelRollup.Period.DAY if interval.days else LevelRollup.Period.HOUR)
+        expected = expected_series(user_id, start, stop, origin, interval)
+        assert {key: series[key] for key in expected} == expected, (start, stop)
+        assert series['interval'] == interval.total_seconds()
+
+
+@pytest.mark.django_db
+def test_series_lttb(readings):
+    user_id = readings
+    series = get_series(user_id, None, None, mode=SeriesMode.LTTB, points=50)
+
+    assert len(series['timestamps']) == len(series['values']) == 50
+    assert series['timestamps'] == sorted(series['timestamps'])
+    assert series['timestamps'][0] == series['start']
+    assert series['timestamps'][-1] == series['stop']
+
+
+@pytest.mark.django_db
+def test_series_view(authorized_client, readings):
+    client, user = authorized_client
+    user_id = readings
+    url = reverse('level-series')
+
+    response = client.get(url, {'user_id': user_id, 'points': 24})
+    assert response.status_code == status.HTTP_200_OK
+    data = response.json()
+    assert data['mode'] == SeriesMode.AGGREGATE
+    assert data['interval'] == 5 * 3600
+    assert len(data['timestamps']) == len(data['min']) == len(data['avg']) == len(data['max']) <= 24
+    assert sum(data['count']) == Level.objects.filter(user_id=user_id).count()
+
+    response = client.get(url, {'user_id': user_id, 'interval': '00:01:00'})
+    assert response.status_code == status.HTTP_400_BAD_REQUEST
+    response = client.get(url, {'user_id': user_id, 'mode': 'lttb', 'points': 2})
+    assert response.status_code == status.HTTP_400_BAD_REQUEST
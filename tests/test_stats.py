@@ -0,0 +1,61 @@
+from datetime import timedelta
+
+import numpy as np
+import pytest
+from django.urls import reverse
+from rest_framework import status
+
+from glucosemonitor.levels.models import Level
+from glucosemonitor.levels.stats import AGP_PERCENTILES, get_glycemic_stats
+from tests.test_rollups import START, readings  # noqa: F401
+
+
+@pytest.mark.django_db
+def test_glycemic_stats(readings):
+    user_id = readings
+    stop = START + timedelta(days=2)
+    timestamps, glucose = zip(*Level.objects.filter(
+        user_id=user_id, device_timestamp__lte=stop, glucose_mg_dl__isnull=False
+    ).values_list('device_timestamp', 'glucose_mg_dl'))
+    glucose = np.array(glucose)
+
+    stats = get_glycemic_stats(user_id, stop=stop)
+
+    assert stats['count'] == len(glucose)
+    assert stats['mean'] == round(glucose.mean(), 1)
+    assert stats['cv'] == round(glucose.std(ddof=1) / glucose.mean() * 100, 1)
+    assert stats['gmi'] == round(3.31 + 0.02392 * glucose.mean(), 2)
+    assert stats['time_in_ranges'] == {
+        'very_low': round(np.mean(glucose < 54) * 100, 1),
+        'low': round(np.mean((glucose >= 54) & (glucose < 70)) * 100, 1),
+        'in_range': round(np.mean((glucose >= 70) & (glucose <= 180)) * 100, 1),
+        'high': round(np.mean((glucose > 180) & (glucose <= 250)) * 100, 1),
+        'very_high': round(np.mean(glucose > 250) * 100, 1),
+    }
+    assert stats['percentiles'] == pytest.approx({f'p{p}': np.percentile(glucose, p) for p in AGP_PERCENTILES}, abs=0.1)
+
+    slots = np.array([(timestamp.hour * 60 + timestamp.minute) // 15 for timestamp in timestamps])
+    agp = stats['agp']
+    assert len(agp['time']) == len(set(slots))
+    for i, time in enumerate(agp['time']):
+        values = glucose[slots == (time.hour * 60 + time.minute) // 15]
+        # Both sides are rounded, ties may be rounded differently
+        assert [agp[f'p{p}'][i] for p in AGP_PERCENTILES] == pytest.approx(
+            [np.percentile(values, p) for p in AGP_PERCENTILES], abs=0.1
+        )
+
+
+@pytest.mark.django_db
+def test_stats_view(authorized_client, readings, faker):
+    client, user = authorized_client
+    user_id = readings
+
+    response = client.get(reverse('level-stats'), {'user_id': user_id})
+    assert response.status_code == status.HTTP_200_OK
+    data = response.json()
+    assert data['count'] == Level.objects.filter(user_id=user_id).count()
+    assert sum(data['time_in_ranges'].values()) == pytest.approx(100, abs=0.5)
+    assert data['agp']['time'][:2] == ['00:00:00', '00:15:00']
+
+    response = client.get(reverse('level-stats'), {'user_id': faker.uuid4()})
+    assert response.status_code == status.HTTP_404_NOT_FOUND
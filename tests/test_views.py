@@ -1,8 +1,16 @@
+import csv
+import io
+import json
+import time
+from datetime import timezone
+
 import pytest
+from django.core.files.uploadedfile import SimpleUploadedFile
 from django.urls import reverse
 from rest_framework import status
 
-from glucosemonitor.levels.models import Level
+from glucosemonitor.levels.models import Level, ImportJob
+from glucosemonitor.levels.serializers import LevelSerializer
 
 CSV_HEADER = "Gerät,Seriennummer,Gerätezeitstempel,Aufzeichnungstyp,Glukosewert-Verlauf mg/dL,Glukose-Scan mg/dL,Nicht numerisches schnellwirkendes Insulin,Schnellwirkendes Insulin (Einheiten),Nicht numerische Nahrungsdaten,Kohlenhydrate (Gramm),Kohlenhydrate (Portionen),Nicht numerisches Depotinsulin,Depotinsulin (Einheiten),Notizen,Glukose-Teststreifen mg/dL,Keton mmol/L,Mahlzeiteninsulin (Einheiten),Korrekturinsulin (Einheiten),Insulin-Änderung durch Anwender (Einheiten)"
 CSV_DATA = "FreeStyle LibreLink,1D48A10E-DDFB-4888-8158-026F08814832,18-02-2021 11:57,0,75,,,,,,,,,,,,,,"
@@ -30,6 +38,40 @@ def test_get_levels(authorized_client, faker):
     assert len(response.data['results']) == 1
 
 
+@pytest.mark.django_db
+def test_export_levels(authorized_client, faker):
+    client, user = authorized_client
+
+    user_id = faker.uuid4()
+    for _ in range(3):
+        Level.objects.create(
+            user_id=user_id,
+            device_name=faker.word(),
+            device_serial_number=faker.uuid4(),
+            device_timestamp=faker.date_time_this_year(tzinfo=timezone.utc),
+            recording_type=Level.RecordingType.HISTORY,
+            glucose_history_mg_dl=faker.random_int(min=70, max=180),
+        )
+    url = reverse('level-list')
+    expected = LevelSerializer(Level.objects.order_by('device_timestamp'), many=True).data
+
+    response = client.get(url, {'user_id': user_id, 'ordering': 'device_timestamp', 'export': 'json'})
+    assert response.streaming
+    assert b''.join(response.streaming_content).decode() == json.dumps(expected, indent=2)
+
+    response = client.get(url, {'user_id': user_id, 'ordering': 'device_timestamp', 'export': 'ndjson'})
+    lines = b''.join(response.streaming_content).decode().splitlines()
+    assert [json.loads(line) for line in lines] == json.loads(json.dumps(expected))
+
+    response = client.get(url, {'user_id': user_id, 'ordering': 'device_timestamp', 'export': 'csv'})
+    rows = list(csv.DictReader(io.StringIO(b''.join(response.streaming_content).decode())))
+    assert [row['id'] for row in rows] == [str(level['id']) for level in expected]
+    assert rows[0]['glucose_scan_mg_dl'] == ''
+
+    response = client.get(url, {'user_id': faker.uuid4(), 'export': 'json'})
+    assert b''.join(response.streaming_content) == b'[]'
+
+
 @pytest.mark.django_db
 def test_get_level_detail(authorized_client, faker):
     client, user = authorized_client
@@ -52,7 +94,8 @@ def test_get_level_detail(authorized_client, faker):
 
 
 @pytest.mark.django_db
-def test_upload_csv(authorized_client, faker, tmpdir):
+def test_upload_csv(authorized_client, faker, tmpdir, settings):
+    settings.LEVELS_IMPORT_WORKER = 'inline'
     client, user = authorized_client
 
     csv_file = tmpdir.join(f"{faker.uuid4()}.csv")
@@ -62,7 +105,72 @@ def test_upload_csv(authorized_client, faker, tmpdir):
     with open(csv_file, 'rb') as f:
         response = client.post(url, {'file': f})
 
-    assert response.status_code == status.HTTP_201_CREATED
+    assert response.status_code == status.HTTP_202_ACCEPTED
+    assert Level.objects.count() == 1
+
+    response = client.get(response.data['status_url'])
+
+    assert response.status_code == status.HTTP_200_OK
+    assert response.data['state'] == ImportJob.State.SUCCEEDED
+    assert response.data['rows_processed'] == 1
+    assert response.data['rows_inserted'] == 1
+
+
+@pytest.mark.django_db
+def test_upload_csv_failed_job(authorized_client, faker, tmpdir, settings):
+    settings.LEVELS_IMPORT_WORKER = 'inline'
+    client, user = authorized_client
+
+    csv_file = tmpdir.join(f"{faker.uuid4()}.csv")
+    csv_file.write(CSV_HEADER + "\n" + CSV_DATA.replace("18-02-2021 11:57", "not a timestamp"))
+
+    with open(csv_file, 'rb') as f:
+        response = client.post(reverse('level-upload'), {'file': f})
+    response = client.get(reverse('level-upload-job', args=[response.data['job_id']]))
+
+    assert response.data['state'] == ImportJob.State.FAILED
+    assert response.data['error']
+
+
+@pytest.mark.django_db
+@pytest.mark.parametrize('extension,content_type,content', [
+    ('.txt', 'text/plain', CSV_HEADER + "\n" + CSV_DATA),
+    ('.csv', 'image/png', CSV_HEADER + "\n" + CSV_DATA),
+    ('.csv', 'text/csv', "no header here"),
+    ('.csv', 'text/csv', CSV_HEADER.replace("Aufzeichnungstyp,", "") + "\n" + CSV_DATA),
+])
+def test_upload_csv_rejects_invalid_file(authorized_client, faker, settings, extension, content_type, content):
+    settings.LEVELS_IMPORT_WORKER = 'inline'
+    client, user = authorized_client
+
+    file = SimpleUploadedFile(f"{faker.uuid4()}{extension}", content.encode(), content_type=content_type)
+    response = client.post(reverse('level-upload'), {'file': file})
+
+    assert response.status_code == status.HTTP_400_BAD_REQUEST
+    assert response.data['file']
+    assert ImportJob.objects.count() == 0
+
+
+@pytest.mark.django_db(transaction=True)
+def test_upload_csv_worker_thread(authorized_client, faker, tmpdir, settings):
+    settings.LEVELS_IMPORT_WORKER = 'thread'
+    client, user = authorized_client
+
+    csv_file = tmpdir.join(f"{faker.uuid4()}.csv")
+    csv_file.write(CSV_HEADER + "\n" + CSV_DATA)
+
+    with open(csv_file, 'rb') as f:
+        response = client.post(reverse('level-upload'), {'file': f})
+    assert response.status_code == status.HTTP_202_ACCEPTED
+
+    job = ImportJob.objects.get(pk=response.data['job_id'])
+    for _ in range(100):
+        job.refresh_from_db()
+        if job.state in (ImportJob.State.SUCCEEDED, ImportJob.State.FAILED):
+            break
+        time.sleep(0.1)
+
+    assert job.state == ImportJob.State.SUCCEEDED
     assert Level.objects.count() == 1
 
 
@@ -92,3 +200,70 @@ def test_aggregates_minmax_levels(authorized_client, faker):
     assert min_max_values['glucose_level_min'] == response.json()['glucose_level_min']
     assert min_max_values['glucose_level_max'] == response.json()['glucose_level_max']
 
+
+@pytest.mark.django_db
+def test_list_devices(authorized_client, faker):
+    client, user = authorized_client
+    user_id = faker.uuid4()
+    timestamps = sorted(faker.date_time_this_year(tzinfo=timezone.utc) for _ in range(3))
+    serial_numbers = [faker.uuid4(), faker.uuid4()]
+    for serial_number, timestamp in zip([*serial_numbers, serial_numbers[0]], timestamps):
+        Level.objects.create(
+            user_id=user_id,
+            device_name='FreeStyle LibreLink',
+            device_serial_number=serial_number,
+            device_timestamp=timestamp,
+            recording_type=Level.RecordingType.HISTORY,
+            glucose_history_mg_dl=100,
+        )
+
+    response = client.get(reverse('level-devices'), {'user_id': user_id})
+
+    assert response.status_code == status.HTTP_200_OK
+    assert [
+        (device['serial_number'], device['first_device_timestamp'], device['last_device_timestamp'])
+        for device in response.json()
+    ] == [
+        (serial_numbers[0], timestamps[0].isoformat().replace('+00:00', 'Z'),
+         timestamps[2].isoformat().replace('+00:00', 'Z')),
+        (serial_numbers[1], timestamps[1].isoformat().replace('+00:00', 'Z'),
+         timestamps[1].isoformat().replace('+00:00', 'Z')),
+    ]
+    assert client.get(reverse('level-devices')).status_code == status.HTTP_400_BAD_REQUEST
+
+
+@pytest.mark.django_db
+def test_upload_csv_too_large(authorized_client, faker, tmpdir, settings):
+    settings.LEVELS_IMPORT_WORKER = 'inline'
+    settings.LEVELS_UPLOAD_MAX_SIZE = 1024
+    client, user = authorized_client
+
+    csv_file = tmpdir.join(f"{faker.uuid4()}.csv")
+    csv_file.write(CSV_HEADER + "\n" + "\n".join([CSV_DATA] * 100))
+
+    with open(csv_file, 'rb') as f:
+        response = client.post(reverse('level-upload'), {'file': f})
+
+    assert response.status_code == status.HTTP_413_REQUEST_ENTITY_TOO_LARGE
+    assert Level.objects.count() == 0
+    assert ImportJob.objects.count() == 0
+
+
+@pytest.mark.django_db
+def test_upload_csv_spooled_to_disk(authorized_client, faker, tmpdir, settings):
+    settings.LEVELS_IMPORT_WORKER = 'inline'
+    settings.FILE_UPLOAD_MAX_MEMORY_SIZE = 1024
+    client, user = authorized_client
+
+    rows = [
+        CSV_DATA.replace("18-02-2021 11:57", f"18-02-2021 {hour:02d}:{minute:02d}")
+        for hour in range(24) for minute in range(0, 60, 15)
+    ]
+    csv_file = tmpdir.join(f"{faker.uuid4()}.csv")
+    csv_file.write(CSV_HEADER + "\n" + "\n".join(rows))
+
+    with open(csv_file, 'rb') as f:
+        response = client.post(reverse('level-upload'), {'file': f})
+
+    assert response.status_code == status.HTTP_202_ACCEPTED
+    assert Level.objects.count() == len(rows)